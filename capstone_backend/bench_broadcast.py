@@ -0,0 +1,106 @@
+"""Broadcast benchmark: one project's progress update fanned out to thousands of sockets.
+
+Compares the old sequential send loop with the queued fan-out in realtime.py. A share of
+the simulated clients are slow (each send stalls) and a few are dead (each send fails).
+
+Usage:
+    python bench_broadcast.py [--sockets 5000] [--updates 20] [--slow 0.02] [--dead 0.01]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from realtime import EventHub
+
+
+class SimulatedSocket:
+    def __init__(self, delay: float = 0.0, dead: bool = False):
+        self.delay = delay
+        self.dead = dead
+        self.received = 0
+
+    async def send_text(self, text):
+        if self.dead:
+            raise RuntimeError("connection reset")
+        await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def close(self, code=1000):
+        pass
+
+
+def make_sockets(count: int, slow_share: float, dead_share: float):
+    rng = random.Random(42)
+    sockets = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < dead_share:
+            sockets.append(SimulatedSocket(dead=True))
+        elif roll < dead_share + slow_share:
+            sockets.append(SimulatedSocket(delay=0.5))
+        else:
+            sockets.append(SimulatedSocket())
+    return sockets
+
+
+async def run_sequential(sockets, updates: int):
+    # The pre-queue broadcast: await every send in turn
+    started = time.perf_counter()
+    for step in range(updates):
+        for ws in sockets:
+            try:
+                await ws.send_text(json.dumps({"project_id": 1, "progress": step / updates}))
+            except Exception:
+                pass
+    return time.perf_counter() - started, 0
+
+
+async def run_queued(sockets, updates: int):
+    hub = EventHub()
+    hub.connections.send_timeout = 1.0
+    for ws in sockets:
+        hub.connections.add(1, ws)
+
+    publish_time = 0.0
+    started = time.perf_counter()
+    for step in range(updates):
+        t0 = time.perf_counter()
+        await hub.publish(1, {"project_id": 1, "progress": step / updates})
+        publish_time += time.perf_counter() - t0
+        await asyncio.sleep(0)
+
+    healthy = [ws for ws in sockets if not ws.dead and not ws.delay]
+    while any(ws.received < updates for ws in healthy):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    stats = dict(hub.connections.stats)
+    await hub.stop()
+    return elapsed, publish_time / updates, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sockets", type=int, default=5000)
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--slow", type=float, default=0.02)
+    parser.add_argument("--dead", type=float, default=0.01)
+    args = parser.parse_args()
+
+    sockets = make_sockets(args.sockets, args.slow, args.dead)
+    slow = sum(1 for ws in sockets if ws.delay)
+    dead = sum(1 for ws in sockets if ws.dead)
+    print(f"{args.sockets} sockets ({slow} slow, {dead} dead), {args.updates} updates")
+
+    elapsed, publish, stats = asyncio.run(run_queued(make_sockets(args.sockets, args.slow, args.dead), args.updates))
+    print(f"{'queued':<11} healthy clients up to date in {elapsed * 1000:9.1f} ms   "
+          f"publish {publish * 1000:6.2f} ms/update   {stats}")
+
+    # Only one update for the sequential loop: every slow socket stalls the whole broadcast
+    elapsed, _ = asyncio.run(run_sequential(sockets, 1))
+    print(f"{'sequential':<11} one update delivered in {elapsed * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Conditional GET benchmark: a full dashboard read vs an If-None-Match revalidation.
+
+Polls /dashboard/metrics, /dashboard/notifications and /dashboard/projects/user as one
+user on a throwaway SQLite database and reports statements and latency per request.
+
+Usage:
+    python bench_conditional_get.py [--projects 50] [--tasks 40] [--polls 200]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import models
+from db import get_db
+from principal_cache import principal_cache
+from routes.auth import create_jwt_token
+from routes.dashboard import router as dashboard_router
+
+ENDPOINTS = ("/dashboard/metrics", "/dashboard/notifications", "/dashboard/projects/user")
+
+
+def build(projects: int, tasks: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    user = models.User(first_name="Poll", last_name="User", email="poll@example.com", phone_no="5550000", password="x")
+    db.add(user)
+    db.flush()
+    today = date.today()
+    for p in range(projects):
+        project = models.Project(title=f"Project {p}", creator_id=user.user_id, progress=0, due_date=today + timedelta(days=p % 10))
+        db.add(project)
+        db.flush()
+        db.add(models.ProjectTeam(project_id=project.project_id, user_id=user.user_id))
+        for t in range(tasks):
+            task = models.Task(
+                project_id=project.project_id, title=f"Task {t}", category="To Do", priority="Medium",
+                progress=0, due_date=today + timedelta(days=t % 9 - 2),
+            )
+            db.add(task)
+            db.flush()
+            db.add(models.UserAssignment(task_id=task.task_id, user_id=user.user_id))
+    db.commit()
+    token = create_jwt_token({"user_id": user.user_id, "email": user.email})
+    db.close()
+
+    app = FastAPI()
+    app.include_router(dashboard_router, prefix="/dashboard")
+
+    def override_get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return engine, TestClient(app), {"Authorization": f"Bearer {token}"}
+
+
+def measure(engine, client, url, headers, polls):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    latencies = []
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        for _ in range(polls):
+            started = time.perf_counter()
+            response = client.get(url, headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return response, len(statements) / polls, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--polls", type=int, default=200)
+    args = parser.parse_args()
+
+    engine, client, headers = build(args.projects, args.tasks)
+    principal_cache.clear()
+    client.get("/dashboard/metrics", headers=headers)  # warm the principal cache and the rollup
+
+    print(f"{args.projects} projects x {args.tasks} tasks, {args.polls} polls per row")
+    for url in ENDPOINTS:
+        full, full_queries, full_ms = measure(engine, client, url, headers, args.polls)
+        conditional = {**headers, "If-None-Match": full.headers["ETag"]}
+        revalidated, queries, ms = measure(engine, client, url, conditional, args.polls)
+        assert revalidated.status_code == 304 and queries <= 1
+        print(
+            f"{url:<28} 200: {full_queries:4.1f} queries {full_ms:7.2f} ms   "
+            f"304: {queries:4.1f} queries {ms:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Login-storm benchmark: latency of an unrelated sync endpoint during a burst of logins.
+
+Compares the old inline bcrypt login (hashing on the request threadpool) with the
+hashing-pool login in routes/auth.py. Runs against a throwaway SQLite database.
+
+Usage:
+    python bench_login_storm.py [--logins 200] [--probes 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import crud, models, schemas
+from db import get_db
+from routes.auth import auth_router
+
+
+def build_app(SessionLocal, legacy: bool):
+    app = FastAPI()
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    if legacy:
+        # The pre-pool login: bcrypt runs inside the sync handler
+        @app.post("/auth/login")
+        def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+            if not crud.authenticate_user(db, user.email, user.password):
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            return {"access_token": "x", "token_type": "bearer"}
+    else:
+        app.include_router(auth_router, prefix="/auth")
+
+    @app.get("/probe")
+    def probe():
+        return {"ok": True}
+
+    app.dependency_overrides[get_db] = override_get_db
+    return app
+
+
+async def run_storm(app, logins: int, probes: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        credentials = {"email": "storm@example.com", "password": "storm-password"}
+        storm = [asyncio.create_task(client.post("/auth/login", json=credentials)) for _ in range(logins)]
+        await asyncio.sleep(0.05)  # let the storm occupy the workers first
+
+        latencies = []
+        for _ in range(probes):
+            started = time.perf_counter()
+            await client.get("/probe")
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.005)
+
+        statuses = [r.status_code for r in await asyncio.gather(*storm)]
+    return latencies, statuses
+
+
+def summarize(label, latencies, statuses):
+    latencies = sorted(latencies)
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    shed = sum(1 for s in statuses if s == 503)
+    ok = sum(1 for s in statuses if s == 200)
+    print(
+        f"{label:<14} probe p50 {statistics.median(latencies):8.2f} ms   p99 {p99:8.2f} ms   "
+        f"logins ok {ok}, shed {shed}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--probes", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    crud.create_user(db, schemas.UserCreate(
+        first_name="Storm", last_name="User", email="storm@example.com",
+        phone_no="5550000", password="storm-password"
+    ))
+    db.close()
+
+    for label, legacy, logins in (
+        ("idle", False, 0),
+        ("inline bcrypt", True, args.logins),
+        ("hashing pool", False, args.logins),
+    ):
+        latencies, statuses = asyncio.run(run_storm(build_app(SessionLocal, legacy), logins, args.probes))
+        summarize(label, latencies, statuses)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Serialization benchmark: jsonable_encoder + JSONResponse vs precompiled serializers + orjson.
+
+Pages of task rows, fetched once from a throwaway SQLite database, are turned into a
+response body both ways; the report is rows per second for each path.
+
+Usage:
+    python bench_serialization.py [--rows 500] [--rounds 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+from serializers import FastJSONResponse, row_serializer
+
+
+def build(rows: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    user = models.User(first_name="Bench", last_name="User", email="bench@example.com", phone_no="5550000", password="x")
+    db.add(user)
+    db.flush()
+    project = models.Project(title="Bench", creator_id=user.user_id, progress=0)
+    db.add(project)
+    db.flush()
+    today = date.today()
+    db.add_all([
+        models.Task(
+            project_id=project.project_id, title=f"Task {i}", category="To Do", priority="Medium",
+            progress=i % 100, due_date=today + timedelta(days=i % 30),
+        )
+        for i in range(rows)
+    ])
+    db.commit()
+    result = db.query(*crud.TASK_FIELDS.values()).all()
+    db.close()
+    return result
+
+
+def old_path(rows):
+    items = [{name: getattr(row, name) for name in crud.TASK_FIELDS} for row in rows]
+    return JSONResponse(jsonable_encoder(items)).body
+
+
+def new_path(rows):
+    serialize = row_serializer(models.Task, tuple(crud.TASK_FIELDS))
+    return FastJSONResponse([serialize(row) for row in rows]).body
+
+
+def measure(path, rows, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        path(rows)
+    return len(rows) * rounds / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = build(args.rows)
+    new_path(rows)  # compile the serializer outside the timing
+
+    old = measure(old_path, rows, args.rounds)
+    new = measure(new_path, rows, args.rounds)
+    print(f"{args.rows} task rows x {args.rounds} rounds")
+    print(f"jsonable_encoder + JSONResponse: {old:10.0f} rows/s")
+    print(f"serializer + orjson:             {new:10.0f} rows/s  ({new / old:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""SMTP benchmark: one connection per email vs pooled sessions from email_sender.SMTPPool.
+
+Sends a batch of invitations to a local aiosmtpd server. --rtt adds a delay to each
+SMTP command the server answers, standing in for the network round trip to a real
+provider (where STARTTLS and AUTH would add further round trips per connection).
+
+Usage:
+    python bench_smtp_pool.py [--emails 200] [--rtt 20] [--threads 4]
+"""
+import argparse
+import asyncio
+import smtplib
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiosmtpd.controller import Controller
+
+import email_sender
+from email_sender import SMTPPool
+
+SENDER = "team@example.com"
+
+
+class DelayedInbox:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.rtt)
+        session.host_name = hostname
+        return responses
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await asyncio.sleep(self.rtt)
+        envelope.mail_from = address
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(self.rtt)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.rtt)
+        self.received += 1
+        return "250 OK"
+
+
+def send_unpooled(recipient: str, message: str):
+    # What send_invite_email used to do for every email
+    server = smtplib.SMTP(email_sender.SMTP_HOST, email_sender.SMTP_PORT)
+    server.sendmail(SENDER, recipient, message)
+    server.quit()
+
+
+def run(send, emails: int, threads: int):
+    message = "Subject: Invitation to Join Apollo Project\n\nYou have been invited."
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda i: send(f"user{i}@example.com", message), range(emails)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--rtt", type=float, default=20, help="milliseconds per SMTP command")
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    inbox = DelayedInbox(args.rtt / 1000)
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    email_sender.SMTP_HOST, email_sender.SMTP_PORT, email_sender.SMTP_STARTTLS = "127.0.0.1", port, False
+
+    try:
+        unpooled = run(send_unpooled, args.emails, args.threads)
+        pool = SMTPPool(size=args.threads)
+        pooled = run(lambda recipient, message: pool.sendmail(SENDER, None, recipient, message), args.emails, args.threads)
+        pool.close_all()
+    finally:
+        controller.stop()
+
+    assert inbox.received == 2 * args.emails
+    print(f"{args.emails} emails, {args.threads} threads, {args.rtt:g} ms per SMTP command")
+    print(f"connection per email: {unpooled:6.2f} s  {args.emails / unpooled:7.1f} emails/s")
+    print(f"pooled sessions:      {pooled:6.2f} s  {args.emails / pooled:7.1f} emails/s  "
+          f"({pool.stats['connects']} connects, {pool.stats['reused']} reused)")
+
+
+if __name__ == "__main__":
+    main()
@@ -108,6 +108,79 @@ ALTER TABLE project_invitations ADD column project_id int;
 ALTER TABLE Tasks MODIFY COLUMN category ENUM('To Do', 'In Progress', 'Completed') NOT NULL;
 ALTER TABLE Projects ADD COLUMN creator_id INT, ADD CONSTRAINT fk_creator FOREIGN KEY (creator_id) REFERENCES Users(user_id);
 Alter table Projects ADD COLUMN due_date DATE NULL;
+ALTER TABLE Projects ADD COLUMN completed_count INT NOT NULL DEFAULT 0, ADD COLUMN total_count INT NOT NULL DEFAULT 0;
+-- Backfill the counters afterwards with: python maintenance.py rebuild-project-counters
+ALTER TABLE DashboardMetrics DROP INDEX metric_date;
+ALTER TABLE DashboardMetrics
+    ADD COLUMN user_id INT NULL,
+    ADD COLUMN total_users INT DEFAULT 0,
+    ADD COLUMN progress_sum DECIMAL(10, 2) DEFAULT 0,
+    ADD COLUMN high_priority_tasks INT DEFAULT 0,
+    ADD COLUMN medium_priority_tasks INT DEFAULT 0,
+    ADD COLUMN low_priority_tasks INT DEFAULT 0,
+    ADD COLUMN is_stale BOOLEAN NOT NULL DEFAULT 0,
+    ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    MODIFY COLUMN metric_date DATE NOT NULL,
+    ADD CONSTRAINT fk_dashboard_metric_user FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+    ADD CONSTRAINT uq_dashboard_metric_user_day UNIQUE (user_id, metric_date);
+CREATE INDEX ix_user_assignments_user_task ON UserAssignments (user_id, task_id);
+CREATE INDEX ix_tasks_due_date_progress ON Tasks (due_date, progress);
+ALTER TABLE Projects ADD COLUMN event_seq INT NOT NULL DEFAULT 0;
+CREATE TABLE project_events (
+    event_id INT AUTO_INCREMENT PRIMARY KEY,
+    project_id INT NOT NULL,
+    seq INT NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    created_at DATETIME,
+    INDEX ix_project_events_created_at (created_at),
+    CONSTRAINT uq_project_event_seq UNIQUE (project_id, seq),
+    FOREIGN KEY (project_id) REFERENCES Projects(project_id) ON DELETE CASCADE
+);
+ALTER TABLE Projects ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6), ADD COLUMN version INT NOT NULL DEFAULT 1, ADD INDEX ix_Projects_updated_at (updated_at);
+ALTER TABLE Tasks ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6), ADD COLUMN version INT NOT NULL DEFAULT 1, ADD INDEX ix_Tasks_updated_at (updated_at);
+ALTER TABLE UserAssignments ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6), ADD COLUMN version INT NOT NULL DEFAULT 1, ADD INDEX ix_UserAssignments_updated_at (updated_at);
+ALTER TABLE ProjectTeam ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6), ADD COLUMN version INT NOT NULL DEFAULT 1, ADD INDEX ix_ProjectTeam_updated_at (updated_at);
+CREATE TABLE sync_tombstones (
+    tombstone_id INT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(20) NOT NULL,
+    entity_id INT NOT NULL,
+    project_id INT NULL,
+    user_id INT NULL,
+    deleted_at DATETIME(6) NOT NULL,
+    INDEX ix_sync_tombstones_project_id (project_id),
+    INDEX ix_sync_tombstones_user_id (user_id),
+    INDEX ix_sync_tombstones_deleted_at (deleted_at)
+);
+CREATE TABLE email_outbox (
+    email_id INT AUTO_INCREMENT PRIMARY KEY,
+    invitation_id INT NULL,
+    sender VARCHAR(255) NULL,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(512) NOT NULL,
+    body TEXT NOT NULL,
+    text_body TEXT NULL,
+    status ENUM('Pending', 'Sending', 'Sent', 'Failed') NOT NULL DEFAULT 'Pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL,
+    claimed_by VARCHAR(36) NULL,
+    locked_until DATETIME NULL,
+    last_error TEXT NULL,
+    created_at DATETIME,
+    sent_at DATETIME NULL,
+    INDEX ix_email_outbox_status_next_attempt (status, next_attempt_at),
+    INDEX ix_email_outbox_created_at (created_at),
+    FOREIGN KEY (invitation_id) REFERENCES project_invitations(invitation_id) ON DELETE SET NULL
+);
+
+-- Invitation expiry (invite_sweeper.py); invitations already sent get the default 7 days
+ALTER TABLE project_invitations
+    MODIFY COLUMN status ENUM('Pending', 'Accepted', 'Declined', 'Expired') DEFAULT 'Pending',
+    ADD COLUMN expires_at DATETIME NULL;
+UPDATE project_invitations SET expires_at = created_at + INTERVAL 7 DAY WHERE expires_at IS NULL;
+CREATE INDEX ix_project_invitations_project_status ON project_invitations (project_id, status);
+CREATE INDEX ix_project_invitations_email_status ON project_invitations (email, status);
+CREATE INDEX ix_project_invitations_status_expires ON project_invitations (status, expires_at);
 
 SHOW CREATE TABLE Projects;
 
@@ -0,0 +1,31 @@
+"""ETag / If-None-Match support for polled read endpoints.
+
+The ETag is derived from a cheap version stamp (see crud.get_user_version_stamp) rather
+than from the response body, so a 304 is answered before the endpoint's own queries run.
+"""
+import hashlib
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'  # weak: equal JSON, not necessarily byte-identical
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    # Weak comparison: clients may send the tag back with or without the W/ prefix
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
@@ -1,26 +1,39 @@
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import schemas
 import models
-from passlib.context import CryptContext
-from sqlalchemy import func
+from sqlalchemy import func, case, or_, and_, not_, select, union, event, insert, true, update
+from sqlalchemy.exc import IntegrityError
 import jwt
-from datetime import datetime
-from sqlalchemy.orm import joinedload
+from datetime import datetime, date, timedelta, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from collections import Counter
+from sqlalchemy.orm import joinedload, aliased
+from pagination import fetch_page, select_fields
+from serializers import compile_serializer, decimal_columns
+from task_import import IMPORT_CHUNK_SIZE, parse_import_row
+from principal_cache import Principal
+from types import SimpleNamespace
 import uuid
 import asyncio
+import json
+import os
+from typing import Optional
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from hashing import pwd_context
 
+# Synchronous helpers; request handlers go through hashing.hash_password/verify_password
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_user(db: Session, user: schemas.UserCreate):
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str = None):
     try:
-        hashed_password = hash_password(user.password)
+        hashed_password = hashed_password or hash_password(user.password)
         db_user = models.User(
             first_name=user.first_name,
             last_name=user.last_name,
@@ -70,10 +83,48 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
 def get_project(db: Session, project_id: int):
     return db.query(models.Project).filter(models.Project.project_id == project_id).first()
 
-def get_projects(db: Session):
+def _project_fields():
+    completed, total = _project_task_counts()
+    creator = aliased(models.User)
+    team_count = (
+        select(func.count(models.ProjectTeam.project_team_id))
+        .where(models.ProjectTeam.project_id == models.Project.project_id)
+        .scalar_subquery()
+    )
+    fields = {
+        "project_id": models.Project.project_id,
+        "title": models.Project.title,
+        "project_description": models.Project.project_description,
+        "workspace": models.Project.workspace,
+        "team_count": team_count,
+        "progress": case((total > 0, completed * 1.0 / total), else_=0.0),
+        "creator_name": creator.first_name + " " + creator.last_name,
+        "creator_id": models.Project.creator_id,
+        "due_date": models.Project.due_date,
+        "created_at": models.Project.created_at,
+        "updated_at": models.Project.updated_at,
+        "version": models.Project.version,
+    }
+    return fields, creator
+
+
+# The project_to_dict() keys, returned when no fields= are asked for
+PROJECT_DEFAULT_FIELDS = [
+    "project_id", "title", "project_description", "workspace", "team_count", "progress", "creator_name", "creator_id",
+]
+
+
+def get_projects(db: Session, cursor=None, limit=None, fields=None, sort="id"):
+    """A page of all projects; ValueError for a bad cursor, sort or field name."""
+    available, creator = _project_fields()
+    columns = select_fields(available, fields, PROJECT_DEFAULT_FIELDS)
+    query = db.query(models.Project)
+    if "creator_name" in columns:
+        query = query.outerjoin(creator, creator.user_id == models.Project.creator_id)
     try:
-          projects = db.query(models.Project).options(joinedload(models.Project.creator)).all()
-          return [project_to_dict(p) for p in projects] # Get ALL projects
+        return fetch_page(query, columns, models.Project.project_id, models.Project.created_at, cursor, limit, sort)
+    except ValueError:
+        raise
     except Exception as e:
         raise Exception(f"Error fetching projects: {str(e)}")
     
@@ -90,6 +141,7 @@ def create_project(db: Session, project: schemas.ProjectCreate, creator_id: int)
             creator_id=creator_id
         )
         db.add(new_project)
+        invalidate_dashboard_metrics(db, [creator_id])
         db.commit()
         db.refresh(new_project)
         return new_project
@@ -98,10 +150,88 @@ def create_project(db: Session, project: schemas.ProjectCreate, creator_id: int)
         raise Exception(f"Error creating project: {str(e)}")
 
     
-def project_to_dict(project):
+# A task counts as done once it sits in "Completed" or its progress reaches this value
+COMPLETED_PROGRESS = 0.99
+
+def is_task_completed(task) -> bool:
+    return task.category == "Completed" or (task.progress is not None and task.progress >= COMPLETED_PROGRESS)
+
+def task_completed_clause():
+    """SQL version of is_task_completed (NULL-safe, so its negation matches too)."""
+    return or_(
+        func.coalesce(models.Task.category, "") == "Completed",
+        func.coalesce(models.Task.progress, 0) >= COMPLETED_PROGRESS,
+    )
+
+
+def _as_date(value):
+    # Task.due_date may still hold the raw value the route assigned (str or datetime)
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def is_task_overdue(task, today: date) -> bool:
+    due_date = _as_date(task.due_date)
+    return due_date is not None and due_date < today and not is_task_completed(task)
+
+def task_overdue_clause(today: date):
+    """SQL version of is_task_overdue."""
+    return and_(models.Task.due_date < today, not_(task_completed_clause()))
+
+
+def task_snapshot(task):
+    """The task values that project counters and dashboard rollups are derived from."""
+    return {
+        "task_id": task.task_id,
+        "priority": task.priority,
+        "completed": is_task_completed(task),
+        "overdue": is_task_overdue(task, metric_day()),
+    }
+
+
+def get_project_summaries(db: Session, project_ids):
+    """Completed/total task counts and team size for many projects in two grouped queries."""
+    summaries = {
+        pid: {"completed_tasks": 0, "total_tasks": 0, "team_count": 0}
+        for pid in project_ids
+    }
+    if not summaries:
+        return summaries
+
+    task_counts = db.query(
+        models.Task.project_id,
+        func.count(models.Task.task_id),
+        func.sum(case((task_completed_clause(), 1), else_=0)),
+    ).filter(models.Task.project_id.in_(summaries.keys()))\
+     .group_by(models.Task.project_id).all()
+    for project_id, total, completed in task_counts:
+        summaries[project_id]["total_tasks"] = total
+        summaries[project_id]["completed_tasks"] = int(completed or 0)
+
+    team_counts = db.query(
+        models.ProjectTeam.project_id, func.count(models.ProjectTeam.project_team_id)
+    ).filter(models.ProjectTeam.project_id.in_(summaries.keys()))\
+     .group_by(models.ProjectTeam.project_id).all()
+    for project_id, team_count in team_counts:
+        summaries[project_id]["team_count"] = team_count
+
+    return summaries
+
+
+def project_to_dict(project, summary=None):
+    if summary is None:
+        # Single project: count through the relationships
+        summary = {
+            "completed_tasks": sum(1 for t in project.tasks if is_task_completed(t)),
+            "total_tasks": len(project.tasks),
+            "team_count": len(project.team_members),
+        }
+
     # Recalculate progress on the fly based on tasks
-    completed_tasks = sum(1 for t in project.tasks if t.category == "Completed")
-    total_tasks = len(project.tasks)
+    completed_tasks = summary["completed_tasks"]
+    total_tasks = summary["total_tasks"]
     progress = completed_tasks / total_tasks if total_tasks > 0 else 0.0
 
     return {
@@ -109,23 +239,132 @@ def project_to_dict(project):
         "title": project.title,
         "project_description": project.project_description,
         "workspace": project.workspace,
-        "team_count": len(project.team_members),
+        "team_count": summary["team_count"],
         "progress": float(progress),  # dynamically calculated
         "creator_name": f"{project.creator.first_name} {project.creator.last_name}" if project.creator else None,
         "creator_id": project.creator_id
     }
 
 
+def projects_to_dicts(db: Session, projects):
+    summaries = get_project_summaries(db, [p.project_id for p in projects])
+    return [project_to_dict(p, summaries[p.project_id]) for p in projects]
+
+
+
+
+def record_task_change(db: Session, project_id: int, before=None, after=None) -> float:
+    """Apply a task insert/update/delete to the project counters and dashboard rollups.
+
+    ``before``/``after`` are task_snapshot() values (None for an insert/delete). Runs in the
+    caller's transaction and returns the project's new progress.
+    """
+    completed_delta = int(bool(after and after["completed"])) - int(bool(before and before["completed"]))
+    total_delta = int(after is not None) - int(before is not None)
+    if completed_delta or total_delta:
+        db.query(models.Project).filter(models.Project.project_id == project_id).update({
+            models.Project.completed_count: models.Project.completed_count + completed_delta,
+            models.Project.total_count: models.Project.total_count + total_delta,
+        }, synchronize_session=False)
+
+    _record_task_metrics(db, project_id, before, after)
+
+    counts = db.query(models.Project.completed_count, models.Project.total_count)\
+        .filter(models.Project.project_id == project_id).first()
+    if not counts or not counts.total_count:
+        return 0.0
+    return counts.completed_count / counts.total_count
+
+
+def _project_task_counts():
+    total = (
+        select(func.count(models.Task.task_id))
+        .where(models.Task.project_id == models.Project.project_id)
+        .scalar_subquery()
+    )
+    completed = (
+        select(func.count(models.Task.task_id))
+        .where(models.Task.project_id == models.Project.project_id, task_completed_clause())
+        .scalar_subquery()
+    )
+    return completed, total
+
+
+def rebuild_project_counters(db: Session):
+    """Recompute every project's completed/total counters and progress from the Tasks table."""
+    try:
+        completed, total = _project_task_counts()
+        db.query(models.Project).update({
+            models.Project.completed_count: completed,
+            models.Project.total_count: total,
+        }, synchronize_session=False)
+        db.query(models.Project).update({
+            models.Project.progress: case(
+                (models.Project.total_count > 0, models.Project.completed_count * 1.0 / models.Project.total_count),
+                else_=0,
+            )
+        }, synchronize_session=False)
+        invalidate_dashboard_metrics(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error rebuilding project counters: {str(e)}")
+
+
+def find_project_counter_drift(db: Session):
+    """List projects whose stored counters disagree with the Tasks table."""
+    completed, total = _project_task_counts()
+    rows = db.query(
+        models.Project.project_id,
+        models.Project.completed_count,
+        models.Project.total_count,
+        completed.label("actual_completed"),
+        total.label("actual_total"),
+    ).all()
+    return [
+        {
+            "project_id": row.project_id,
+            "completed_count": row.completed_count,
+            "total_count": row.total_count,
+            "actual_completed": row.actual_completed,
+            "actual_total": row.actual_total,
+        }
+        for row in rows
+        if (row.completed_count, row.total_count) != (row.actual_completed, row.actual_total)
+    ]
+
+
+def counter_progress(project) -> float:
+    """Progress from a project's completed/total counters."""
+    return project.completed_count / project.total_count if project.total_count else 0.0
+
+
+def set_project_progress(db: Session, project_id: int, progress: float = None):
+    """Write Projects.progress and the rollup progress sums; the caller commits.
+
+    ``progress=None`` derives it from the project's counters, read under a row lock so a
+    writer can't replace a newer value with one it computed earlier.
+    """
+    project = db.query(models.Project).filter(models.Project.project_id == project_id).with_for_update().first()
+    if not project:
+        raise Exception(f"Project with ID {project_id} not found")
+    if progress is None:
+        progress = counter_progress(project)
+    old_progress = project.progress or Decimal("0")
+    # Store exactly what DECIMAL(5,2) keeps so the rollup progress sums stay exact
+    project.progress = Decimal(str(progress)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)  # ✅ Fix: use the argument passed in
+    _bump_dashboard_metrics(
+        db, project_metric_users(db, project_id), progress_sum=project.progress - old_progress
+    )
+    return project
 
 
 async def update_project_progress(db: Session, project_id: int, progress: float):
     try:
-        project = db.query(models.Project).filter(models.Project.project_id == project_id).first()
-        if not project:
-            raise Exception(f"Project with ID {project_id} not found")
-        project.progress = progress  # ✅ Fix: use the argument passed in
+        project = set_project_progress(db, project_id, progress)
         db.commit()
         
+        from routes.dashboard import broadcast_progress_update  # routes import crud, so import lazily
         await broadcast_progress_update(project_id, progress)
 
         db.refresh(project)
@@ -135,46 +374,260 @@ async def update_project_progress(db: Session, project_id: int, progress: float)
         raise Exception(f"Error updating project progress: {str(e)}")
 
 
+async def update_project_progress_async(db: AsyncSession, project_id: int, progress: float = None):
+    """update_project_progress for routes on get_async_db; None recomputes from the counters."""
+    try:
+        project = await db.run_sync(set_project_progress, project_id, progress)
+        if progress is None:
+            progress = counter_progress(project)
+        await db.commit()
+
+        from routes.dashboard import broadcast_progress_update  # routes import crud, so import lazily
+        await broadcast_progress_update(project_id, progress)
+
+        return project
+    except Exception as e:
+        await db.rollback()
+        raise Exception(f"Error updating project progress: {str(e)}")
+
+
+# Task events for the project WebSocket
+def task_payload(task, assignees=()):
+    """A task in the shape of a get_tasks_by_project() entry, plus due date and progress."""
+    names = [a["full_name"] for a in assignees]
+    return {
+        "task_id": task.task_id,
+        "title": task.title,
+        "priority": task.priority,
+        "category": task.category,
+        "created_at": task.created_at.isoformat() if task.created_at else None,
+        "due_date": task.due_date.isoformat() if task.due_date else None,
+        "progress": float(task.progress or 0),
+        "assignees": list(assignees),
+        "assigned_to": ", ".join(names) if names else "Unassigned",
+    }
+
+
+def get_task_assignees(db: Session, task_id: int):
+    rows = db.query(models.User.user_id, models.User.first_name, models.User.last_name)\
+        .join(models.UserAssignment, models.UserAssignment.user_id == models.User.user_id)\
+        .filter(models.UserAssignment.task_id == task_id)\
+        .order_by(models.UserAssignment.assignment_id).all()
+    return [{"user_id": row.user_id, "full_name": f"{row.first_name} {row.last_name}"} for row in rows]
+
+
+def record_task_event(db: Session, project_id: int, event_type: str, **data) -> dict:
+    """Append a task delta to the project's event log under the next sequence number.
+
+    Runs in the caller's transaction; bumping Projects.event_seq locks the project row, so
+    sequence numbers follow commit order. Publish with pop_task_events() after the commit.
+    """
+    db.query(models.Project).filter(models.Project.project_id == project_id).update(
+        {models.Project.event_seq: models.Project.event_seq + 1}, synchronize_session=False
+    )
+    seq = db.query(models.Project.event_seq).filter(models.Project.project_id == project_id).scalar()
+    message = {"type": event_type, "project_id": project_id, "seq": seq, **data}
+    db.add(models.ProjectEvent(project_id=project_id, seq=seq, event_type=event_type, payload=json.dumps(message)))
+    db.info.setdefault("task_events", []).append(message)
+    return message
+
+
+def record_task_update(db: Session, task, fields: dict, previous_category=None) -> dict:
+    """task.moved when the category changed, task.updated otherwise; ``fields`` holds the new values."""
+    if "category" in fields:
+        return record_task_event(
+            db, task.project_id, "task.moved",
+            task_id=task.task_id, fields=fields, **{"from": previous_category, "to": fields["category"]},
+        )
+    return record_task_event(db, task.project_id, "task.updated", task_id=task.task_id, fields=fields)
+
+
+def pop_task_events(db) -> list:
+    """Events recorded in the session's committed transaction, ready to publish."""
+    return db.info.pop("task_events", [])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_task_events(session):
+    session.info.pop("task_events", None)
+
+
+def get_project_events(db: Session, project_id: int, since: Optional[int], limit: int):
+    """The project's current sequence and the events after ``since`` for a resuming client.
+
+    The events are None when the log cannot bridge the gap (pruned, too many, or a sequence
+    from the future); the client should then reload the board.
+    """
+    current = db.query(models.Project.event_seq).filter(models.Project.project_id == project_id).scalar()
+    if current is None:
+        raise Exception(f"Project with ID {project_id} not found")
+    if since is None or since == current:
+        return current, []
+    if since > current or current - since > limit:
+        return current, None
+
+    rows = db.query(models.ProjectEvent.payload)\
+        .filter(
+            models.ProjectEvent.project_id == project_id,
+            models.ProjectEvent.seq > since,
+            models.ProjectEvent.seq <= current,
+        ).order_by(models.ProjectEvent.seq).all()
+    if len(rows) != current - since:
+        return current, None
+    return current, [json.loads(row.payload) for row in rows]
+
+
+def prune_project_events(db: Session, older_than: datetime) -> int:
+    try:
+        count = db.query(models.ProjectEvent)\
+            .filter(models.ProjectEvent.created_at < older_than)\
+            .delete(synchronize_session=False)
+        db.commit()
+        return count
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error pruning project events: {str(e)}")
+
+
 # CRUD for Tasks
-def get_tasks(db: Session):
+TASK_FIELDS = {
+    name: getattr(models.Task, name)
+    for name in (
+        "task_id", "project_id", "title", "category", "due_date", "priority", "progress",
+        "created_at", "updated_at", "version",
+    )
+}
+
+
+def get_tasks(db: Session, cursor=None, limit=None, fields=None, sort="id"):
+    """A page of all tasks; ValueError for a bad cursor, sort or field name."""
+    columns = select_fields(TASK_FIELDS, fields)
     try:
-        return db.query(models.Task).all()
+        return fetch_page(db.query(models.Task), columns, models.Task.task_id, models.Task.created_at, cursor, limit, sort)
+    except ValueError:
+        raise
     except Exception as e:
         raise Exception(f"Error fetching tasks: {str(e)}")
     
 # def get_tasks_by_project(db: Session, project_id: int):
 #     return db.query(models.Task).filter(models.Task.project_id == project_id).all()
 
-def get_tasks_by_project(db: Session, project_id: int):
-    tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
+serialize_task_card = compile_serializer(
+    "serialize_task_card", ["task_id", "title", "priority", "category", "created_at"]
+)
 
-    results = []
-    for task in tasks:
-        assignment = (
-            db.query(models.UserAssignment)
-            .filter(models.UserAssignment.task_id == task.task_id)
-            .first()
+
+def get_tasks_by_project(db: Session, project_id: int):
+    # One round trip: every assignment (and its user) is outer-joined onto the task rows
+    rows = (
+        db.query(
+            models.Task.task_id,
+            models.Task.title,
+            models.Task.priority,
+            models.Task.category,
+            models.Task.created_at,
+            models.User.user_id,
+            models.User.first_name,
+            models.User.last_name,
         )
+        .outerjoin(models.UserAssignment, models.UserAssignment.task_id == models.Task.task_id)
+        .outerjoin(models.User, models.User.user_id == models.UserAssignment.user_id)
+        .filter(models.Task.project_id == project_id)
+        .order_by(models.Task.task_id, models.UserAssignment.assignment_id)
+        .all()
+    )
 
-        assigned_user = None
-        if assignment:
-            user = db.query(models.User).filter(models.User.user_id == assignment.user_id).first()
-            if user:
-                assigned_user = f"{user.first_name} {user.last_name}"
-
-        results.append({
-            "task_id": task.task_id,
-            "title": task.title,
-            "priority": task.priority,
-            "category": task.category,
-            "created_at": task.created_at,
-            "assigned_to": assigned_user or "Unassigned"
-            
-            
-        })
+    tasks = {}
+    for row in rows:
+        task = tasks.get(row.task_id)
+        if task is None:
+            task = tasks[row.task_id] = serialize_task_card(row)
+            task["assignees"] = []
+        if row.user_id is not None:
+            task["assignees"].append({
+                "user_id": row.user_id,
+                "full_name": f"{row.first_name} {row.last_name}",
+            })
+
+    results = []
+    for task in tasks.values():
+        names = [a["full_name"] for a in task["assignees"]]
+        task["assigned_to"] = ", ".join(names) if names else "Unassigned"
+        results.append(task)
 
     return results
 
+
+serialize_activity = compile_serializer(
+    "serialize_activity",
+    [("user", "first_name"), ("task", "task_title"), ("action", "action"), ("timestamp", "timestamp")],
+)
+
+
+def get_project_activities(db: Session, project_id: int, limit: int = 10):
+    # Columns only: the user's name comes from the join instead of a lazy load per activity
+    rows = (
+        db.query(models.User.first_name, models.Activity.task_title, models.Activity.action, models.Activity.timestamp)
+        .join(models.User, models.Activity.user_id == models.User.user_id)
+        .filter(models.Activity.project_id == project_id)
+        .order_by(models.Activity.timestamp.desc())
+        .limit(limit)
+        .all()
+    )
+    return [serialize_activity(row) for row in rows]
+
+
+# Project export: rows are fetched through a server-side cursor in batches of this size
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+_export_task = compile_serializer(
+    "export_task",
+    ["task_id", "title", "category", "priority", "progress", "due_date", "created_at"],
+    decimal_columns(models.Task),
+    {"type": "task"},
+)
+_export_assignment = compile_serializer(
+    "export_assignment", ["task_id", "user_id", "email", "assigned_at"], constants={"type": "assignment"}
+)
+_export_activity = compile_serializer(
+    "export_activity",
+    ["user_id", "email", ("title", "task_title"), "action", "timestamp"],
+    constants={"type": "activity"},
+)
+
+
+def iter_project_export(db: Session, project_id: int, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield a project's tasks, then assignments, then activities as flat dicts.
+
+    Each query streams (yield_per), so memory stays flat however large the project is.
+    """
+    streams = (
+        (_export_task, select(
+            models.Task.task_id, models.Task.title, models.Task.category, models.Task.priority,
+            models.Task.progress, models.Task.due_date, models.Task.created_at,
+        ).where(models.Task.project_id == project_id).order_by(models.Task.task_id)),
+        (_export_assignment, select(
+            models.UserAssignment.task_id, models.UserAssignment.user_id, models.User.email,
+            models.UserAssignment.assigned_at,
+        ).join(models.Task, models.Task.task_id == models.UserAssignment.task_id)
+         .outerjoin(models.User, models.User.user_id == models.UserAssignment.user_id)
+         .where(models.Task.project_id == project_id)
+         .order_by(models.UserAssignment.assignment_id)),
+        (_export_activity, select(
+            models.Activity.user_id, models.User.email, models.Activity.task_title,
+            models.Activity.action, models.Activity.timestamp,
+        ).outerjoin(models.User, models.User.user_id == models.Activity.user_id)
+         .where(models.Activity.project_id == project_id)
+         .order_by(models.Activity.id)),
+    )
+    for serialize, query in streams:
+        result = db.execute(query.execution_options(yield_per=batch_size))
+        try:
+            for row in result:
+                yield serialize(row)
+        finally:
+            result.close()
+
 # def create_task(db: Session, task: schemas.TaskCreate):
 #     try:
 #         db_task = models.Task(
@@ -216,8 +669,8 @@ def create_task(db: Session, task: schemas.TaskCreate):
             project_id=task.project_id
         )
         db.add(db_task)
-        db.commit()
-        db.refresh(db_task)
+        db.flush()
+        record_task_change(db, task.project_id, after=task_snapshot(db_task))
 
         # ✅ 2. Assign the task to the user
         assignment = models.UserAssignment(
@@ -225,7 +678,14 @@ def create_task(db: Session, task: schemas.TaskCreate):
             user_id=task.assigned_to  # 👈 this comes from frontend
         )
         db.add(assignment)
+        record_assignment(db, task.assigned_to, task_snapshot(db_task))
+        db.flush()
+        record_task_event(
+            db, task.project_id, "task.created",
+            task=task_payload(db_task, get_task_assignees(db, db_task.task_id)),
+        )
         db.commit()
+        db.refresh(db_task)
 
         return db_task
 
@@ -234,10 +694,166 @@ def create_task(db: Session, task: schemas.TaskCreate):
         raise Exception(f"Error creating task: {str(e)}")
 
 
+# Bulk task import
+def _insert_tasks(db: Session, rows):
+    """Insert task rows as one executemany; returns (task_id, created_at) in row order."""
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        return db.execute(
+            insert(models.Task).returning(models.Task.task_id, models.Task.created_at, sort_by_parameter_order=True),
+            rows,
+        ).all()
+    # No ordered RETURNING (MySQL): the ORM gets each id from its own INSERT, still one transaction
+    tasks = [models.Task(**row) for row in rows]
+    db.add_all(tasks)
+    db.flush()
+    ids = [task.task_id for task in tasks]
+    created = dict(db.query(models.Task.task_id, models.Task.created_at).filter(models.Task.task_id.in_(ids)).all())
+    return [(task_id, created[task_id]) for task_id in ids]
+
+
+def record_task_import(db: Session, project_id: int, tasks, assignments) -> float:
+    """record_task_change() and record_assignment() for a batch of new tasks.
+
+    ``tasks`` are task_snapshot() values and ``assignments`` (user_id, snapshot) pairs.
+    Returns the project's new progress.
+    """
+    completed = sum(task["completed"] for task in tasks)
+    db.query(models.Project).filter(models.Project.project_id == project_id).update({
+        models.Project.completed_count: models.Project.completed_count + completed,
+        models.Project.total_count: models.Project.total_count + len(tasks),
+    }, synchronize_session=False)
+
+    priorities = Counter(PRIORITY_METRICS[t["priority"]] for t in tasks if t["priority"] in PRIORITY_METRICS)
+    _bump_dashboard_metrics(db, project_metric_users(db, project_id), total_tasks=len(tasks), **priorities)
+
+    # One UPDATE per distinct delta rather than per assignee
+    per_user = {}
+    for user_id, task in assignments:
+        assigned, done, overdue = per_user.get(user_id, (0, 0, 0))
+        per_user[user_id] = (assigned + 1, done + int(task["completed"]), overdue + int(task["overdue"]))
+    by_deltas = {}
+    for user_id, deltas in per_user.items():
+        by_deltas.setdefault(deltas, []).append(user_id)
+    for (assigned, done, overdue), user_ids in by_deltas.items():
+        _bump_dashboard_metrics(db, user_ids, assigned_tasks=assigned, completed_tasks=done, overdue_tasks=overdue)
+
+    counts = db.query(models.Project.completed_count, models.Project.total_count)\
+        .filter(models.Project.project_id == project_id).first()
+    if not counts or not counts.total_count:
+        return 0.0
+    return counts.completed_count / counts.total_count
+
+
+def _import_chunk(db: Session, project_id: int, chunk, users: dict, report: dict):
+    # One query for the emails this chunk introduces; earlier chunks' lookups are reused
+    emails = {email for _, row in chunk for email in row["assignees"]} - users.keys()
+    if emails:
+        users.update(dict.fromkeys(emails))
+        users.update({
+            user.email.lower(): user for user in db.query(
+                models.User.user_id, models.User.email, models.User.first_name, models.User.last_name
+            ).filter(func.lower(models.User.email).in_(emails))
+        })
+
+    accepted = []
+    for number, row in chunk:
+        unknown = [email for email in row["assignees"] if users[email] is None]
+        if unknown:
+            report["errors"].append({"row": number, "error": f"Unknown assignee: {', '.join(unknown)}"})
+        else:
+            accepted.append((number, row))
+    if not accepted:
+        return
+
+    try:
+        task_rows = [
+            {
+                "project_id": project_id, "title": row["title"], "category": row["category"],
+                "priority": row["priority"], "due_date": row["due_date"], "progress": row["progress"],
+            }
+            for _, row in accepted
+        ]
+        inserted = _insert_tasks(db, task_rows)
+
+        assignment_rows, snapshots, assigned, payloads = [], [], [], []
+        for (task_id, created_at), task_row, (_, row) in zip(inserted, task_rows, accepted):
+            task = SimpleNamespace(task_id=task_id, created_at=created_at, **task_row)
+            snapshot = task_snapshot(task)
+            snapshots.append(snapshot)
+            assignees = []
+            for email in row["assignees"]:
+                user = users[email]
+                assignment_rows.append({"task_id": task_id, "user_id": user.user_id})
+                assigned.append((user.user_id, snapshot))
+                assignees.append({"user_id": user.user_id, "full_name": f"{user.first_name} {user.last_name}"})
+            payloads.append(task_payload(task, assignees))
+        if assignment_rows:
+            db.execute(insert(models.UserAssignment), assignment_rows)
+
+        progress = record_task_import(db, project_id, snapshots, assigned)
+        set_project_progress(db, project_id, progress)
+        # One event per chunk; clients add every task in it
+        record_task_event(db, project_id, "task.imported", tasks=payloads)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        report["errors"].extend({"row": number, "error": f"Error importing task: {str(e)}"} for number, _ in accepted)
+        return
+
+    report["imported"] += len(accepted)
+    report["progress"] = progress
+    report["events"].extend(pop_task_events(db))
+
+
+def import_tasks(db: Session, project_id: int, rows, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """Validate and insert uploaded task rows, committing every ``chunk_size`` rows.
+
+    Bad rows are reported by their 1-based row number and skipped; a chunk that fails in
+    the database is rolled back on its own. ``events`` are the committed task events,
+    and ``progress`` is None if nothing was imported.
+    """
+    report = {"imported": 0, "errors": [], "progress": None, "events": []}
+    users, chunk, number = {}, [], 0
+    rows = iter(rows)
+    while True:
+        try:
+            raw = next(rows)
+        except StopIteration:
+            break
+        except ValueError as e:
+            # The upload itself is broken (bad encoding, truncated JSON): keep what was read
+            report["errors"].append({"row": number + 1, "error": str(e)})
+            break
+        number += 1
+        try:
+            chunk.append((number, parse_import_row(raw)))
+        except ValueError as e:
+            report["errors"].append({"row": number, "error": str(e)})
+        if len(chunk) >= chunk_size:
+            _import_chunk(db, project_id, chunk, users, report)
+            chunk = []
+    if chunk:
+        _import_chunk(db, project_id, chunk, users, report)
+    report["errors"].sort(key=lambda error: error["row"])
+    report["failed"] = len(report["errors"])
+    return report
+
+
 # CRUD for Users
-def get_users(db: Session):
+# Everything but the password hash
+USER_FIELDS = {
+    name: getattr(models.User, name)
+    for name in ("user_id", "first_name", "last_name", "email", "phone_no", "profile_picture", "created_at")
+}
+
+
+def get_users(db: Session, cursor=None, limit=None, fields=None, sort="id"):
+    """A page of users; ValueError for a bad cursor, sort or field name."""
+    columns = select_fields(USER_FIELDS, fields)
     try:
-        return db.query(models.User).all()
+        return fetch_page(db.query(models.User), columns, models.User.user_id, models.User.created_at, cursor, limit, sort)
+    except ValueError:
+        raise
     except Exception as e:
         raise Exception(f"Error fetching users: {str(e)}")
 
@@ -273,75 +889,231 @@ def get_users(db: Session):
 #     except Exception as e:
 #         raise Exception(f"Error getting dashboard metrics: {str(e)}")
 
-def get_dashboard_metrics(db: Session, current_user: models.User):
-    try:
-        user_id = current_user.user_id
-        metrics = {}
+# Dashboard rollups: one DashboardMetrics row per (user, day). Task and assignment changes
+# adjust today's rows in place; membership changes mark them stale for the next read to rebuild.
+PRIORITY_METRICS = {
+    "High": "high_priority_tasks",
+    "Medium": "medium_priority_tasks",
+    "Low": "low_priority_tasks",
+}
+METRIC_FIELDS = (
+    "total_projects", "total_tasks", "total_users", "progress_sum",
+    "high_priority_tasks", "medium_priority_tasks", "low_priority_tasks",
+    "assigned_tasks", "overdue_tasks", "completed_tasks",
+)
 
-        # Projects where user is creator or member
-        user_projects = db.query(models.Project).filter(
-            (models.Project.creator_id == user_id) |
-            (models.Project.team_members.any(user_id=user_id))
-        ).all()
 
-        project_ids = [p.project_id for p in user_projects]
+def metric_day() -> date:
+    return datetime.utcnow().date()
 
-        # Total projects
-        metrics["total_projects"] = len(project_ids)
 
-        # Total tasks for those projects
-        metrics["total_tasks"] = db.query(models.Task).filter(
-            models.Task.project_id.in_(project_ids)
-        ).count()
+def project_metric_users(db: Session, project_id: int):
+    """Users whose dashboard includes this project: its creator and team members."""
+    creator = select(models.Project.creator_id).where(
+        models.Project.project_id == project_id, models.Project.creator_id.isnot(None)
+    )
+    members = select(models.ProjectTeam.user_id).where(models.ProjectTeam.project_id == project_id)
+    return [row[0] for row in db.execute(union(creator, members))]
+
+
+def _bump_dashboard_metrics(db: Session, user_ids, **deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    db.query(models.DashboardMetric).filter(
+        models.DashboardMetric.user_id.in_(set(user_ids)),
+        models.DashboardMetric.metric_date == metric_day(),
+    ).update({
+        getattr(models.DashboardMetric, field): getattr(models.DashboardMetric, field) + delta
+        for field, delta in deltas.items()
+    }, synchronize_session=False)
 
-        # Total users in the team across those projects (unique count)
-        team_user_ids = set()
-        for p in user_projects:
-            for member in p.team_members:
-                team_user_ids.add(member.user_id)
-        metrics["total_users"] = len(team_user_ids)
-
-        # Average project progress
-        if user_projects:
-            avg_progress = sum([p.progress for p in user_projects]) / len(user_projects)
-        else:
-            avg_progress = 0
-        metrics["average_project_progress"] = round(avg_progress, 2)
 
-        # Tasks by priority (for user's projects)
+def _record_task_metrics(db: Session, project_id: int, before, after):
+    # Project-wide counts for everyone who sees the project
+    project_deltas = {"total_tasks": int(after is not None) - int(before is not None)}
+    for snapshot, sign in ((before, -1), (after, 1)):
+        if snapshot and snapshot["priority"] in PRIORITY_METRICS:
+            field = PRIORITY_METRICS[snapshot["priority"]]
+            project_deltas[field] = project_deltas.get(field, 0) + sign
+    if any(project_deltas.values()):
+        _bump_dashboard_metrics(db, project_metric_users(db, project_id), **project_deltas)
+
+    # Assignee counts; a new task has no assignments yet (see record_assignment)
+    if before is None:
+        return
+    assignee_deltas = {
+        "assigned_tasks": -1 if after is None else 0,
+        "completed_tasks": int(bool(after and after["completed"])) - int(before["completed"]),
+        "overdue_tasks": int(bool(after and after["overdue"])) - int(before["overdue"]),
+    }
+    if not any(assignee_deltas.values()):
+        return
+    assignees = Counter(
+        user_id for (user_id,) in db.query(models.UserAssignment.user_id)
+        .filter(models.UserAssignment.task_id == before["task_id"])
+    )
+    # A user assigned twice to the same task counts twice, as in the full recompute
+    by_multiplicity = {}
+    for user_id, times in assignees.items():
+        by_multiplicity.setdefault(times, []).append(user_id)
+    for times, user_ids in by_multiplicity.items():
+        _bump_dashboard_metrics(
+            db, user_ids, **{field: delta * times for field, delta in assignee_deltas.items()}
+        )
+
+
+def record_assignment(db: Session, user_id: int, task):
+    """Count a new UserAssignment of a task (given as task_snapshot) in the user's rollup."""
+    _bump_dashboard_metrics(
+        db, [user_id],
+        assigned_tasks=1,
+        completed_tasks=int(task["completed"]),
+        overdue_tasks=int(task["overdue"]),
+    )
+
+
+def record_team_change(db: Session, project_id: int, user_id: int):
+    """A user joined or left a project: every dashboard that includes it needs a rebuild."""
+    invalidate_dashboard_metrics(db, set(project_metric_users(db, project_id)) | {user_id})
+
+
+def invalidate_dashboard_metrics(db: Session, user_ids=None):
+    query = db.query(models.DashboardMetric).filter(models.DashboardMetric.metric_date == metric_day())
+    if user_ids is not None:
+        query = query.filter(models.DashboardMetric.user_id.in_(set(user_ids)))
+    query.update({models.DashboardMetric.is_stale: True}, synchronize_session=False)
+
+
+def compute_dashboard_metrics(db: Session, user_id: int, day: date):
+    """Full recompute of one user's rollup from the source tables."""
+    projects = db.query(models.Project.project_id, models.Project.progress).filter(
+        (models.Project.creator_id == user_id) |
+        (models.Project.team_members.any(user_id=user_id))
+    ).all()
+    project_ids = [p.project_id for p in projects]
+
+    values = dict.fromkeys(METRIC_FIELDS, 0)
+    values["total_projects"] = len(projects)
+    values["progress_sum"] = sum((p.progress or Decimal("0") for p in projects), Decimal("0"))
+
+    if project_ids:
         priority_counts = db.query(
             models.Task.priority, func.count(models.Task.task_id)
         ).filter(models.Task.project_id.in_(project_ids))\
          .group_by(models.Task.priority).all()
-        metrics["tasks_by_priority"] = {priority: count for priority, count in priority_counts}
+        for priority, count in priority_counts:
+            values["total_tasks"] += count
+            if priority in PRIORITY_METRICS:
+                values[PRIORITY_METRICS[priority]] = count
 
-        # Assigned tasks (only for current user) - using UserAssignment
-        metrics["assigned_tasks"] = db.query(models.UserAssignment).filter(
-            models.UserAssignment.user_id == user_id
-        ).count()
+        # Total users in the team across those projects (unique count)
+        values["total_users"] = db.query(func.count(func.distinct(models.ProjectTeam.user_id)))\
+            .filter(models.ProjectTeam.project_id.in_(project_ids)).scalar() or 0
 
-        # Overdue tasks (user assigned)
-        now = datetime.utcnow()
-        metrics["overdue_tasks"] = db.query(models.Task)\
-            .join(models.UserAssignment)\
-            .filter(
-                models.UserAssignment.user_id == user_id,
-                models.Task.due_date < now,
-                models.Task.category != "Completed"
-            ).count()
-
-        # Completed tasks (user assigned)
-        metrics["completed_tasks"] = db.query(models.Task)\
-            .join(models.UserAssignment)\
-            .filter(
-                models.UserAssignment.user_id == user_id,
-                models.Task.category == "Completed"
-            ).count()
-
-        return metrics
+    # Assigned, completed and overdue tasks (user assigned) in one pass
+    assigned, completed, overdue = db.query(
+        func.count(models.UserAssignment.assignment_id),
+        func.sum(case((task_completed_clause(), 1), else_=0)),
+        func.sum(case((task_overdue_clause(day), 1), else_=0)),
+    ).join(models.Task, models.Task.task_id == models.UserAssignment.task_id)\
+     .filter(models.UserAssignment.user_id == user_id).one()
+    values["assigned_tasks"] = assigned
+    values["completed_tasks"] = int(completed or 0)
+    values["overdue_tasks"] = int(overdue or 0)
+
+    return values
+
+
+def refresh_dashboard_metrics(db: Session, user_id: int, day: date = None):
+    """Recompute and store one user's rollup row for the day (the fallback path)."""
+    day = day or metric_day()
+    values = compute_dashboard_metrics(db, user_id, day)
+    row = db.query(models.DashboardMetric).filter_by(user_id=user_id, metric_date=day).first()
+    if row is None:
+        row = models.DashboardMetric(user_id=user_id, metric_date=day)
+        db.add(row)
+    for field, value in values.items():
+        setattr(row, field, value)
+    row.is_stale = False
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request created the row first; overwrite it with our values
+        db.rollback()
+        row = db.query(models.DashboardMetric).filter_by(user_id=user_id, metric_date=day).one()
+        for field, value in values.items():
+            setattr(row, field, value)
+        row.is_stale = False
+        db.commit()
+    db.refresh(row)
+    return row
+
+
+def metric_row_to_dict(row):
+    total_projects = row.total_projects or 0
+    average = row.progress_sum / total_projects if total_projects else 0
+    return {
+        "total_projects": total_projects,
+        "total_tasks": row.total_tasks,
+        "total_users": row.total_users,
+        "average_project_progress": round(float(average), 2),
+        "tasks_by_priority": {
+            priority: getattr(row, field)
+            for priority, field in PRIORITY_METRICS.items()
+            if getattr(row, field)
+        },
+        "assigned_tasks": row.assigned_tasks,
+        "overdue_tasks": row.overdue_tasks,
+        "completed_tasks": row.completed_tasks,
+    }
+
+
+def get_dashboard_metrics(db: Session, current_user: Principal):
+    try:
+        # Single indexed read of today's rollup; rebuild it when missing or stale
+        row = db.query(models.DashboardMetric).filter_by(
+            user_id=current_user.user_id, metric_date=metric_day()
+        ).first()
+        if row is None or row.is_stale:
+            row = refresh_dashboard_metrics(db, current_user.user_id)
+        return metric_row_to_dict(row)
     except Exception as e:
         raise Exception(f"Error getting dashboard metrics: {str(e)}")
 
+
+def find_dashboard_metric_drift(db: Session, day: date = None):
+    """Compare stored (non-stale) rollups for a day against a full recompute."""
+    day = day or metric_day()
+    rows = db.query(models.DashboardMetric).filter(
+        models.DashboardMetric.metric_date == day,
+        models.DashboardMetric.is_stale.is_(False),
+    ).all()
+    drift = []
+    for row in rows:
+        expected = compute_dashboard_metrics(db, row.user_id, day)
+        stored = {field: getattr(row, field) for field in METRIC_FIELDS}
+        mismatched = {
+            field: {"stored": stored[field], "actual": expected[field]}
+            for field in METRIC_FIELDS
+            if stored[field] != expected[field]
+        }
+        if mismatched:
+            drift.append({"user_id": row.user_id, "metric_date": day, "fields": mismatched})
+    return drift
+
+
+def rebuild_dashboard_metrics(db: Session, day: date = None):
+    """Recompute every stored rollup row for a day."""
+    day = day or metric_day()
+    user_ids = [
+        user_id for (user_id,) in db.query(models.DashboardMetric.user_id)
+        .filter(models.DashboardMetric.metric_date == day, models.DashboardMetric.user_id.isnot(None))
+    ]
+    for user_id in user_ids:
+        refresh_dashboard_metrics(db, user_id, day)
+    return len(user_ids)
+
     
 def assign_user_to_task(db: Session, task_id: int, user_id: int):
     task = db.query(models.Task).filter(models.Task.task_id == task_id).first()
@@ -353,38 +1125,199 @@ def assign_user_to_task(db: Session, task_id: int, user_id: int):
         raise HTTPException(status_code=404, detail="User not found")
 
     # Check if the user is already assigned
-    existing_assignment = db.query(models.UserAssignments).filter(
-        models.UserAssignments.task_id == task_id,
-        models.UserAssignments.user_id == user_id
+    existing_assignment = db.query(models.UserAssignment).filter(
+        models.UserAssignment.task_id == task_id,
+        models.UserAssignment.user_id == user_id
     ).first()
 
     if existing_assignment:
         raise HTTPException(status_code=400, detail="User already assigned")
 
     # Assign the user
-    new_assignment = models.UserAssignments(task_id=task_id, user_id=user_id)
+    new_assignment = models.UserAssignment(task_id=task_id, user_id=user_id)
     db.add(new_assignment)
+    record_assignment(db, user_id, task_snapshot(task))
+    db.flush()
+    record_task_event(
+        db, task.project_id, "task.assignment_changed",
+        task_id=task_id, assignees=get_task_assignees(db, task_id),
+    )
     db.commit()
     
     return {"message": "User assigned to task"}
 
-def create_invite(db: Session, project_id: int, email: str):
-    token = str(uuid.uuid4())
+# Invitation lifecycle: pending invites expire after INVITE_TTL_DAYS (invite_sweeper.py marks
+# them), and expired or declined ones are deleted INVITE_ARCHIVE_DAYS after that
+INVITE_TTL_DAYS = int(os.getenv("INVITE_TTL_DAYS", "7"))
+INVITE_ARCHIVE_DAYS = int(os.getenv("INVITE_ARCHIVE_DAYS", "30"))
+
+
+def invite_is_live(invite, now=None) -> bool:
+    """Pending and not past its expiry, whether or not a sweep has marked it yet."""
+    return invite.status == "Pending" and (invite.expires_at is None or invite.expires_at > (now or datetime.utcnow()))
+
+
+def _live_invites(now):
+    invitation = models.ProjectInvitation
+    return and_(invitation.status == "Pending", or_(invitation.expires_at.is_(None), invitation.expires_at > now))
+
+
+def new_invite(db: Session, project_id: int, email: str):
+    """Add a pending invitation to the caller's transaction (flushed, so it has an id)."""
     invite = models.ProjectInvitation(
         project_id=project_id,  # Ensure project_id is stored
         email=email,
-        token=token,
-        status="Pending"
+        token=str(uuid.uuid4()),
+        status="Pending",
+        expires_at=datetime.utcnow() + timedelta(days=INVITE_TTL_DAYS),
     )
     db.add(invite)
+    db.flush()
+    return invite
+
+
+def create_invite(db: Session, project_id: int, email: str):
+    invite = new_invite(db, project_id, email)
     db.commit()
     db.refresh(invite)
     return invite
 
 
+def create_bulk_invites(db: Session, project_id: int, emails, build_email) -> list:
+    """Invite many addresses at once; one result per address, in request order.
+
+    Users and their memberships come from one query and pending invitations from a
+    second; the invitations and their outbox emails are inserted as two batches in one
+    transaction. ``build_email(invite)`` gets each new invitation (a dict with its token)
+    and returns the (sender, subject, html, text) to queue.
+
+    Addresses are matched case-insensitively whatever the column's collation; an
+    invitation is addressed to the user's stored spelling.
+    """
+    results, wanted = [], {}
+    for email in emails:
+        address = email.strip().lower()
+        if address in wanted:
+            results.append({"email": address, "status": "duplicate"})
+        elif "@" not in address or len(address) > 255:
+            results.append({"email": address, "status": "invalid"})
+        else:
+            wanted[address] = {"email": address, "status": None}
+            results.append(wanted[address])
+    if not wanted:
+        return results
+
+    users = db.query(models.User.email, models.ProjectTeam.project_team_id)\
+        .outerjoin(models.ProjectTeam, and_(
+            models.ProjectTeam.user_id == models.User.user_id, models.ProjectTeam.project_id == project_id
+        ))\
+        .filter(func.lower(models.User.email).in_(wanted)).all()
+    members = {user.email.lower() for user in users if user.project_team_id is not None}
+    known = {user.email.lower(): user.email for user in users}
+    now = datetime.utcnow()
+    pending = {row[0].lower() for row in db.query(models.ProjectInvitation.email).filter(
+        models.ProjectInvitation.project_id == project_id,
+        func.lower(models.ProjectInvitation.email).in_(wanted),
+        _live_invites(now),
+    )}
+
+    invites = []
+    for address, result in wanted.items():
+        if address not in known:
+            result["status"] = "not_found"
+        elif address in members:
+            result["status"] = "already_member"
+        elif address in pending:
+            result["status"] = "already_invited"
+        else:
+            result["status"] = "invited"
+            invites.append({
+                "project_id": project_id, "email": known[address], "token": str(uuid.uuid4()), "status": "Pending",
+                "expires_at": now + timedelta(days=INVITE_TTL_DAYS),
+            })
+    if not invites:
+        return results
+
+    try:
+        db.execute(insert(models.ProjectInvitation), invites)
+        # Tokens are ours and unique, so the new ids come back without RETURNING
+        ids = dict(db.query(models.ProjectInvitation.token, models.ProjectInvitation.invitation_id)
+                   .filter(models.ProjectInvitation.token.in_([i["token"] for i in invites])))
+        outbox = []
+        for invite in invites:
+            sender, subject, body, text_body = build_email(invite)
+            outbox.append({
+                "invitation_id": ids[invite["token"]], "sender": sender, "recipient": invite["email"],
+                "subject": subject, "body": body, "text_body": text_body, "status": "Pending", "attempts": 0, "next_attempt_at": now,
+            })
+        db.execute(insert(models.EmailOutbox), outbox)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error creating invitations: {str(e)}")
+    return results
+
+
 def get_invite_by_token(db: Session, token: str):
     return db.query(models.ProjectInvitation).filter(models.ProjectInvitation.token == token).first()
 
+
+def get_pending_invites(db: Session, project_id: int = None, email: str = None):
+    """Unexpired pending invitations for a project and/or an address, newest first."""
+    query = db.query(models.ProjectInvitation).filter(_live_invites(datetime.utcnow()))
+    if project_id is not None:
+        query = query.filter(models.ProjectInvitation.project_id == project_id)
+    if email is not None:
+        query = query.filter(models.ProjectInvitation.email == email)
+    return query.order_by(models.ProjectInvitation.created_at.desc()).all()
+
+
+def expire_invitations(db: Session, now: datetime, limit: int) -> int:
+    """Mark up to ``limit`` pending invitations past their expiry Expired, in one transaction.
+
+    Their emails still waiting in the outbox are dropped too. Returns how many expired.
+    """
+    invitation = models.ProjectInvitation
+    try:
+        ids = [row[0] for row in db.query(invitation.invitation_id).filter(
+            invitation.status == "Pending", invitation.expires_at <= now
+        ).order_by(invitation.expires_at).limit(limit)]
+        if not ids:
+            return 0
+        # Re-checked in the UPDATE, so an invite accepted meanwhile stays accepted
+        count = db.query(invitation).filter(invitation.invitation_id.in_(ids), invitation.status == "Pending")\
+            .update({invitation.status: "Expired"}, synchronize_session=False)
+        db.query(models.EmailOutbox).filter(
+            models.EmailOutbox.invitation_id.in_(ids), models.EmailOutbox.status == "Pending"
+        ).update({
+            models.EmailOutbox.status: "Failed", models.EmailOutbox.last_error: "Invitation expired",
+        }, synchronize_session=False)
+        db.commit()
+        return count
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error expiring invitations: {str(e)}")
+
+
+def archive_invitations(db: Session, older_than: datetime, limit: int) -> int:
+    """Delete up to ``limit`` expired or declined invitations that expired before ``older_than``."""
+    invitation = models.ProjectInvitation
+    try:
+        ids = [row[0] for row in db.query(invitation.invitation_id).filter(
+            invitation.status.in_(("Expired", "Declined")), invitation.expires_at < older_than
+        ).limit(limit)]
+        if not ids:
+            return 0
+        db.query(models.EmailOutbox).filter(models.EmailOutbox.invitation_id.in_(ids))\
+            .update({models.EmailOutbox.invitation_id: None}, synchronize_session=False)
+        count = db.query(invitation).filter(invitation.invitation_id.in_(ids))\
+            .delete(synchronize_session=False)
+        db.commit()
+        return count
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error archiving invitations: {str(e)}")
+
 def accept_invite(db: Session, invite: models.ProjectInvitation, user_id: int):
     invite.status = "Accepted"
     invite.accepted_at = datetime.utcnow()
@@ -392,12 +1325,95 @@ def accept_invite(db: Session, invite: models.ProjectInvitation, user_id: int):
     # Add user to the project team
     team_member = models.ProjectTeam(project_id=invite.project_id, user_id=user_id)
     db.add(team_member)
+    record_team_change(db, invite.project_id, user_id)
     
     db.commit()
     db.refresh(invite)
     return invite
 
 
+# Email outbox (drained by mail_outbox.MailOutbox)
+def enqueue_email(db: Session, recipient: str, subject: str, body: str, sender=None, invitation_id=None,
+                  text_body=None):
+    """Queue an email in the caller's transaction; it goes out once that commits."""
+    email = models.EmailOutbox(
+        recipient=recipient, subject=subject, body=body, text_body=text_body, sender=sender,
+        invitation_id=invitation_id, status="Pending", attempts=0, next_attempt_at=datetime.utcnow(),
+    )
+    db.add(email)
+    return email
+
+
+def _outbox_claimable(now):
+    outbox = models.EmailOutbox
+    return or_(
+        and_(outbox.status == "Pending", outbox.next_attempt_at <= now),
+        and_(outbox.status == "Sending", outbox.locked_until < now),  # its worker died mid-send
+    )
+
+
+def claim_outbox_batch(db: Session, claim: str, limit: int, lease_seconds: int):
+    """Mark up to ``limit`` due emails as Sending under ``claim`` and return them.
+
+    SKIP LOCKED lets workers in other processes claim different rows; the claimed_by
+    check covers databases without it.
+    """
+    outbox = models.EmailOutbox
+    now = datetime.utcnow()
+    try:
+        ids = [row[0] for row in db.query(outbox.email_id).filter(_outbox_claimable(now))
+               .order_by(outbox.next_attempt_at).limit(limit).with_for_update(skip_locked=True)]
+        if not ids:
+            db.commit()
+            return []
+        db.query(outbox).filter(outbox.email_id.in_(ids), _outbox_claimable(now)).update({
+            outbox.status: "Sending",
+            outbox.claimed_by: claim,
+            outbox.locked_until: now + timedelta(seconds=lease_seconds),
+            outbox.attempts: outbox.attempts + 1,
+        }, synchronize_session=False)
+        db.commit()
+        return db.query(
+            outbox.email_id, outbox.sender, outbox.recipient, outbox.subject, outbox.body, outbox.text_body, outbox.attempts
+        ).filter(outbox.email_id.in_(ids), outbox.claimed_by == claim).all()
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error claiming outbox emails: {str(e)}")
+
+
+def finish_outbox_email(db: Session, email_id: int, claim: str, error=None, retry_at=None):
+    """Record a send attempt: Sent, back to Pending until ``retry_at``, or Failed for good."""
+    outbox = models.EmailOutbox
+    if error is None:
+        values = {outbox.status: "Sent", outbox.sent_at: datetime.utcnow(), outbox.last_error: None}
+    elif retry_at is not None:
+        values = {outbox.status: "Pending", outbox.next_attempt_at: retry_at, outbox.last_error: error}
+    else:
+        values = {outbox.status: "Failed", outbox.last_error: error}
+    values.update({outbox.claimed_by: None, outbox.locked_until: None})
+    try:
+        # A claim that lapsed and was taken over is no longer ours to update
+        db.query(outbox).filter(outbox.email_id == email_id, outbox.claimed_by == claim)\
+            .update(values, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error updating outbox email: {str(e)}")
+
+
+def prune_email_outbox(db: Session, older_than: datetime) -> int:
+    """Delete sent emails created before ``older_than``; failed ones are kept for inspection."""
+    try:
+        count = db.query(models.EmailOutbox).filter(
+            models.EmailOutbox.status == "Sent", models.EmailOutbox.created_at < older_than
+        ).delete(synchronize_session=False)
+        db.commit()
+        return count
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error pruning email outbox: {str(e)}")
+
+
 def get_project_team_with_users(db: Session, project_id: int):
     try:
         team_members = db.query(
@@ -426,3 +1442,241 @@ def get_project_team_with_users(db: Session, project_id: int):
         raise Exception(f"Error fetching project team: {str(e)}")
 
 
+def get_project_member_stats(db: Session, project_id: int):
+    """Team members with their assigned/completed task counts in the project, in one query."""
+    try:
+        per_user = (
+            db.query(
+                models.UserAssignment.user_id.label("user_id"),
+                func.count(models.UserAssignment.assignment_id).label("assigned_tasks"),
+                func.sum(case((task_completed_clause(), 1), else_=0)).label("completed_tasks"),
+            )
+            .join(models.Task, models.Task.task_id == models.UserAssignment.task_id)
+            .filter(models.Task.project_id == project_id)
+            .group_by(models.UserAssignment.user_id)
+            .subquery()
+        )
+
+        members = (
+            db.query(
+                models.User.first_name,
+                models.User.last_name,
+                models.User.email,
+                func.coalesce(per_user.c.assigned_tasks, 0).label("assigned_tasks"),
+                func.coalesce(per_user.c.completed_tasks, 0).label("completed_tasks"),
+            )
+            .join(models.ProjectTeam, models.ProjectTeam.user_id == models.User.user_id)
+            .outerjoin(per_user, per_user.c.user_id == models.User.user_id)
+            .filter(models.ProjectTeam.project_id == project_id)
+            .all()
+        )
+
+        return [
+            {
+                "full_name": f"{member.first_name} {member.last_name}",
+                "email": member.email,
+                "assigned_tasks": member.assigned_tasks,
+                "completed_tasks": int(member.completed_tasks)
+            }
+            for member in members
+        ]
+    except Exception as e:
+        raise Exception(f"Error fetching project members: {str(e)}")
+
+
+# Delta sync (GET /dashboard/sync)
+# Cursors trail the clock by the longest expected transaction, so rows stamped by a
+# transaction that commits later are still picked up (a few rows may come twice)
+SYNC_CURSOR_LAG_SECONDS = int(os.getenv("SYNC_CURSOR_LAG_SECONDS", "5"))
+# Tombstones are kept this long; older cursors get a full sync instead
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+
+
+def encode_sync_cursor(moment: datetime) -> str:
+    return str(int(moment.replace(tzinfo=timezone.utc).timestamp() * 1_000_000))
+
+
+def decode_sync_cursor(cursor: str) -> datetime:
+    """Raises ValueError for anything that isn't a cursor from encode_sync_cursor()."""
+    micros = int(cursor)
+    try:
+        return datetime(1970, 1, 1) + timedelta(microseconds=micros)
+    except OverflowError:  # negative or past year 9999
+        raise ValueError("Sync cursor out of range")
+
+
+def _tombstone(mapper, connection, target):
+    if isinstance(target, models.Project):
+        # Everyone who could see the project needs to drop it
+        users = connection.execute(
+            union(
+                select(models.Project.creator_id).where(
+                    models.Project.project_id == target.project_id, models.Project.creator_id.isnot(None)
+                ),
+                select(models.ProjectTeam.user_id).where(models.ProjectTeam.project_id == target.project_id),
+            )
+        ).scalars().all()
+        rows = [
+            {"entity": "project", "entity_id": target.project_id, "project_id": target.project_id, "user_id": user_id}
+            for user_id in users
+        ]
+    elif isinstance(target, models.Task):
+        rows = [{"entity": "task", "entity_id": target.task_id, "project_id": target.project_id}]
+    elif isinstance(target, models.UserAssignment):
+        project_id = connection.execute(
+            select(models.Task.project_id).where(models.Task.task_id == target.task_id)
+        ).scalar()
+        rows = [{"entity": "assignment", "entity_id": target.assignment_id, "project_id": project_id}]
+    else:
+        rows = [{"entity": "team", "entity_id": target.project_team_id, "project_id": target.project_id,
+                 "user_id": target.user_id}]
+    if rows:
+        now = datetime.utcnow()
+        connection.execute(insert(models.SyncTombstone), [
+            {"project_id": None, "user_id": None, **row, "deleted_at": now} for row in rows
+        ])
+
+
+event.listen(models.Project, "before_delete", _tombstone)  # before: the team is still there
+for _model in (models.Task, models.UserAssignment, models.ProjectTeam):
+    event.listen(_model, "after_delete", _tombstone)
+
+
+@event.listens_for(Session, "after_flush")
+def _touch_projects(session, flush_context):
+    """Bump the version of every project whose tasks, assignments or team changed in the flush.
+
+    Keeps Projects.version a cheap stamp for everything shown under the project (ETags, sync).
+    """
+    project_ids, task_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (models.Task, models.ProjectTeam)):
+            project_ids.add(obj.project_id)
+        elif isinstance(obj, models.UserAssignment):
+            task_ids.add(obj.task_id)
+    connection = session.connection()
+    if task_ids:
+        project_ids.update(connection.execute(
+            select(models.Task.project_id).where(models.Task.task_id.in_(task_ids))
+        ).scalars())
+    project_ids.discard(None)
+    if project_ids:
+        connection.execute(
+            update(models.Project)
+            .where(models.Project.project_id.in_(project_ids))
+            .values(version=models.Project.version + 1)
+        )
+
+
+def get_user_version_stamp(db: Session, user_id: int):
+    """One aggregate over the projects a user's dashboard is built from.
+
+    Any change under those projects bumps a version (see _touch_projects), and joining or
+    leaving one changes the count and id sum, so equal stamps mean nothing to re-send.
+    """
+    member_of = select(models.ProjectTeam.project_id).where(models.ProjectTeam.user_id == user_id)
+    assigned = select(models.Task.project_id)\
+        .join(models.UserAssignment, models.UserAssignment.task_id == models.Task.task_id)\
+        .where(models.UserAssignment.user_id == user_id)
+    row = db.query(
+        func.count(models.Project.project_id),
+        func.sum(models.Project.project_id),
+        func.sum(models.Project.version),
+        func.max(models.Project.updated_at),
+    ).filter(or_(
+        models.Project.creator_id == user_id,
+        models.Project.project_id.in_(member_of),
+        models.Project.project_id.in_(assigned),
+    )).one()
+    return tuple(row)
+
+
+def get_sync_changes(db: Session, user_id: int, since: Optional[datetime] = None):
+    """Rows of the user's projects changed after ``since``, plus tombstones for deleted ones.
+
+    With no cursor, or one older than the tombstone retention, everything is returned with
+    ``full`` set and the client replaces its local copy.
+    """
+    try:
+        now = datetime.utcnow()
+        full = since is None or since < now - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+
+        visible = select(models.Project.project_id).where(or_(
+            models.Project.creator_id == user_id,
+            models.Project.project_id.in_(
+                select(models.ProjectTeam.project_id).where(models.ProjectTeam.user_id == user_id)
+            ),
+        ))
+
+        joined = []
+        if not full:
+            # Rows of a project the user just joined predate the cursor; send those projects whole
+            joined = [
+                project_id for (project_id,) in db.query(models.ProjectTeam.project_id)
+                .filter(models.ProjectTeam.user_id == user_id, models.ProjectTeam.updated_at > since)
+            ]
+
+        def changed(model, project_column):
+            if full:
+                return true()
+            return or_(model.updated_at > since, project_column.in_(joined))
+
+        projects = db.query(models.Project).options(joinedload(models.Project.creator))\
+            .filter(models.Project.project_id.in_(visible), changed(models.Project, models.Project.project_id)).all()
+        project_rows = []
+        for project, row in zip(projects, projects_to_dicts(db, projects)):
+            row.update(updated_at=project.updated_at, version=project.version)
+            project_rows.append(row)
+
+        tasks = db.query(
+            models.Task.task_id, models.Task.project_id, models.Task.title, models.Task.category,
+            models.Task.priority, models.Task.progress, models.Task.due_date, models.Task.created_at,
+            models.Task.updated_at, models.Task.version,
+        ).filter(models.Task.project_id.in_(visible), changed(models.Task, models.Task.project_id)).all()
+
+        assignments = db.query(
+            models.UserAssignment.assignment_id, models.UserAssignment.task_id, models.UserAssignment.user_id,
+            models.UserAssignment.assigned_at, models.UserAssignment.updated_at, models.UserAssignment.version,
+        ).join(models.Task, models.Task.task_id == models.UserAssignment.task_id)\
+            .filter(models.Task.project_id.in_(visible), changed(models.UserAssignment, models.Task.project_id)).all()
+
+        team = db.query(
+            models.ProjectTeam.project_team_id, models.ProjectTeam.project_id, models.ProjectTeam.user_id,
+            models.ProjectTeam.joined_at, models.ProjectTeam.updated_at, models.ProjectTeam.version,
+        ).filter(models.ProjectTeam.project_id.in_(visible), changed(models.ProjectTeam, models.ProjectTeam.project_id)).all()
+
+        deleted = []
+        if not full:
+            deleted = [
+                {"entity": row.entity, "id": row.entity_id, "project_id": row.project_id}
+                for row in db.query(
+                    models.SyncTombstone.entity, models.SyncTombstone.entity_id, models.SyncTombstone.project_id
+                ).filter(
+                    models.SyncTombstone.deleted_at > since,
+                    or_(models.SyncTombstone.project_id.in_(visible), models.SyncTombstone.user_id == user_id),
+                ).order_by(models.SyncTombstone.tombstone_id)
+            ]
+
+        return {
+            "cursor": encode_sync_cursor(now - timedelta(seconds=SYNC_CURSOR_LAG_SECONDS)),
+            "full": full,
+            "projects": project_rows,
+            "tasks": [row._asdict() for row in tasks],
+            "assignments": [row._asdict() for row in assignments],
+            "team": [row._asdict() for row in team],
+            "deleted": deleted,
+        }
+    except Exception as e:
+        raise Exception(f"Error fetching sync changes: {str(e)}")
+
+
+def prune_sync_tombstones(db: Session, older_than: datetime) -> int:
+    try:
+        count = db.query(models.SyncTombstone)\
+            .filter(models.SyncTombstone.deleted_at < older_than)\
+            .delete(synchronize_session=False)
+        db.commit()
+        return count
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error pruning sync tombstones: {str(e)}")
@@ -1,7 +1,11 @@
 import os
+import threading
+import time
 import pymysql
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
 # Enable PyMySQL as MySQLdb
@@ -13,11 +17,170 @@ DATABASE_URL = os.getenv(
     "mysql+pymysql://user:capstone123@db:3306/capstone_project"  # KEEP this as is, container uses 3306
 )
 
+# Async routes use the same database through an asyncio driver
+ASYNC_DRIVERS = {
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+# Connection pool settings, per process: size them so that
+# (uvicorn workers) x (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under MySQL's max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))  # below MySQL's wait_timeout
+# "pre_ping": ping on every checkout; "idle": ping only connections idle longer than
+# DB_POOL_IDLE_PING_SECONDS; "none": rely on DB_POOL_RECYCLE alone
+DB_POOL_LIVENESS = os.getenv("DB_POOL_LIVENESS", "pre_ping")
+DB_POOL_IDLE_PING_SECONDS = float(os.getenv("DB_POOL_IDLE_PING_SECONDS", "30"))
+
+# Checkout wait-time histogram bucket upper bounds, in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, float("inf"))
+
+
+class PoolStats:
+    """Checkout wait-time histogram for one pool class."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.buckets = [0] * len(WAIT_BUCKETS_MS)
+            self.count = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+            self.timeouts = 0
+
+    def observe(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            self.count += 1
+            self.total_ms += wait_ms
+            self.max_ms = max(self.max_ms, wait_ms)
+            self.timeouts += int(timed_out)
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.buckets[i] += 1
+                    break
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.count,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.total_ms / self.count, 3) if self.count else 0.0,
+                "wait_ms_max": round(self.max_ms, 3),
+                "wait_ms_histogram": {
+                    ("+Inf" if bound == float("inf") else f"le_{bound}"): n
+                    for bound, n in zip(WAIT_BUCKETS_MS, self.buckets)
+                },
+            }
+
+
+class InstrumentedPoolMixin:
+    # Class-level so the stats survive engine.dispose(), which recreates the pool
+    stats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.observe((time.perf_counter() - started) * 1000, timed_out=True)
+            raise
+        self.stats.observe((time.perf_counter() - started) * 1000)
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    stats = PoolStats()
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+
+def engine_options(url: str, poolclass):
+    if url.startswith("sqlite"):
+        # SQLite picks its own pool; the sizing knobs do not apply
+        return {"pool_pre_ping": DB_POOL_LIVENESS == "pre_ping"}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_LIVENESS == "pre_ping",
+    }
+
+
+def install_idle_ping(sync_engine, idle_seconds: float = DB_POOL_IDLE_PING_SECONDS):
+    """Ping a connection on checkout only if it sat idle in the pool for too long."""
+
+    @event.listens_for(sync_engine, "checkin")
+    def _mark_idle(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        try:
+            alive = sync_engine.dialect.do_ping(dbapi_connection)
+        except Exception:
+            alive = False
+        if not alive:
+            # The pool discards this connection and retries the checkout with a fresh one
+            raise exc.DisconnectionError("Idle connection failed liveness ping")
+
+
 # Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, InstrumentedQueuePool))
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, InstrumentedAsyncQueuePool)
+)
+if DB_POOL_LIVENESS == "idle":
+    install_idle_ping(engine)
+    install_idle_ping(async_engine.sync_engine)
+
+
+def pool_status(pool):
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),  # negative while the pool is not yet full
+        })
+    if isinstance(pool, InstrumentedPoolMixin):
+        status.update(pool.stats.snapshot())
+    return status
+
+
+def pool_stats():
+    """Current occupancy and checkout wait times of this worker's pools."""
+    return {
+        "liveness": DB_POOL_LIVENESS,
+        "sync": pool_status(engine.pool),
+        "async": pool_status(async_engine.sync_engine.pool),
+    }
 
 # Create a configured session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes stay readable after commit without an awaited refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -29,3 +192,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency to get an async DB session (for async def routes)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,21 +1,15 @@
+import os
 import smtplib
+import threading
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from sqlalchemy.orm import Session
-import models
+from email_templates import render_invite
 
 from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables
 
-def send_invite_email(db: Session, receiver_email: str, project_id: int, invite_link: str):
-    # Get credentials from environment
-    sender_email = os.getenv("SMTP_EMAIL")
-    sender_password = os.getenv("SMTP_PASSWORD")
-    
-    if not sender_email or not sender_password:
-        raise ValueError("SMTP credentials not configured")
-
 # Define SMTP configurations for multiple providers
 SMTP_CONFIGS = {
     "gmail.com": {"server": "smtp.gmail.com", "port": 587},
@@ -26,54 +20,232 @@ SMTP_CONFIGS = {
     "icloud.com": {"server": "smtp.mail.me.com", "port": 587},
 }
 
+# SMTP_HOST/SMTP_PORT override the provider lookup (a relay, or a local server in tests);
+# SMTP_STARTTLS=0 talks plain SMTP to it
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+# Authenticated sessions kept per (server, sender): at most SMTP_POOL_SIZE open, closed after
+# SMTP_IDLE_TIMEOUT seconds unused, RSET before each reuse and NOOPed by maintain() after SMTP_NOOP_AFTER
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+SMTP_NOOP_AFTER = float(os.getenv("SMTP_NOOP_AFTER", "10"))
+
 def get_smtp_config(email: str):
     """Determine the SMTP server based on the sender's email domain."""
+    if SMTP_HOST:
+        return {"server": SMTP_HOST, "port": SMTP_PORT}
     domain = email.split("@")[-1]  # Extract domain from email
     return SMTP_CONFIGS.get(domain, SMTP_CONFIGS["gmail.com"])  # Default to Gmail
 
-def send_invite_email(db: Session, sender_email: str, sender_password: str, receiver_email: str, project_id: int, invite_link: str):
-    # Fetch the project title from the database
-    project = db.query(models.Project).filter(models.Project.project_id == project_id).first()
-    
-    if not project:
-        print("Project not found!")
-        return
-    
-    project_title = project.title  # Get the title of the project
-
-    msg = MIMEMultipart()
-    msg["From"] = sender_email
-    msg["To"] = receiver_email
-    msg["Subject"] = f"Invitation to Join {project_title} Project"
-
-    body = f"""
-    <html>
-        <body>
-            <h3>You have been invited to join the project: <strong>{project_title}</strong>!</h3>
-            <p>Click the link below to accept the invitation:</p>
-            <a href="{invite_link}">{invite_link}</a>
-            <p>Best regards,</p>
-            <p>{sender_email}</p>
-        </body>
-    </html>
-    """
-    msg.attach(MIMEText(body, "html"))
 
+def open_smtp_session(sender_email: str, sender_password: str):
+    """Connect, STARTTLS and log in to the sender's SMTP server."""
     # Get SMTP settings based on the sender's email provider
     smtp_config = get_smtp_config(sender_email)
     smtp_server = smtp_config["server"]
     smtp_port = smtp_config["port"]
 
+    smtp_class = smtplib.SMTP_SSL if smtp_port == 465 else smtplib.SMTP
+    server = smtp_class(smtp_server, smtp_port, timeout=SMTP_TIMEOUT)
+    try:
+        if SMTP_STARTTLS and smtp_class is smtplib.SMTP:
+            server.starttls()
+        if sender_password:
+            server.login(sender_email, sender_password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def _quit(server):
     try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
         server.quit()
+    except Exception:
+        server.close()
+
+
+class SMTPPool:
+    """Logged-in SMTP sessions per (server, port, sender), reused across sends.
+
+    Thread-safe; the outbox workers send from threads. A pooled session is checked with
+    RSET before each send, and one that turns out to be dead is dropped for another (or a
+    new) one. Once a send has started it is never retried here: the server may already
+    have taken the message, so the error goes back to the caller (the outbox retries
+    with backoff).
+    """
+
+    def __init__(self, size: int = SMTP_POOL_SIZE, idle_timeout: float = SMTP_IDLE_TIMEOUT,
+                 noop_after: float = SMTP_NOOP_AFTER):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.stats = {"connects": 0, "reused": 0, "reconnects": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._idle = {}  # key -> [(server, last_used)], most recently used last
+        self._slots = {}  # key -> BoundedSemaphore(size)
+
+    def _key(self, sender_email: str):
+        smtp_config = get_smtp_config(sender_email)
+        return smtp_config["server"], smtp_config["port"], sender_email
+
+    def _checkout(self, key):
+        """An idle session for ``key`` that answers RSET, or None."""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                server, last_used = idle.pop()
+            if time.monotonic() - last_used > self.idle_timeout:
+                self.stats["evicted"] += 1
+                _quit(server)
+                continue
+            # Nothing has been sent on it yet, so a dead session is safe to swap for another
+            try:
+                if server.rset()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("RSET failed")
+            except Exception:
+                self.stats["reconnects"] += 1
+                server.close()
+                continue
+            self.stats["reused"] += 1
+            return server
+
+    def _checkin(self, key, server):
+        with self._lock:
+            self._idle.setdefault(key, []).append((server, time.monotonic()))
+
+    def _slots_for(self, key):
+        with self._lock:
+            return self._slots.setdefault(key, threading.BoundedSemaphore(self.size))
+
+    def sendmail(self, sender_email: str, sender_password: str, receiver_email: str, message: str):
+        key = self._key(sender_email)
+        with self._slots_for(key):
+            self._send(key, sender_email, sender_password, receiver_email, message)
+
+    def sendmany(self, sender_email: str, sender_password: str, messages):
+        """Send (recipient, message) pairs back to back on one pooled session.
+
+        Returns None or the exception for each message, in order.
+        """
+        key = self._key(sender_email)
+        results = []
+        with self._slots_for(key):
+            for receiver_email, message in messages:
+                try:
+                    self._send(key, sender_email, sender_password, receiver_email, message)
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def _send(self, key, sender_email: str, sender_password: str, receiver_email: str, message: str):
+        server = self._checkout(key)
+        if server is None:
+            server = open_smtp_session(sender_email, sender_password)
+            self.stats["connects"] += 1
+        try:
+            server.sendmail(sender_email, receiver_email, message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+            # The server refused this message; the session itself is still good
+            try:
+                server.rset()
+                self._checkin(key, server)
+            except Exception:
+                server.close()
+            raise
+        except Exception:
+            # A timeout or drop mid-send: the message may have gone, so don't send it again
+            server.close()
+            raise
+        self._checkin(key, server)
+
+    def maintain(self):
+        """Close sessions unused for idle_timeout and NOOP the others idle past noop_after.
+
+        Run between sends (the outbox workers call it when they go idle), so dead sessions
+        are dropped before a send would trip over them.
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired, probe = [], []
+            for key, idle in self._idle.items():
+                keep = []
+                for server, last_used in idle:
+                    if now - last_used > self.idle_timeout:
+                        expired.append(server)
+                    elif now - last_used > self.noop_after:
+                        probe.append((key, server, last_used))
+                    else:
+                        keep.append((server, last_used))
+                idle[:] = keep
+        for server in expired:
+            self.stats["evicted"] += 1
+            _quit(server)
+        for key, server, last_used in probe:
+            try:
+                alive = server.noop()[0] == 250
+            except Exception:
+                alive = False
+            if not alive:
+                self.stats["evicted"] += 1
+                server.close()
+                continue
+            with self._lock:
+                self._idle.setdefault(key, []).insert(0, (server, last_used))
+
+    def close_all(self):
+        with self._lock:
+            servers = [server for idle in self._idle.values() for server, _ in idle]
+            self._idle.clear()
+        for server in servers:
+            _quit(server)
+
+
+smtp_pool = SMTPPool()
+
+
+def _message(sender_email: str, receiver_email: str, subject: str, body: str, text_body: str = None) -> str:
+    # HTML with a plain-text alternative when there is one
+    msg = MIMEMultipart("alternative" if text_body else "mixed")
+    msg["From"] = sender_email
+    msg["To"] = receiver_email
+    msg["Subject"] = subject
+    if text_body:
+        msg.attach(MIMEText(text_body, "plain"))
+    msg.attach(MIMEText(body, "html"))
+    return msg.as_string()
+
+
+def send_email(sender_email: str, sender_password: str, receiver_email: str, subject: str, body: str,
+               text_body: str = None):
+    """Send one HTML email over a pooled session; raises on failure."""
+    message = _message(sender_email, receiver_email, subject, body, text_body)
+    smtp_pool.sendmail(sender_email, sender_password, receiver_email, message)
+
+
+def send_emails(sender_email: str, sender_password: str, emails):
+    """Send (recipient, subject, html, text) emails on one pooled session; text may be None.
+
+    Returns None or the exception for each email, so the outbox can retry just the failures.
+    """
+    messages = [
+        (receiver_email, _message(sender_email, receiver_email, subject, body, text_body))
+        for receiver_email, subject, body, text_body in emails
+    ]
+    return smtp_pool.sendmany(sender_email, sender_password, messages)
+
+
+def send_invite_email(sender_email: str, sender_password: str, receiver_email: str, project_title: str, invite_link: str):
+    # Sends inside the caller's request; routes queue invitations through the outbox instead.
+    # The caller passes the project title it already loaded.
+    subject, body, text_body = render_invite(project_title, sender_email, invite_link)
+    try:
+        send_email(sender_email, sender_password, receiver_email, subject, body, text_body)
         print(f"Invitation email sent successfully to {receiver_email}")
     except Exception as e:
         print(f"Failed to send email: {str(e)}")
-
-        
-        
-        
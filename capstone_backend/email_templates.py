@@ -0,0 +1,110 @@
+"""Invitation email templates, compiled once at import and rendered from caller data.
+
+Rendering never touches the database: callers pass the project title they already
+loaded. The parts that are the same for every address in a (bulk) invite, the subject
+and the bodies with the title and sender filled in, are compiled once per project and
+cached, so each address only costs splicing in its link.
+"""
+import functools
+import html
+from string import Template
+
+INVITE_SUBJECT = "Invitation to Join ${project_title} Project"
+
+INVITE_HTML = """
+    <html>
+        <body>
+            <h3>You have been invited to join the project: <strong>${project_title}</strong>!</h3>
+            <p>Click the link below to accept the invitation:</p>
+            <a href="${invite_link}">${invite_link}</a>
+            <p>Best regards,</p>
+            <p>${sender_email}</p>
+        </body>
+    </html>
+    """
+
+INVITE_TEXT = """You have been invited to join the project: ${project_title}!
+
+Open the link below to accept the invitation:
+${invite_link}
+
+Best regards,
+${sender_email}
+"""
+
+
+class CompiledTemplate:
+    """A ``${name}`` template split once into literal text and fields.
+
+    ``escape`` HTML-escapes every value. partial() folds some values into the literals.
+    """
+
+    def __init__(self, source: str, escape: bool = False):
+        self.escape = escape
+        self.parts = []  # literal strings and ("field",) tuples, in order
+        position = 0
+        for match in Template.pattern.finditer(source):
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                continue  # $$ and stray $ stay as written
+            self.parts.append(source[position:match.start()])
+            self.parts.append((name,))
+            position = match.end()
+        self.parts.append(source[position:])
+        self.fields = {part[0] for part in self.parts if isinstance(part, tuple)}
+
+    @classmethod
+    def _from_parts(cls, parts, escape):
+        template = cls.__new__(cls)
+        template.escape = escape
+        # Merge neighbouring literals so render() joins as few pieces as possible
+        template.parts = []
+        for part in parts:
+            if isinstance(part, str) and template.parts and isinstance(template.parts[-1], str):
+                template.parts[-1] += part
+            else:
+                template.parts.append(part)
+        template.fields = {part[0] for part in template.parts if isinstance(part, tuple)}
+        return template
+
+    def _value(self, value) -> str:
+        return html.escape(str(value)) if self.escape else str(value)
+
+    def partial(self, **values) -> "CompiledTemplate":
+        parts = [
+            self._value(values[part[0]]) if isinstance(part, tuple) and part[0] in values else part
+            for part in self.parts
+        ]
+        return CompiledTemplate._from_parts(parts, self.escape)
+
+    def render(self, **values) -> str:
+        """KeyError for a field without a value."""
+        return "".join(
+            self._value(values[part[0]]) if isinstance(part, tuple) else part
+            for part in self.parts
+        )
+
+
+INVITE_TEMPLATES = (
+    CompiledTemplate(INVITE_SUBJECT),
+    CompiledTemplate(INVITE_HTML, escape=True),
+    CompiledTemplate(INVITE_TEXT),
+)
+
+
+@functools.lru_cache(maxsize=256)
+def invite_templates(project_title: str, sender_email: str):
+    """Subject, HTML and text templates with the per-project values already filled in."""
+    subject, html_body, text_body = INVITE_TEMPLATES
+    sender_email = sender_email or ""
+    return (
+        subject.partial(project_title=" ".join(project_title.splitlines())),  # no header injection
+        html_body.partial(project_title=project_title, sender_email=sender_email),
+        text_body.partial(project_title=project_title, sender_email=sender_email),
+    )
+
+
+def render_invite(project_title: str, sender_email: str, invite_link: str):
+    """(subject, html, text) of a project invitation."""
+    subject, html_body, text_body = invite_templates(project_title, sender_email)
+    return subject.render(), html_body.render(invite_link=invite_link), text_body.render(invite_link=invite_link)
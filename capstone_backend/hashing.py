@@ -0,0 +1,101 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+# bcrypt runs here instead of on the request threadpool. "process" gives true parallelism
+# across cores; "thread" is enough when bcrypt releases the GIL and avoids worker start-up.
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class HashingOverloaded(Exception):
+    """The hashing queue is full; callers should shed the request (503)."""
+
+
+class HashingPool:
+    """Size-limited executor for password hashing with a cap on queued + running jobs."""
+
+    def __init__(self, kind: str = HASH_EXECUTOR, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown hash executor: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use so importing the app never forks worker processes
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing")
+        return self._executor
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingOverloaded(f"{self.pending} password hashes already queued")
+            self.pending += 1
+            executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _release(self, *_):
+        with self._lock:
+            self.pending -= 1
+
+
+hashing_pool = HashingPool()
+
+
+async def hash_password(password: str) -> str:
+    return await hashing_pool.run(_hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await hashing_pool.run(_verify, plain_password, hashed_password)
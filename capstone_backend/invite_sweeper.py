@@ -0,0 +1,78 @@
+"""Background expiry of project invitations.
+
+Every INVITE_SWEEP_INTERVAL seconds the sweeper marks pending invitations past their
+expires_at as Expired, then deletes expired and declined ones INVITE_ARCHIVE_DAYS after
+they expired. Both run in batches of INVITE_SWEEP_BATCH rows, one short transaction each,
+so a large backlog never holds locks for long. Running it in several app processes is
+safe: a batch only touches rows still in the state it selected them in.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+import crud
+from db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+INVITE_SWEEP_INTERVAL = float(os.getenv("INVITE_SWEEP_INTERVAL", "300"))
+INVITE_SWEEP_BATCH = int(os.getenv("INVITE_SWEEP_BATCH", "500"))
+
+
+class InviteSweeper:
+    def __init__(self, interval: float = INVITE_SWEEP_INTERVAL, batch_size: int = INVITE_SWEEP_BATCH,
+                 session_factory=SessionLocal):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.stats = {"sweeps": 0, "expired": 0, "archived": 0}
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Invitation sweep failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        """One full sweep; returns (expired, archived)."""
+        return await asyncio.to_thread(self._sweep)
+
+    def _sweep(self):
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            expired = self._drain(lambda: crud.expire_invitations(db, now, self.batch_size))
+            archive_before = now - timedelta(days=crud.INVITE_ARCHIVE_DAYS)
+            archived = self._drain(lambda: crud.archive_invitations(db, archive_before, self.batch_size))
+        finally:
+            db.close()
+        self.stats["sweeps"] += 1
+        self.stats["expired"] += expired
+        self.stats["archived"] += archived
+        return expired, archived
+
+    def _drain(self, batch) -> int:
+        total = 0
+        while True:
+            count = batch()
+            total += count
+            if count < self.batch_size:
+                return total
+
+
+invite_sweeper = InviteSweeper()
@@ -0,0 +1,127 @@
+"""Durable outbound email: rows in email_outbox drained by background workers.
+
+Requests only insert the row (crud.enqueue_email) in their own transaction, so nothing
+waits on SMTP. Each worker claims a batch of due rows, sends them on a thread and marks
+them Sent; a failed send goes back to Pending with exponential backoff until
+MAIL_MAX_ATTEMPTS, then stays Failed. Claims carry a lease, so a row held by a worker
+that died is picked up again once the lease runs out.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import crud
+import email_sender
+from db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "10"))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "5"))  # seconds; new mail wakes the workers sooner
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "8"))
+MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", "30"))  # seconds before the first retry, doubling after
+MAIL_RETRY_MAX = float(os.getenv("MAIL_RETRY_MAX", "3600"))
+MAIL_LEASE_SECONDS = int(os.getenv("MAIL_LEASE_SECONDS", "300"))
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next try after ``attempts`` failures, with +/-20% jitter."""
+    delay = min(MAIL_RETRY_MAX, MAIL_RETRY_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class MailOutbox:
+    def __init__(self, workers: int = MAIL_WORKERS, batch_size: int = MAIL_BATCH_SIZE,
+                 session_factory=SessionLocal, send=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.send = send  # None: email_sender.send_emails, looked up per batch
+        self.stats = {"sent": 0, "retried": 0, "failed": 0}
+        self._tasks = []
+        self._wake = None
+        self._loop = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """Tell idle workers there is new mail; safe to call from a sync route's thread."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _worker(self):
+        while True:
+            self._wake.clear()  # before the batch, so mail queued during it isn't missed
+            try:
+                processed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Mail outbox batch failed")
+                processed = 0
+            if processed:
+                continue  # there may be more due
+            await asyncio.to_thread(email_sender.smtp_pool.maintain)
+            # asyncio.wait rather than wait_for, which can swallow a cancel on 3.11 (see realtime.py)
+            waiter = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=MAIL_POLL_INTERVAL)
+            finally:
+                waiter.cancel()
+
+    async def run_once(self) -> int:
+        """Claim and send one batch; returns how many emails were attempted."""
+        return await asyncio.to_thread(self._process_batch)
+
+    def _process_batch(self) -> int:
+        claim = str(uuid.uuid4())
+        db = self.session_factory()
+        try:
+            emails = crud.claim_outbox_batch(db, claim, self.batch_size, MAIL_LEASE_SECONDS)
+            # One batched send per sender, so each batch goes over one SMTP session
+            by_sender = {}
+            for email in emails:
+                by_sender.setdefault(email.sender or os.getenv("SMTP_EMAIL"), []).append(email)
+            send = self.send or email_sender.send_emails
+            for sender, batch in by_sender.items():
+                try:
+                    errors = send(sender, os.getenv("SMTP_PASSWORD"),
+                                  [(e.recipient, e.subject, e.body, e.text_body) for e in batch])
+                except Exception as e:
+                    errors = [e] * len(batch)
+                for email, error in zip(batch, errors):
+                    self._record(db, claim, email, error)
+            return len(emails)
+        finally:
+            db.close()
+
+    def _record(self, db, claim: str, email, error):
+        if error is None:
+            self.stats["sent"] += 1
+            crud.finish_outbox_email(db, email.email_id, claim)
+            return
+        error = f"{type(error).__name__}: {error}"
+        if email.attempts >= MAIL_MAX_ATTEMPTS:
+            self.stats["failed"] += 1
+            logger.warning("Giving up on email %s to %s: %s", email.email_id, email.recipient, error)
+            crud.finish_outbox_email(db, email.email_id, claim, error=error)
+        else:
+            self.stats["retried"] += 1
+            retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(email.attempts))
+            crud.finish_outbox_email(db, email.email_id, claim, error=error, retry_at=retry_at)
+
+
+mail_outbox = MailOutbox()
@@ -5,13 +5,19 @@ from sqlalchemy.exc import OperationalError
 from routes.auth import auth_router 
 from routes.dashboard import router as dashboard_router
 from routes.invite import invite_router
-from db import Base, engine, SessionLocal  # Ensure SessionLocal is imported
+from db import Base, engine, SessionLocal, pool_stats  # Ensure SessionLocal is imported
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.openapi.models import OAuthFlows as OAuthFlowsModel
 from fastapi.openapi.models import OAuthFlowPassword
 from fastapi.security import OAuth2PasswordBearer
-from routes.dashboard import websocket_endpoint
+from hashing import hashing_pool
+from realtime import hub
+from progress_coalescer import progress_coalescer
+from serializers import FastJSONResponse
+from mail_outbox import mail_outbox
+from email_sender import smtp_pool
+from invite_sweeper import invite_sweeper
 
 
 # --- Create tables ---
@@ -20,7 +26,38 @@ Base.metadata.create_all(bind=engine)
 # --- OAuth setup ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")  
 
-app = FastAPI(title="Project Management API")
+# orjson rendering for every route that returns plain data
+app = FastAPI(title="Project Management API", default_response_class=FastJSONResponse)
+
+@app.on_event("startup")
+async def start_realtime_hub():
+    await hub.start()
+
+@app.on_event("shutdown")
+async def stop_realtime_hub():
+    await progress_coalescer.flush_all()  # don't lose progress still inside its window
+    await hub.stop()
+
+@app.on_event("startup")
+async def start_mail_outbox():
+    await mail_outbox.start()
+
+@app.on_event("shutdown")
+async def stop_mail_outbox():
+    await mail_outbox.stop()  # unsent mail stays in the outbox for the next start
+    smtp_pool.close_all()
+
+@app.on_event("startup")
+async def start_invite_sweeper():
+    await invite_sweeper.start()
+
+@app.on_event("shutdown")
+async def stop_invite_sweeper():
+    await invite_sweeper.stop()
+
+@app.on_event("shutdown")
+def shutdown_hashing_pool():
+    hashing_pool.shutdown()
 
 @app.get("/protected-endpoint")
 async def protected(token: str = Depends(oauth2_scheme)):
@@ -33,6 +70,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # so browser clients can follow list pages
 )
 
 # --- Routes ---
@@ -48,6 +86,14 @@ def home():
 def health_check():
     return {"status": "healthy"}
 
-@app.websocket("/dashboard/ws/progress/{project_id}")
-async def websocket_route(websocket: WebSocket, project_id: int):
-    await websocket_endpoint(websocket, project_id)
+@app.get("/health/db-pool")
+def db_pool_stats():
+    return pool_stats()
+
+@app.get("/health/realtime")
+def realtime_stats():
+    return {"progress_events": progress_coalescer.stats, "sockets": hub.connections.stats}
+
+@app.get("/health/mail")
+def mail_stats():
+    return {"outbox": mail_outbox.stats, "smtp": smtp_pool.stats, "invites": invite_sweeper.stats}
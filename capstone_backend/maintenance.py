@@ -0,0 +1,117 @@
+"""Operational commands for keeping denormalised data in line with the source tables.
+
+Usage:
+    python maintenance.py rebuild-project-counters
+    python maintenance.py check-project-counters
+    python maintenance.py rebuild-dashboard-metrics
+    python maintenance.py check-dashboard-metrics
+    python maintenance.py prune-project-events [--keep-days 7]
+    python maintenance.py prune-sync-tombstones
+    python maintenance.py prune-email-outbox [--keep-days 7]
+    python maintenance.py sweep-invitations
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+import crud
+from db import SessionLocal
+from invite_sweeper import InviteSweeper
+
+
+def rebuild_project_counters(db):
+    crud.rebuild_project_counters(db)
+    print("Project counters rebuilt from Tasks")
+    return 0
+
+
+def check_project_counters(db):
+    drift = crud.find_project_counter_drift(db)
+    for row in drift:
+        print(
+            f"Project {row['project_id']}: stored {row['completed_count']}/{row['total_count']}, "
+            f"actual {row['actual_completed']}/{row['actual_total']}"
+        )
+    if not drift:
+        print("Project counters are consistent")
+    return 1 if drift else 0
+
+
+def rebuild_dashboard_metrics(db):
+    count = crud.rebuild_dashboard_metrics(db)
+    print(f"Rebuilt {count} dashboard rollups for today")
+    return 0
+
+
+def check_dashboard_metrics(db):
+    drift = crud.find_dashboard_metric_drift(db)
+    for row in drift:
+        fields = ", ".join(
+            f"{field} stored {values['stored']} actual {values['actual']}"
+            for field, values in row["fields"].items()
+        )
+        print(f"User {row['user_id']} ({row['metric_date']}): {fields}")
+    if not drift:
+        print("Dashboard rollups are consistent")
+    return 1 if drift else 0
+
+
+def prune_project_events(db, keep_days=7):
+    # Clients further behind than this are told to reload the board instead of resuming
+    count = crud.prune_project_events(db, datetime.utcnow() - timedelta(days=keep_days))
+    print(f"Pruned {count} project events older than {keep_days} days")
+    return 0
+
+
+def prune_sync_tombstones(db):
+    # Clients with older cursors get a full sync, so nothing past retention is needed
+    cutoff = datetime.utcnow() - timedelta(days=crud.SYNC_TOMBSTONE_RETENTION_DAYS)
+    count = crud.prune_sync_tombstones(db, cutoff)
+    print(f"Pruned {count} sync tombstones older than {crud.SYNC_TOMBSTONE_RETENTION_DAYS} days")
+    return 0
+
+
+def prune_email_outbox(db, keep_days=7):
+    # Only sent mail goes; Failed rows stay until someone has looked at them
+    count = crud.prune_email_outbox(db, datetime.utcnow() - timedelta(days=keep_days))
+    print(f"Pruned {count} sent emails older than {keep_days} days")
+    return 0
+
+
+def sweep_invitations(db):
+    # The same sweep the app runs in the background (invite_sweeper.py)
+    expired, archived = asyncio.run(InviteSweeper(session_factory=lambda: db).run_once())
+    print(f"Expired {expired} invitations, archived {archived}")
+    return 0
+
+
+COMMANDS = {
+    "rebuild-project-counters": rebuild_project_counters,
+    "check-project-counters": check_project_counters,
+    "rebuild-dashboard-metrics": rebuild_dashboard_metrics,
+    "check-dashboard-metrics": check_dashboard_metrics,
+    "prune-project-events": prune_project_events,
+    "prune-sync-tombstones": prune_sync_tombstones,
+    "prune-email-outbox": prune_email_outbox,
+    "sweep-invitations": sweep_invitations,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--keep-days", type=int, default=7, help="prune-project-events and prune-email-outbox only")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command in ("prune-project-events", "prune-email-outbox"):
+            return COMMANDS[args.command](db, args.keep_days)
+        return COMMANDS[args.command](db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,23 @@
-from sqlalchemy import Column, Integer, String, DECIMAL, ForeignKey, Enum, DateTime, Date
+from sqlalchemy import Column, Integer, String, DECIMAL, ForeignKey, Enum, DateTime, Date, Boolean, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal_column
+from sqlalchemy.dialects import mysql
 from db import Base  # Import the Base from your db connection
 from datetime import datetime
 
 from sqlalchemy import Date  # already imported
 
-class Project(Base):
+# Microsecond precision on MySQL, so GET /dashboard/sync cursors can tell changes apart
+SyncTimestamp = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
+
+class SyncVersioned:
+    """Change stamps read by GET /dashboard/sync; bulk UPDATEs bump them too."""
+    updated_at = Column(SyncTimestamp, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version") + 1)
+
+
+class Project(SyncVersioned, Base):
     __tablename__ = "Projects"
 
     project_id = Column(Integer, primary_key=True, autoincrement=True)
@@ -18,6 +29,11 @@ class Project(Base):
     creator_id = Column(Integer, ForeignKey("Users.user_id"))
     created_at = Column(DateTime, server_default=func.now())
     due_date = Column(Date, nullable=True)  # ✅ ADD THIS LINE
+    # Maintained alongside every task insert/update/delete (see crud.record_task_change)
+    completed_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Sequence of the last task event on the project WebSocket (see crud.record_task_event)
+    event_seq = Column(Integer, nullable=False, default=0, server_default="0")
 
     tasks = relationship("Task", back_populates="project")
     team_members = relationship("ProjectTeam", back_populates="project")
@@ -47,8 +63,10 @@ class User(Base):
     
 
 
-class Task(Base):
+class Task(SyncVersioned, Base):
     __tablename__ = "Tasks"
+    # Deadline scans (notifications, overdue counts) filter on due date and progress
+    __table_args__ = (Index("ix_tasks_due_date_progress", "due_date", "progress"),)
 
     task_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     project_id = Column(Integer, ForeignKey("Projects.project_id", ondelete="CASCADE"), index=True)  # Indexed + CASCADE
@@ -60,11 +78,13 @@ class Task(Base):
     created_at = Column(DateTime, server_default=func.now())  # Fixed
 
     project = relationship("Project", back_populates="tasks")
-    assignments = relationship("UserAssignment", back_populates="task")
+    assignments = relationship("UserAssignment", back_populates="task", cascade="all, delete-orphan")
 
 
-class UserAssignment(Base):
+class UserAssignment(SyncVersioned, Base):
     __tablename__ = "UserAssignments"
+    # Covers "tasks assigned to this user" joins without touching the table rows
+    __table_args__ = (Index("ix_user_assignments_user_task", "user_id", "task_id"),)
 
     assignment_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     task_id = Column(Integer, ForeignKey("Tasks.task_id", ondelete="CASCADE"), index=True)  # Indexed + CASCADE
@@ -86,7 +106,7 @@ class UserAssignment(Base):
 #     project = relationship("Project", back_populates="team_members")
 #     user = relationship("User", back_populates="project_teams")  # Updated to match new name
 
-class ProjectTeam(Base):
+class ProjectTeam(SyncVersioned, Base):
     __tablename__ = "ProjectTeam"
 
     project_team_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
@@ -99,28 +119,45 @@ class ProjectTeam(Base):
 
 class DashboardMetric(Base):
     __tablename__ = "DashboardMetrics"
+    # One rollup row per user per day (see crud.get_dashboard_metrics)
+    __table_args__ = (UniqueConstraint("user_id", "metric_date", name="uq_dashboard_metric_user_day"),)
 
     metric_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("Users.user_id", ondelete="CASCADE"), nullable=True)
     total_projects = Column(Integer, default=0)
     total_tasks = Column(Integer, default=0)
+    total_users = Column(Integer, default=0)
+    progress_sum = Column(DECIMAL(10, 2), default=0)  # average progress = progress_sum / total_projects
+    high_priority_tasks = Column(Integer, default=0)
+    medium_priority_tasks = Column(Integer, default=0)
+    low_priority_tasks = Column(Integer, default=0)
     assigned_tasks = Column(Integer, default=0)
     overdue_tasks = Column(Integer, default=0)
     completed_tasks = Column(Integer, default=0)
-    metric_date = Column(Date, unique=True)
+    is_stale = Column(Boolean, nullable=False, default=False, server_default="0")
+    metric_date = Column(Date, nullable=False)
     created_at = Column(DateTime, server_default=func.now())  # Fixed
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     
     
 class ProjectInvitation(Base):
     __tablename__ = "project_invitations"
+    # "Pending invites for this project / this address", and the sweeper's expiry scan
+    __table_args__ = (
+        Index("ix_project_invitations_project_status", "project_id", "status"),
+        Index("ix_project_invitations_email_status", "email", "status"),
+        Index("ix_project_invitations_status_expires", "status", "expires_at"),
+    )
 
     invitation_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     project_id = Column(Integer, ForeignKey("Projects.project_id"), nullable=False)  # Add this line
     email = Column(String(255), nullable=False)
     token = Column(String(255), unique=True, nullable=False)
-    status = Column(Enum("Pending", "Accepted", "Declined"), default="Pending")
+    status = Column(Enum("Pending", "Accepted", "Declined", "Expired"), default="Pending")
     created_at = Column(DateTime, server_default=func.now()) 
     accepted_at = Column(DateTime, nullable=True)  # Remove server_default here
+    expires_at = Column(DateTime, nullable=True)  # None: never expires
     
     
     
@@ -136,3 +173,50 @@ class Activity(Base):
 
     user = relationship("User")
     project = relationship("Project")
+
+
+class ProjectEvent(Base):
+    __tablename__ = "project_events"
+    # Task deltas kept so WebSocket clients can resume from the last sequence they saw
+    __table_args__ = (UniqueConstraint("project_id", "seq", name="uq_project_event_seq"),)
+
+    event_id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(Integer, ForeignKey("Projects.project_id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    event_type = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    # Deleted rows for GET /dashboard/sync; no FKs, they outlive what they point at
+
+    tombstone_id = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(20), nullable=False)  # project, task, assignment, team
+    entity_id = Column(Integer, nullable=False)
+    project_id = Column(Integer, nullable=True, index=True)
+    user_id = Column(Integer, nullable=True, index=True)  # whose view lost the row (project/team removals)
+    deleted_at = Column(SyncTimestamp, nullable=False, default=datetime.utcnow, index=True)
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    # Mail waiting for the outbox workers (mail_outbox.py); rows are claimed, sent, then marked
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+    email_id = Column(Integer, primary_key=True, autoincrement=True)
+    invitation_id = Column(Integer, ForeignKey("project_invitations.invitation_id", ondelete="SET NULL"), nullable=True)
+    sender = Column(String(255), nullable=True)  # None: SMTP_EMAIL at send time
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(512), nullable=False)  # room for a 255-character project title
+    body = Column(Text, nullable=False)  # HTML
+    text_body = Column(Text, nullable=True)  # plain-text alternative, if any
+    status = Column(Enum("Pending", "Sending", "Sent", "Failed", name="email_status_enum"), nullable=False, default="Pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claimed_by = Column(String(36), nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # a crashed worker's claim lapses after this
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    sent_at = Column(DateTime, nullable=True)
@@ -0,0 +1,101 @@
+"""Keyset pagination and column projection for the list endpoints.
+
+Pages are ordered by primary key (or created_at, ties broken by primary key) and the
+cursor carries the last row's key, so every page costs the same however deep it is.
+The list stays the response body; the next page's cursor goes in X-Next-Cursor, and
+clients that want the whole list follow it (the Flutter app's fetchAllPages).
+"""
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, or_
+
+from serializers import FastJSONResponse, row_serializer
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+SORT_KEYS = ("id", "created_at")
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_size(limit: Optional[int]) -> int:
+    if not limit:
+        return PAGE_SIZE_DEFAULT
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+
+def encode_cursor(values) -> str:
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str):
+    """Raises ValueError for a cursor that wasn't produced by encode_cursor() for ``sort``."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != (2 if sort == "created_at" else 1):
+        raise ValueError("Invalid cursor")
+    try:
+        if sort == "created_at":
+            return [datetime.fromisoformat(values[0]), int(values[1])]
+        return [int(values[0])]
+    except (TypeError, ValueError):  # right length, wrong contents
+        raise ValueError("Invalid cursor")
+
+
+def select_fields(available: dict, fields: Optional[str], default=None) -> dict:
+    """Columns for a ``fields=a,b`` parameter; ValueError names any unknown field."""
+    if not fields:
+        names = default or list(available)
+    else:
+        names = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {name: available[name] for name in names}
+
+
+def _after(keys, values):
+    if len(keys) == 1:
+        return keys[0] > values[0]
+    (created, pk), (created_value, pk_value) = keys, values
+    return or_(created > created_value, and_(created == created_value, pk > pk_value))
+
+
+def fetch_page(query, columns: dict, id_column, created_column=None, cursor=None, limit=None, sort="id"):
+    """One page of ``query`` (a Query to add columns to) as dicts of ``columns``, plus the next cursor.
+
+    Only the requested columns and the sort key are selected; one extra row tells whether
+    another page follows.
+    """
+    if sort not in SORT_KEYS or (sort == "created_at" and created_column is None):
+        raise ValueError(f"Unknown sort: {sort}")
+    limit = page_size(limit)
+    keys = [id_column] if sort == "id" else [created_column, id_column]
+
+    query = query.with_entities(
+        *[column.label(name) for name, column in columns.items()],
+        *[key.label(f"_key{i}") for i, key in enumerate(keys)],
+    )
+    if cursor:
+        query = query.filter(_after(keys, decode_cursor(cursor, sort)))
+    rows = query.order_by(*keys).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], f"_key{i}") for i in range(len(keys))])
+    serialize = row_serializer(id_column.class_, tuple(columns))
+    return [serialize(row) for row in rows], next_cursor
+
+
+def page_response(page) -> FastJSONResponse:
+    # Items are already plain dicts, so render them directly instead of via jsonable_encoder
+    items, next_cursor = page
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse(items, headers=headers)
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+
+import models
+
+# Entries never outlive the token's own exp; the TTL caps how long another worker's
+# update/delete of a user can go unnoticed here (invalidation is per process).
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, detached from any DB session."""
+    user_id: int
+    email: str
+    first_name: str
+    last_name: str
+    profile_picture: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: models.User):
+        return cls(
+            user_id=user.user_id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            profile_picture=user.profile_picture,
+        )
+
+
+class PrincipalCache:
+    """Bounded LRU of verified tokens -> Principal, with per-entry expiry."""
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: int = AUTH_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token digest -> (principal, expires_at)
+        self._by_user = {}  # user_id -> set of token digests
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Principal]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: float):
+        key = self._key(token)
+        expires_at = min(token_exp, time.time() + self.ttl)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (principal, expires_at)
+            self._by_user.setdefault(principal.user_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _discard(self, key: bytes):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0].user_id
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+
+principal_cache = PrincipalCache()
+
+
+# Any ORM update or delete of a user drops their cached tokens
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    principal_cache.invalidate_user(target.user_id)
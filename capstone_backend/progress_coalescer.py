@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import os
+
+import crud
+from db import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Progress updates for one project arriving within this window are merged into a single
+# Projects.progress write and WebSocket message. 0 writes through.
+PROGRESS_COALESCE_WINDOW_MS = int(os.getenv("PROGRESS_COALESCE_WINDOW_MS", "250"))
+
+
+class ProgressCoalescer:
+    """Per-project coalescing stage in front of crud.update_project_progress_async.
+
+    The window opens on the first update and is not extended by later ones, so a long
+    drag still flushes at least once per window. Task changes submit no value: the flush
+    recomputes progress from the project counters then, so a worker flushing late can't
+    overwrite another worker's newer progress with the value it saw at edit time.
+    """
+
+    def __init__(self, window_ms: int = PROGRESS_COALESCE_WINDOW_MS, session_factory=AsyncSessionLocal):
+        self.window_ms = window_ms
+        self.session_factory = session_factory
+        self.stats = {"received": 0, "collapsed": 0, "flushed": 0, "failed": 0}
+        self._pending = {}
+        self._timers = {}
+
+    async def submit(self, project_id: int, progress: float = None):
+        self.stats["received"] += 1
+        if project_id in self._pending:
+            self.stats["collapsed"] += 1
+        self._pending[project_id] = progress
+
+        if self.window_ms <= 0:
+            await self._flush(project_id)
+        elif project_id not in self._timers:
+            self._timers[project_id] = asyncio.create_task(self._flush_later(project_id))
+
+    async def _flush_later(self, project_id: int):
+        await asyncio.sleep(self.window_ms / 1000)
+        self._timers.pop(project_id, None)
+        await self._flush(project_id)
+
+    async def _flush(self, project_id: int):
+        if project_id not in self._pending:
+            return
+        progress = self._pending.pop(project_id)
+        try:
+            async with self.session_factory() as db:
+                await crud.update_project_progress_async(db, project_id, progress)
+            self.stats["flushed"] += 1
+        except Exception:
+            # The task change itself is already committed; the counters still hold the truth
+            self.stats["failed"] += 1
+            logger.exception("Failed to write progress for project %s", project_id)
+
+    async def flush_all(self):
+        """Write out every pending update now (used on shutdown)."""
+        for timer in list(self._timers.values()):
+            timer.cancel()
+        self._timers.clear()
+        for project_id in list(self._pending):
+            await self._flush(project_id)
+
+
+progress_coalescer = ProgressCoalescer()
@@ -0,0 +1,328 @@
+"""Real-time fan-out of project events to WebSocket subscribers.
+
+Each worker keeps the sockets connected to it in a ConnectionRegistry. Events are
+published through a backend: the in-process backend delivers straight to this
+worker's sockets, the broker backend goes through a pub/sub broker (Redis) so every
+worker delivers to its own sockets.
+
+Delivery never waits on a client: each socket has a bounded send queue drained by its
+own task, slow clients lose stale messages (or are evicted), and dead ones are reaped.
+A message is encoded to JSON once per worker, not once per socket.
+
+    REALTIME_BACKEND=memory            (default, single worker)
+    REALTIME_BACKEND=redis REDIS_URL=redis://redis:6379/0
+"""
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+from typing import Dict, List
+
+from serializers import dumps
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+REALTIME_BACKEND = os.getenv("REALTIME_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CHANNEL_PREFIX = "project-events:"
+
+# Per-socket backpressure: queued messages per client, what to do when a client's queue
+# is full ("drop_oldest", "drop_newest" or "evict"), and how long one send may take
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "32"))
+REALTIME_OVERFLOW_POLICY = os.getenv("REALTIME_OVERFLOW_POLICY", "drop_oldest")
+REALTIME_SEND_TIMEOUT = float(os.getenv("REALTIME_SEND_TIMEOUT", "5"))
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "evict")
+# Most task events replayed to a reconnecting client before it is told to reload the board
+TASK_EVENT_REPLAY_LIMIT = int(os.getenv("TASK_EVENT_REPLAY_LIMIT", "500"))
+
+
+class Subscriber:
+    """One WebSocket with its own bounded send queue and sender task.
+
+    Publishing only enqueues, so a slow or dead client never holds up the fan-out.
+    """
+
+    def __init__(self, registry, project_id: int, websocket: WebSocket, hold: bool = False):
+        self.registry = registry
+        self.project_id = project_id
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=registry.queue_size)
+        self.closed = False
+        self.after_seq = None
+        self._released = asyncio.Event()
+        if not hold:
+            self._released.set()
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def release(self, after_seq=None):
+        """Start sending a held subscriber's queue, skipping events up to ``after_seq``."""
+        self.after_seq = after_seq
+        self._released.set()
+
+    def offer(self, message):
+        """Queue an encoded ``(seq, text)`` message, applying the overflow policy if full."""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        policy = self.registry.overflow_policy
+        if policy == "evict":
+            self.registry.stats["evicted"] += 1
+            self.registry.discard(self, close_code=1013)  # 1013: try again later
+        elif policy == "drop_newest":
+            self.registry.stats["dropped"] += 1
+        else:  # drop_oldest: clients only need the latest state
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            self.registry.stats["dropped"] += 1
+
+    async def _send_loop(self):
+        await self._released.wait()
+        while True:
+            seq, text = await self.queue.get()
+            if self.after_seq is not None and seq is not None and seq <= self.after_seq:
+                continue  # already sent from the event log
+            try:
+                await self._send(text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Dead socket, or one too slow to take a single message: reap it, and close
+                # it so a client that is still there knows to reconnect and resync
+                self.registry.stats["reaped"] += 1
+                close_code = 1013 if isinstance(e, asyncio.TimeoutError) else 1011  # try again later / server error
+                self.registry.discard(self, close_code=close_code)
+                return
+            self.registry.stats["sent"] += 1
+
+    async def _send(self, text: str):
+        # asyncio.wait rather than wait_for: on 3.11 wait_for can swallow a cancel that
+        # races a finished send, leaving the sender running after the socket is gone
+        send = asyncio.ensure_future(self.websocket.send_text(text))
+        try:
+            done, _ = await asyncio.wait({send}, timeout=self.registry.send_timeout)
+        except asyncio.CancelledError:
+            send.cancel()
+            raise
+        if not done:
+            send.cancel()
+            raise asyncio.TimeoutError(f"send took longer than {self.registry.send_timeout}s")
+        send.result()
+
+    def close(self, close_code=None):
+        self.closed = True
+        if self._sender is not asyncio.current_task():
+            self._sender.cancel()
+        if close_code is not None:
+            asyncio.ensure_future(self._close_socket(close_code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class ConnectionRegistry:
+    """WebSocket subscribers attached to this worker, by project."""
+
+    def __init__(self, queue_size: int = REALTIME_QUEUE_SIZE, overflow_policy: str = REALTIME_OVERFLOW_POLICY,
+                 send_timeout: float = REALTIME_SEND_TIMEOUT):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.stats = {"sent": 0, "dropped": 0, "evicted": 0, "reaped": 0}
+        self._subscribers: Dict[int, Dict[WebSocket, Subscriber]] = {}
+
+    def add(self, project_id: int, websocket: WebSocket, hold: bool = False) -> Subscriber:
+        subscriber = Subscriber(self, project_id, websocket, hold)
+        self._subscribers.setdefault(project_id, {})[websocket] = subscriber
+        return subscriber
+
+    def remove(self, project_id: int, websocket: WebSocket):
+        subscriber = self._subscribers.get(project_id, {}).get(websocket)
+        if subscriber is not None:
+            self.discard(subscriber)
+
+    def discard(self, subscriber: Subscriber, close_code=None):
+        subscribers = self._subscribers.get(subscriber.project_id)
+        if subscribers and subscribers.get(subscriber.websocket) is subscriber:
+            del subscribers[subscriber.websocket]
+            if not subscribers:
+                del self._subscribers[subscriber.project_id]
+        subscriber.close(close_code)
+
+    def sockets(self, project_id: int) -> List[WebSocket]:
+        return list(self._subscribers.get(project_id, ()))
+
+    def __contains__(self, project_id: int):
+        return project_id in self._subscribers
+
+    async def deliver(self, project_id: int, message: dict):
+        subscribers = list(self._subscribers.get(project_id, {}).values())
+        if not subscribers:
+            return
+        encoded = (message.get("seq"), dumps(message).decode())
+        for subscriber in subscribers:
+            subscriber.offer(encoded)
+
+    def close_all(self):
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers.values()):
+                self.discard(subscriber)
+
+
+class InProcessBackend:
+    """Delivers events to this worker's subscribers only."""
+
+    def bind(self, deliver):
+        self._deliver = deliver
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, project_id: int, message: dict):
+        await self._deliver(project_id, message)
+
+
+class BrokerBackend:
+    """Fans events out through a pub/sub broker; every worker delivers to its own sockets."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._subscription = None
+        self._listener = None
+
+    def bind(self, deliver):
+        self._deliver = deliver
+
+    async def start(self):
+        if self._listener is None:
+            self._subscription = await self.broker.subscribe(CHANNEL_PREFIX + "*")
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            await self._subscription.close()
+            self._listener = self._subscription = None
+
+    async def publish(self, project_id: int, message: dict):
+        # Our own subscription hands the event back to this worker's sockets
+        await self.broker.publish(f"{CHANNEL_PREFIX}{project_id}", dumps(message).decode())
+
+    async def _listen(self):
+        async for channel, data in self._subscription:
+            try:
+                project_id = int(channel[len(CHANNEL_PREFIX):])
+                await self._deliver(project_id, json.loads(data))
+            except Exception:
+                logger.exception("Failed to deliver event from %s", channel)
+
+
+class RedisBroker:
+    """Redis pub/sub client used by BrokerBackend."""
+
+    def __init__(self, url: str = REDIS_URL):
+        import redis.asyncio as redis  # only needed when REALTIME_BACKEND=redis
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def publish(self, channel: str, data: str):
+        await self._redis.publish(channel, data)
+
+    async def subscribe(self, pattern: str):
+        pubsub = self._redis.pubsub()
+        await pubsub.psubscribe(pattern)
+        return RedisSubscription(pubsub)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    async def __aiter__(self):
+        async for message in self._pubsub.listen():
+            if message["type"] == "pmessage":
+                yield message["channel"], message["data"]
+
+    async def close(self):
+        await self._pubsub.punsubscribe()
+        await self._pubsub.aclose()
+
+
+class LocalBroker:
+    """In-memory stand-in for the Redis broker; hubs sharing one act like separate workers."""
+
+    def __init__(self):
+        self._subscriptions = []
+
+    async def publish(self, channel: str, data: str):
+        for subscription in list(self._subscriptions):
+            if fnmatch.fnmatchcase(channel, subscription.pattern):
+                subscription.queue.put_nowait((channel, data))
+
+    async def subscribe(self, pattern: str):
+        subscription = LocalSubscription(self, pattern)
+        self._subscriptions.append(subscription)
+        return subscription
+
+
+class LocalSubscription:
+    def __init__(self, broker: LocalBroker, pattern: str):
+        self.broker = broker
+        self.pattern = pattern
+        self.queue = asyncio.Queue()
+
+    async def __aiter__(self):
+        while True:
+            yield await self.queue.get()
+
+    async def close(self):
+        if self in self.broker._subscriptions:
+            self.broker._subscriptions.remove(self)
+
+
+class EventHub:
+    """This worker's subscribers plus the backend that carries events between workers."""
+
+    def __init__(self, backend=None):
+        self.connections = ConnectionRegistry()
+        self.backend = backend or InProcessBackend()
+        self.backend.bind(self.connections.deliver)
+
+    async def start(self):
+        await self.backend.start()
+
+    async def stop(self):
+        await self.backend.stop()
+        self.connections.close_all()
+
+    async def publish(self, project_id: int, message: dict):
+        await self.backend.publish(project_id, message)
+
+
+def create_hub(backend_name: str = REALTIME_BACKEND) -> EventHub:
+    if backend_name == "memory":
+        return EventHub(InProcessBackend())
+    if backend_name == "redis":
+        return EventHub(BrokerBackend(RedisBroker(REDIS_URL)))
+    raise ValueError(f"Unknown REALTIME_BACKEND: {backend_name}")
+
+
+hub = create_hub()
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Request, Security
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-import crud, schemas, models
+import crud, schemas, models, hashing
 from db import get_db
 import shutil
 import os
 import jwt
 import datetime
 from jose import JWTError
+from principal_cache import Principal, principal_cache
+from pagination import PAGE_SIZE_DEFAULT, page_response
+from typing import Optional
 
 
 # Router
@@ -35,13 +39,18 @@ def create_jwt_token(data: dict, expires_delta: int = ACCESS_TOKEN_EXPIRE_MINUTE
 
 
 # 🔹 Function to Decode JWT & Get User ID
-def decode_jwt_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def decode_jwt_token(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
 
     """Decode JWT token and return user details."""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
+    # Hot path: a token we already verified costs no DB query
+    principal = principal_cache.get(token)
+    if principal is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except (jwt.PyJWTError, JWTError):
+            raise HTTPException(status_code=401, detail="Invalid token")
 
+        user_id = payload.get("user_id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
 
@@ -49,28 +58,40 @@ def decode_jwt_token(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Return full user details
-        return {"user_id": user.user_id, "email": user.email}
+        principal = Principal.from_user(user)
+        if "exp" in payload:
+            principal_cache.put(token, principal, payload["exp"])
+
+    # Shared with get_current_user for the rest of this request
+    request.state.principal = principal
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    # Return full user details
+    return {"user_id": principal.user_id, "email": principal.email}
 
 
 # 🔹 User Signup Route
 @auth_router.post("/signup", response_model=schemas.UserRead)
-def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = crud.get_user_by_email(db, user.email)
+async def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    existing_user = await run_in_threadpool(crud.get_user_by_email, db, user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db, user)
+    try:
+        hashed_password = await hashing.hash_password(user.password)
+    except hashing.HashingOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    return await run_in_threadpool(crud.create_user, db, user, hashed_password)
 
 
 # 🔹 Login Route (Returns JWT Token)
 @auth_router.post("/login")
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    authenticated_user = crud.authenticate_user(db, user.email, user.password)
-    if not authenticated_user:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+async def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+    # bcrypt runs on the hashing pool so it never pins a request thread
+    authenticated_user = await run_in_threadpool(crud.get_user_by_email, db, user.email)
+    try:
+        if not authenticated_user or not await hashing.verify_password(user.password, authenticated_user.password):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+    except hashing.HashingOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
 
     # Generate JWT Token
     token_data = {"user_id": authenticated_user.user_id, "email": authenticated_user.email}
@@ -80,14 +101,8 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 
 
 @auth_router.get("/me")
-def get_current_user(user_data: dict = Depends(decode_jwt_token), db: Session = Depends(get_db)):
-    print("🔍 user_data from token:", user_data)
-
-    user = crud.get_user_by_id(db, user_data["user_id"])
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-
+def read_current_user(request: Request, user_data: dict = Depends(decode_jwt_token)):
+    user = request.state.principal
 
     return {
         "user_id": user.user_id,
@@ -100,28 +115,18 @@ def get_current_user(user_data: dict = Depends(decode_jwt_token), db: Session =
     }
 
 # In your auth.py
-def get_current_user(
-    user_data: dict = Depends(decode_jwt_token),
-    db: Session = Depends(get_db)
-) -> models.User:
-    # Use dictionary access instead of attribute access
-    user_id = user_data.get("user_id")
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+def get_current_user(request: Request, user_data: dict = Depends(decode_jwt_token)) -> Principal:
+    # decode_jwt_token already loaded (or cached) the user for this request
+    return request.state.principal
 
 # 🔹 Update User Profile (Uses JWT)
 @auth_router.put("/me/update")
 def update_profile(
     user_update: schemas.UserUpdate,
-    user_id: int = Depends(decode_jwt_token),
+    user_data: dict = Depends(decode_jwt_token),
     db: Session = Depends(get_db)
 ):
-    updated_user = crud.update_user(db, user_id, user_update)
+    updated_user = crud.update_user(db, user_data["user_id"], user_update)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -144,9 +149,10 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
 @auth_router.post("/users/upload-profile-picture")
 def upload_profile_picture(
     file: UploadFile = File(...),
-    user_id: int = Depends(decode_jwt_token),
+    user_data: dict = Depends(decode_jwt_token),
     db: Session = Depends(get_db)
 ):
+    user_id = user_data["user_id"]
     user = crud.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -162,9 +168,16 @@ def upload_profile_picture(
     return {"message": "Profile picture uploaded successfully", "profile_picture_url": file_path}
 
 
-# 🔹 Get All Users (Optional)
-@auth_router.get("/users/", response_model=list[schemas.UserRead])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = db.query(models.User).offset(skip).limit(limit).all()
-    return users
+# 🔹 Get All Users (Optional) — keyset pages, see pagination.py
+@auth_router.get("/users/")
+def read_users(
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    try:
+        return page_response(crud.get_users(db, cursor, limit, fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
@@ -1,33 +1,48 @@
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException
+import logging
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, Request, Response, File, UploadFile
 from sqlalchemy.orm import Session
-from db import get_db
+from db import get_db, get_async_db
+from sqlalchemy.ext.asyncio import AsyncSession
 import models, schemas, crud
-from typing import List, Dict
+from typing import List, Dict, Optional
 from routes.auth import decode_jwt_token, get_current_user
+from principal_cache import Principal
 from sqlalchemy.orm import joinedload
 from crud import project_to_dict
-from fastapi.encoders import jsonable_encoder
-from crud import update_project_progress  
 from schemas import TaskUpdate, TaskCreateWithAssignments  # make sure you import it
 from fastapi import BackgroundTasks
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 from models import Activity
+from realtime import hub, TASK_EVENT_REPLAY_LIMIT
+from progress_coalescer import progress_coalescer
+from pagination import PAGE_SIZE_DEFAULT, page_response
+from serializers import FastJSONResponse, dumps
+from export import EXPORT_FORMATS, export_chunks
+from fastapi.responses import StreamingResponse
+from task_import import detect_format, read_rows
+from conditional import make_etag, etag_matches, not_modified, set_etag
+from sqlalchemy import case, and_, not_
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.get("")
 def dashboard_home():
     return {"message": "Dashboard API is accessible!"}
 
-# WebSocket connections storage
-active_connections: Dict[int, List[WebSocket]] = {}
-
 @router.get("/projects/all")
-def get_projects(db: Session = Depends(get_db)):
+def get_projects(
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
+    fields: Optional[str] = None,
+    sort: str = "id",
+    db: Session = Depends(get_db)
+):
     try:
-        projects = db.query(models.Project).options(joinedload(models.Project.creator)).all()
-        return [project_to_dict(p) for p in projects]
+        return page_response(crud.get_projects(db, cursor, limit, fields, sort))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -42,7 +57,7 @@ def get_projects(db: Session = Depends(get_db)):
 @router.post("/projects/all", response_model=schemas.ProjectRead)
 def create_project(
     project: schemas.ProjectCreate, 
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     try:
@@ -52,19 +67,13 @@ def create_project(
 
 
 @router.put("/projects/{project_id}/progress")
-def update_project_progress(project_id: int, progress: float, db: Session = Depends(get_db)):
+async def update_project_progress(project_id: int, progress: float, db: AsyncSession = Depends(get_async_db)):
     try:
-        project = crud.update_project_progress(db, project_id, progress)
-        if not project:
+        if not await db.get(models.Project, project_id):
             raise HTTPException(status_code=404, detail=f"Project with ID {project_id} not found")
 
-        # Notify WebSocket clients about progress updates
-        if project_id in active_connections:
-            for connection in active_connections[project_id]:
-                try:
-                    connection.send_json({"project_id": project_id, "progress": progress})
-                except Exception:
-                    pass  # Ignore failed messages
+        # Stores the value and notifies WebSocket clients, merged with other updates in the window
+        await progress_coalescer.submit(project_id, progress)
 
         return {"message": "Progress updated successfully", "progress": progress}
     except HTTPException as e:
@@ -92,30 +101,35 @@ def update_project_progress(project_id: int, progress: float, db: Session = Depe
 async def update_task_category(
     task_id: int,
     category: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
-        task = db.query(models.Task).filter(models.Task.task_id == task_id).first()
+        task = await db.get(models.Task, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
 
+        before = crud.task_snapshot(task)
+        previous_category = task.category
+        fields = {"category": category}
         task.category = category
         if category == "Completed":
             task.progress = 1.0  # ✅ reflect progress
+            fields["progress"] = 1.0
 
-        db.commit()
-
-        # 🛠 Recalculate project progress
-        tasks = db.query(models.Task).filter(models.Task.project_id == task.project_id).all()
-        if tasks:
-            completed = sum(1 for t in tasks if t.progress is not None and t.progress >= 0.99)
-            project_progress = completed / len(tasks)
-
-            # 🛠 Now broadcast!
-            await broadcast_progress_update(task.project_id, project_progress)
+        # 🛠 Adjust the project counters in the same transaction as the task change
+        await db.run_sync(
+            crud.record_task_change, task.project_id, before, crud.task_snapshot(task)
+        )
+        if category != previous_category:
+            await db.run_sync(crud.record_task_update, task, fields, previous_category)
+        await db.commit()
+        await broadcast_task_events(crud.pop_task_events(db))
+        await progress_coalescer.submit(task.project_id)
 
         return {"message": "Category updated"}
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -137,46 +151,87 @@ def calculate_project_progress(project_id: int, db: Session = Depends(get_db)):
 
 # WebSocket for real-time updates
 @router.websocket("/ws/progress/{project_id}")
-async def websocket_endpoint(websocket: WebSocket, project_id: int):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    project_id: int,
+    since: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
     await websocket.accept()
-    if project_id not in active_connections:
-        active_connections[project_id] = []
-    active_connections[project_id].append(websocket)
+    if not await db.get(models.Project, project_id):
+        await db.close()
+        await websocket.close(code=1008, reason="Project not found")  # 1008: policy violation
+        return
+    # Live events queue up behind the backlog; anything the backlog covered is skipped
+    subscriber = hub.connections.add(project_id, websocket, hold=True)
 
     try:
+        current, events = await db.run_sync(crud.get_project_events, project_id, since, TASK_EVENT_REPLAY_LIMIT)
+        await db.close()  # don't hold a connection for the life of the socket
+        for event in events or []:
+            await websocket.send_text(dumps(event).decode())
+        # resync: the gap can't be replayed, so the client reloads the board and carries on from seq
+        await websocket.send_text(dumps({
+            "type": "subscribed", "project_id": project_id, "seq": current, "resync": events is None
+        }).decode())
+        subscriber.release(current)
+
         while True:
             await websocket.receive_text()  # Keep connection alive
     except WebSocketDisconnect:
-        active_connections[project_id].remove(websocket)
-        if not active_connections[project_id]:
-            del active_connections[project_id]
+        pass
+    finally:
+        hub.connections.remove(project_id, websocket)
             
 
 async def broadcast_progress_update(project_id: int, progress: float):
-    if project_id in active_connections:
-        data = jsonable_encoder({
-            "project_id": project_id,
-            "progress": round(progress, 2)
-        })
-        for ws in active_connections[project_id]:
-            await ws.send_json(data)
+    data = {
+        "type": "progress",
+        "project_id": project_id,
+        "progress": round(float(progress), 2)
+    }
+    # Published through the hub backend, so sockets on other workers get it too.
+    # Delivery only enqueues per socket; a broker failure must not fail the edit itself.
+    try:
+        await hub.publish(project_id, data)
+    except Exception:
+        logger.exception("Failed to publish progress for project %s", project_id)
+
+
+async def broadcast_task_events(events: List[dict]):
+    # Called after the commit; a client that misses one sees a gap in seq and resumes
+    for event in events:
+        try:
+            await hub.publish(event["project_id"], event)
+        except Exception:
+            logger.exception("Failed to publish %s for project %s", event["type"], event["project_id"])
             
 
 
 
 
 @router.get("/tasks")
-def read_tasks(db: Session = Depends(get_db)):
+def read_tasks(
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
+    fields: Optional[str] = None,
+    sort: str = "id",
+    db: Session = Depends(get_db)
+):
     try:
-        return crud.get_tasks(db)
+        return page_response(crud.get_tasks(db, cursor, limit, fields, sort))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 
 @router.post("/projects/{project_id}/tasks")
-def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db)):
+def create_task(task: schemas.TaskCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     try:
-        return crud.create_task(db, task)
+        new_task = crud.create_task(db, task)
+        background_tasks.add_task(broadcast_task_events, crud.pop_task_events(db))
+        return new_task
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -184,55 +239,51 @@ def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db)):
 @router.get("/projects/{project_id}/tasks")
 def read_project_tasks(project_id: int, db: Session = Depends(get_db)):
     try:
-        return crud.get_tasks_by_project(db, project_id)
+        return FastJSONResponse(crud.get_tasks_by_project(db, project_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
     
-@router.put("/tasks/{task_id}/category")
-def update_task_category(task_id: int, category: str, db: Session = Depends(get_db)):
-    try:
-        task = db.query(models.Task).filter(models.Task.task_id == task_id).first()
-        if not task:
-            raise HTTPException(status_code=404, detail="Task not found")
-
-        task.category = category
-        db.commit()
-        return {"message": "Category updated"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    
-
 @router.put("/tasks/{task_id}")
-async def update_task(task_id: int, updated_data: TaskUpdate, db: Session = Depends(get_db), user_data: dict = Depends(decode_jwt_token)):
+async def update_task(task_id: int, updated_data: TaskUpdate, db: AsyncSession = Depends(get_async_db), user_data: dict = Depends(decode_jwt_token)):
     try:
-        task = db.query(models.Task).filter(models.Task.task_id == task_id).first()
+        task = await db.get(models.Task, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
 
-        # Track if anything changed
+        before = crud.task_snapshot(task)
+        previous_category = task.category
+
+        # Track if anything changed (as activity text, and as the fields of the task event)
         changes = []
+        fields = {}
 
         # Update task fields
         if updated_data.title is not None and updated_data.title != task.title:
             changes.append(f"title updated to '{updated_data.title}'")
             task.title = updated_data.title
+            fields["title"] = updated_data.title
         if updated_data.description is not None and updated_data.description != task.description:
             changes.append("description updated")
             task.description = updated_data.description
+            fields["description"] = updated_data.description
         if updated_data.progress is not None and updated_data.progress != task.progress:
             changes.append(f"progress updated to {updated_data.progress * 100:.0f}%")
             task.progress = updated_data.progress
-        if updated_data.due_date is not None and updated_data.due_date != task.due_date:
-            changes.append(f"due date changed")
-            task.due_date = updated_data.due_date
+            fields["progress"] = updated_data.progress
+        if updated_data.due_date is not None:
+            try:
+                due_date = date.fromisoformat(updated_data.due_date[:10])  # 'YYYY-MM-DD'
+            except ValueError:
+                raise HTTPException(status_code=400, detail="due_date must be YYYY-MM-DD")
+            if due_date != task.due_date:
+                changes.append(f"due date changed")
+                task.due_date = due_date
+                fields["due_date"] = due_date.isoformat()
         if updated_data.category is not None and updated_data.category != task.category:
             changes.append(f"category changed to '{updated_data.category}'")
             task.category = updated_data.category
-
-
-        db.commit()
-        db.refresh(task)
+            fields["category"] = updated_data.category
 
         # Record activity if there are changes
         if changes:
@@ -245,51 +296,63 @@ async def update_task(task_id: int, updated_data: TaskUpdate, db: Session = Depe
                 
                 )
             db.add(activity)
-            db.commit()
-        # Recalculate project progress
-        tasks = db.query(models.Task).filter(models.Task.project_id == task.project_id).all()
-        if tasks:
-            completed = sum(1 for t in tasks if t.progress is not None and t.progress >= 0.99)
-            project_progress = completed / len(tasks)
 
-            await update_project_progress(db, task.project_id, project_progress)
+        # Adjust project counters; committed together with the task and activity
+        await db.run_sync(
+            crud.record_task_change, task.project_id, before, crud.task_snapshot(task)
+        )
+        if fields:
+            await db.run_sync(crud.record_task_update, task, fields, previous_category)
+        await db.commit()
+        await broadcast_task_events(crud.pop_task_events(db))
+        await progress_coalescer.submit(task.project_id)
 
         return {"message": "Task updated successfully"}
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     
 @router.delete("/tasks/{task_id}")
-async def delete_task(task_id: int, db: Session = Depends(get_db)):
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        task = db.query(models.Task).filter(models.Task.task_id == task_id).first()
+        task = await db.get(models.Task, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
 
         project_id = task.project_id  # capture before delete
-        db.delete(task)
-        db.commit()
-
-        # Recalculate progress after deletion
-        tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
-        completed = sum(1 for t in tasks if t.progress is not None and t.progress >= 0.99)
-        project_progress = completed / len(tasks) if tasks else 0.0
-
-        from .crud import update_project_progress
-        await update_project_progress(db, project_id, project_progress)
+        before = crud.task_snapshot(task)
+        # Count the change before the delete is flushed so the task's assignees are still visible
+        await db.run_sync(crud.record_task_change, project_id, before, None)
+        await db.run_sync(crud.record_task_event, project_id, "task.deleted", task_id=task_id)
+        await db.delete(task)
+        await db.commit()
+        await broadcast_task_events(crud.pop_task_events(db))
+        await progress_coalescer.submit(project_id)
 
         return {"message": "Task deleted"}
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # User Routes
 @router.get("/users")
-def read_users(db: Session = Depends(get_db)):
+def read_users(
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
+    fields: Optional[str] = None,
+    sort: str = "id",
+    db: Session = Depends(get_db)
+):
     try:
-        return crud.get_users(db)
+        return page_response(crud.get_users(db, cursor, limit, fields, sort))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -314,14 +377,38 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 @router.get("/metrics")
 def get_dashboard_metrics(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     try:
+        # Overdue counts move with the calendar, so the day is part of the tag
+        etag = make_etag("metrics", crud.get_user_version_stamp(db, current_user.user_id), crud.metric_day())
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
         return crud.get_dashboard_metrics(db, current_user)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/sync")
+def sync_changes(
+    since: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    # Pass the returned cursor back as ?since= to get only what changed in between
+    try:
+        since_time = crud.decode_sync_cursor(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+    try:
+        return FastJSONResponse(crud.get_sync_changes(db, current_user.user_id, since_time))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
     
     
 # @router.get("/projects/{project_id}", response_model=schemas.ProjectRead)
@@ -336,10 +423,17 @@ def get_dashboard_metrics(
 
 @router.get("/projects/user", response_model=List[schemas.ProjectRead])
 def get_user_projects(
-    current_user: models.User = Depends(get_current_user), 
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     try:
+        etag = make_etag("projects", crud.get_user_version_stamp(db, current_user.user_id))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
         projects = (
             db.query(models.Project)
             .options(joinedload(models.Project.creator))
@@ -349,13 +443,13 @@ def get_user_projects(
             )
             .all()
         )
-        return [project_to_dict(p) for p in projects]
+        return crud.projects_to_dicts(db, projects)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
     
 @router.get("/projects/{project_id}", response_model=List[schemas.ProjectRead])
-def get_user_projects(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_user_projects(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     try:
         user_projects = (
             db.query(models.Project)
@@ -377,7 +471,7 @@ def get_user_projects(current_user: models.User = Depends(get_current_user), db:
 def get_project_by_id(
     project_id: int, 
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)  # Add authentication
+    current_user: Principal = Depends(get_current_user)  # Add authentication
 ):
     project = db.query(models.Project).filter(models.Project.project_id == project_id).first()
     if not project:
@@ -412,37 +506,7 @@ def get_project_by_id(
 @router.get("/projects/{project_id}/members")
 def get_project_members(project_id: int, db: Session = Depends(get_db)):
     try:
-        # Fetch team members for the project
-        team_members = (
-            db.query(models.User)
-            .join(models.ProjectTeam, models.ProjectTeam.user_id == models.User.user_id)
-            .filter(models.ProjectTeam.project_id == project_id)
-            .all()
-        )
-
-        result = []
-        for user in team_members:
-            # Get all tasks assigned to this user within the project
-            assigned_tasks = (
-                db.query(models.Task)
-                .join(models.UserAssignment, models.UserAssignment.task_id == models.Task.task_id)
-                .filter(
-                    models.UserAssignment.user_id == user.user_id,
-                    models.Task.project_id == project_id
-                )
-                .all()
-            )
-
-            completed_count = sum(1 for task in assigned_tasks if task.progress >= 0.99)
-
-            result.append({
-                "full_name": f"{user.first_name} {user.last_name}",
-                "email": user.email,
-                "assigned_tasks": len(assigned_tasks),
-                "completed_tasks": completed_count
-            })
-
-        return result
+        return crud.get_project_member_stats(db, project_id)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -508,35 +572,27 @@ def get_upcoming_deadlines(
     ]
     
     
-# @router.post("/tasks/{task_id}/assign")
-# def assign_user_to_task(
-#     task_id: int,
-#     user_id: int,
-#     db: Session = Depends(get_db)
-# ):
-#     task = db.query(models.Task).filter(models.Task.task_id == task_id).first()
-#     user = db.query(models.User).filter(models.User.user_id == user_id).first()
-
-#     if not task or not user:
-#         raise HTTPException(status_code=404, detail="Task or user not found")
-
-#     # Prevent duplicate assignments
-#     existing = db.query(models.UserAssignment).filter_by(
-#         task_id=task_id, user_id=user_id
-#     ).first()
-#     if existing:
-#         raise HTTPException(status_code=400, detail="User already assigned to task")
-
-#     assignment = models.UserAssignment(task_id=task_id, user_id=user_id)
-#     db.add(assignment)
-#     db.commit()
-
-#     return {"message": f"User {user_id} successfully assigned to task {task_id}"}
+@router.post("/tasks/{task_id}/assign")
+def assign_user_to_task(
+    task_id: int,
+    user_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    try:
+        result = crud.assign_user_to_task(db, task_id, user_id)
+        background_tasks.add_task(broadcast_task_events, crud.pop_task_events(db))
+        return result
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/projects/{project_id}/tasks/assign")
 def create_task_with_assignments(
     project_id: int,
     task_data: TaskCreateWithAssignments,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     # ✅ Create the task
@@ -549,8 +605,9 @@ def create_task_with_assignments(
         progress=0.0
     )
     db.add(new_task)
-    db.commit()
-    db.refresh(new_task)
+    db.flush()
+    snapshot = crud.task_snapshot(new_task)
+    crud.record_task_change(db, project_id, after=snapshot)
 
     # ✅ Assign users
     results = {"assigned": [], "skipped": []}
@@ -562,63 +619,104 @@ def create_task_with_assignments(
 
         assignment = models.UserAssignment(task_id=new_task.task_id, user_id=user_id)
         db.add(assignment)
+        crud.record_assignment(db, user_id, snapshot)
         results["assigned"].append(user_id)
 
+    db.flush()
+    crud.record_task_event(
+        db, project_id, "task.created",
+        task=crud.task_payload(new_task, crud.get_task_assignees(db, new_task.task_id)),
+    )
     db.commit()
+    background_tasks.add_task(broadcast_task_events, crud.pop_task_events(db))
+    db.refresh(new_task)
 
     return {
         "message": "Task created and users assigned",
         "task_id": new_task.task_id,
         "details": results
     }
+
+
+@router.post("/projects/{project_id}/tasks/import")
+def import_tasks(
+    project_id: int,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    # CSV / NDJSON / JSON array of tasks with assignee emails; see task_import.py for the columns
+    try:
+        fmt = detect_format(file.filename, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not db.query(models.Project.project_id).filter(models.Project.project_id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    try:
+        report = crud.import_tasks(db, project_id, read_rows(file.file, fmt))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    background_tasks.add_task(broadcast_task_events, report.pop("events"))
+    progress = report.pop("progress")
+    if progress is not None:
+        background_tasks.add_task(broadcast_progress_update, project_id, progress)
+    return report
 from datetime import datetime, date
 
 @router.get("/notifications")
 def get_notifications(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user_data: dict = Depends(decode_jwt_token)
 ):
     user_id = user_data["user_id"]
     now = datetime.utcnow()
 
+    # Due dates are whole days, so the buckets only shift when the date does
+    etag = make_etag("notifications", crud.get_user_version_stamp(db, user_id), now.date())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
     # Time markers
     in_1_day = now + timedelta(days=1)
     in_3_days = now + timedelta(days=3)
     in_7_days = now + timedelta(days=7)
 
     # === Task Notifications ===
-    base_task_query = (
-        db.query(models.Task)
-        .join(models.UserAssignment)
+    # One pass over the user's open assigned tasks; CASE puts each row in its bucket
+    bucket = case(
+        (models.Task.due_date < now, "overdue_tasks"),
+        (and_(models.Task.due_date > now, models.Task.due_date <= in_1_day), "due_tomorrow"),
+        (and_(models.Task.due_date > in_1_day, models.Task.due_date <= in_3_days), "due_in_3_days"),
+        (and_(models.Task.due_date > in_3_days, models.Task.due_date <= in_7_days), "due_in_7_days"),
+        else_=None,
+    ).label("bucket")
+
+    task_rows = (
+        db.query(models.Task.title, models.Task.due_date, models.Task.project_id, bucket)
+        .join(models.UserAssignment, models.UserAssignment.task_id == models.Task.task_id)
         .filter(
             models.UserAssignment.user_id == user_id,
             models.Task.due_date != None,
-            models.Task.progress < 0.99  # Not completed
+            models.Task.due_date <= in_7_days,
+            not_(crud.task_completed_clause())  # Not completed
         )
+        .order_by(models.Task.due_date)
+        .all()
     )
 
-    due_in_1_day = base_task_query.filter(
-        models.Task.due_date > now,
-        models.Task.due_date <= in_1_day
-    ).all()
-
-    due_in_3_days = base_task_query.filter(
-        models.Task.due_date > in_1_day,
-        models.Task.due_date <= in_3_days
-    ).all()
-
-    due_in_7_days = base_task_query.filter(
-        models.Task.due_date > in_3_days,
-        models.Task.due_date <= in_7_days
-    ).all()
-
-    overdue_tasks = base_task_query.filter(
-        models.Task.due_date < now
-    ).all()
+    buckets = {"due_tomorrow": [], "due_in_3_days": [], "due_in_7_days": [], "overdue_tasks": []}
+    for row in task_rows:
+        if row.bucket is not None:
+            buckets[row.bucket].append(row)
 
     # === Project Deadline Notifications ===
     project_deadlines = (
-        db.query(models.Project)
+        db.query(models.Project.title, models.Project.due_date, models.Project.project_id)
         .filter(
             (models.Project.creator_id == user_id) |
             (models.Project.team_members.any(user_id=user_id)),
@@ -653,31 +751,28 @@ def get_notifications(
 
     return {
         "reminders": {
-            "due_tomorrow": serialize_tasks(due_in_1_day),
-            "due_in_3_days": serialize_tasks(due_in_3_days),
-            "due_in_7_days": serialize_tasks(due_in_7_days)
+            "due_tomorrow": serialize_tasks(buckets["due_tomorrow"]),
+            "due_in_3_days": serialize_tasks(buckets["due_in_3_days"]),
+            "due_in_7_days": serialize_tasks(buckets["due_in_7_days"])
         },
-        "overdue_tasks": serialize_tasks(overdue_tasks),
+        "overdue_tasks": serialize_tasks(buckets["overdue_tasks"]),
         "project_deadlines": serialize_projects(project_deadlines)
     }
     
 @router.get("/projects/{project_id}/activities")
 def get_project_activities(project_id: int, db: Session = Depends(get_db)):
-    activities = (
-        db.query(models.Activity)
-        .join(models.User, models.Activity.user_id == models.User.user_id)
-        .filter(models.Activity.project_id == project_id)
-        .order_by(models.Activity.timestamp.desc())
-        .limit(10)
-        .all()
-    )
+    return FastJSONResponse(crud.get_project_activities(db, project_id))
 
-    return [
-        {
-            "user": f"{activity.user.first_name}",
-            "task": activity.task_title,
-            "action": activity.action,
-            "timestamp": activity.timestamp.isoformat()
-        }
-        for activity in activities
-    ]
\ No newline at end of file
+
+@router.get("/projects/{project_id}/export")
+def export_project(project_id: int, format: str = "ndjson", db: Session = Depends(get_db)):
+    # Streams tasks, assignments and activities; the session stays open until the body is sent
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    if not db.query(models.Project.project_id).filter(models.Project.project_id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    return StreamingResponse(
+        export_chunks(crud.iter_project_export(db, project_id), format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="project-{project_id}.{format}"'},
+    )
\ No newline at end of file
@@ -2,14 +2,21 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import crud, models, schemas
 from db import get_db
-from email_sender import send_invite_email
+from email_templates import render_invite
+from mail_outbox import mail_outbox
 from routes.auth import decode_jwt_token
 from datetime import datetime
 import os
 
+BULK_INVITE_MAX = int(os.getenv("BULK_INVITE_MAX", "200"))
 
 invite_router = APIRouter()
 
+
+def make_invite_link(token: str, project_id: int) -> str:
+    return f"http://34.123.72.43:8000/projects/accept-invite?token={token}&projectId={project_id}"
+
+
 @invite_router.post("/projects/{project_id}/invite")
 def invite_user(
     project_id: int,
@@ -36,24 +43,79 @@ def invite_user(
     if existing_team_member:
         raise HTTPException(status_code=400, detail="Invited user is already part of the project")
     
-    invite_entry = crud.create_invite(db, project_id, invite.email)
+    invite_entry = crud.new_invite(db, project_id, invite.email)
 
     # Generate invite link
-    invite_link = f"http://34.123.72.43:8000/projects/accept-invite?token={invite_entry.token}&projectId={project_id}"
+    invite_link = make_invite_link(invite_entry.token, project_id)
 
 
-    # Send email
+    # Queue the email with the invitation; the outbox workers send it after the commit
     sender_email = os.getenv("SMTP_EMAIL")
-    sender_password = os.getenv("SMTP_PASSWORD")
-    send_invite_email(db, sender_email, sender_password, invite.email, project_id, invite_link)
+    subject, body, text_body = render_invite(project.title, sender_email, invite_link)
+    crud.enqueue_email(db, invite.email, subject, body, sender=sender_email,
+                       invitation_id=invite_entry.invitation_id, text_body=text_body)
+    db.commit()
+    mail_outbox.wake()
 
     return {"message": "Invitation sent successfully"}
 
 
+@invite_router.post("/projects/{project_id}/invite/bulk")
+def invite_users(
+    project_id: int,
+    invites: schemas.BulkInviteCreate,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(decode_jwt_token)
+):
+    if len(invites.emails) > BULK_INVITE_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_INVITE_MAX} emails per request")
+    project = db.query(models.Project.title).filter(models.Project.project_id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    sender_email = os.getenv("SMTP_EMAIL")
+
+    def build_email(invite):
+        # The title/sender parts are rendered once per project and cached; only the link differs
+        subject, body, text_body = render_invite(project.title, sender_email, make_invite_link(invite["token"], project_id))
+        return sender_email, subject, body, text_body
+
+    try:
+        results = crud.create_bulk_invites(db, project_id, invites.emails, build_email)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    # The outbox workers send the queued emails in batches over pooled SMTP sessions
+    mail_outbox.wake()
+    return {"results": results}
+
+
+@invite_router.get("/projects/{project_id}/invites")
+def pending_invites(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(decode_jwt_token)
+):
+    project = db.query(models.Project.creator_id).filter(models.Project.project_id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    # Invitee addresses are only for the project's owner and members
+    user_id = current_user["user_id"]
+    if project.creator_id != user_id and not db.query(models.ProjectTeam.project_team_id).filter(
+        models.ProjectTeam.project_id == project_id, models.ProjectTeam.user_id == user_id
+    ).first():
+        raise HTTPException(status_code=403, detail="Not authorized to access this project")
+
+    invites = crud.get_pending_invites(db, project_id=project_id)
+    return [
+        {"invitation_id": i.invitation_id, "email": i.email, "created_at": i.created_at, "expires_at": i.expires_at}
+        for i in invites
+    ]
+
+
 @invite_router.get("/projects/accept-invite")
 def accept_invite(token: str, db: Session = Depends(get_db)):
     invite = crud.get_invite_by_token(db, token)
-    if not invite or invite.status != "Pending":
+    if not invite or not crud.invite_is_live(invite):
         raise HTTPException(status_code=404, detail="Invalid or expired invitation")
 
     # ✅ Extract user email from invite and find user
@@ -85,5 +147,6 @@ def add_member_to_project(
 
     new_assignment = models.ProjectTeam(project_id=project_id, user_id=user_id)
     db.add(new_assignment)
+    crud.record_team_change(db, project_id, user_id)
     db.commit()
     return {"message": "User added to project"}
@@ -45,6 +45,7 @@ class TaskUpdate(BaseModel):
     description: Optional[str] = None
     progress: Optional[float] = None
     due_date: Optional[str] = None  # format: 'YYYY-MM-DD'
+    category: Optional[str] = None
 
 
 # Schema for creating a user
@@ -136,6 +137,9 @@ class DashboardMetricRead(BaseModel):
 class InviteCreate(BaseModel):
     email: EmailStr
 
+class BulkInviteCreate(BaseModel):
+    emails: List[str]  # checked one by one, so a bad address is reported instead of failing the batch
+
 class InviteResponse(BaseModel):
     invitation_id: int
     project_id: int
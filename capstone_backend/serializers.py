@@ -0,0 +1,66 @@
+"""Fast JSON output: an orjson response class and precompiled row serializers.
+
+Routes that return FastJSONResponse themselves skip FastAPI's jsonable_encoder pass;
+everything else still gets orjson rendering through the app's default response class.
+"""
+import functools
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+from sqlalchemy import Numeric
+
+
+def _num(value):
+    # Same as jsonable_encoder: whole decimals as int, the rest as float.
+    # Labelled expressions can share a Numeric column's name and still be float/None.
+    if not isinstance(value, Decimal):
+        return value
+    return int(value) if value.as_tuple().exponent >= 0 else float(value)
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return _num(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def compile_serializer(name: str, fields, decimals=(), constants=None):
+    """Build ``row -> dict`` as one dict literal for rows exposing ``fields`` as attributes.
+
+    ``fields`` is a list of attribute names (or (key, attribute) pairs); attributes in
+    ``decimals`` go through the Decimal conversion, everything else is left to orjson.
+    ``constants`` are fixed leading entries, e.g. a record type.
+    """
+    items = [f"{key!r}: {value!r}" for key, value in (constants or {}).items()]
+    for field in fields:
+        key, attr = field if isinstance(field, tuple) else (field, field)
+        if not attr.isidentifier():
+            raise ValueError(f"Not a column attribute: {attr}")
+        value = f"_num(row.{attr})" if attr in decimals else f"row.{attr}"
+        items.append(f"{key!r}: {value}")
+    source = f"def {name}(row):\n    return {{{', '.join(items)}}}\n"
+    namespace = {"_num": _num}
+    exec(compile(source, f"<serializer {name}>", "exec"), namespace)
+    return namespace[name]
+
+
+def decimal_columns(model):
+    return frozenset(c.key for c in model.__table__.columns if isinstance(c.type, Numeric))
+
+
+@functools.lru_cache(maxsize=256)
+def row_serializer(model, fields: tuple):
+    """Cached serializer for rows of ``model`` columns (or same-named labels) in ``fields``."""
+    return compile_serializer(f"serialize_{model.__tablename__.lower()}", fields, decimal_columns(model))
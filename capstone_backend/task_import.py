@@ -0,0 +1,115 @@
+"""Reading and validating uploaded task files for the bulk import endpoint.
+
+CSV and NDJSON are read a line at a time from the spooled upload; a JSON array has to be
+parsed whole, so large imports should use one of the other two. Database work is in
+crud.import_tasks().
+"""
+import codecs
+import csv
+import json
+import os
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+IMPORT_FORMATS = ("csv", "ndjson", "json")
+IMPORT_PRIORITIES = ("High", "Medium", "Low")
+IMPORT_CATEGORIES = ("To Do", "In Progress", "Completed")  # the Tasks.category ENUM
+_CATEGORIES_BY_NAME = {category.lower(): category for category in IMPORT_CATEGORIES}
+
+
+def detect_format(filename: str, content_type: str = None) -> str:
+    """csv, ndjson or json from the file extension, falling back to the content type."""
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension in IMPORT_FORMATS:
+        return extension
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    if content_type == "application/json":
+        return "json"
+    raise ValueError("Upload a .csv, .ndjson or .json file")
+
+
+def read_rows(file, fmt: str):
+    """Raw rows from a binary file: dicts for CSV and JSON, undecoded lines for NDJSON."""
+    text = codecs.getreader("utf-8-sig")(file)
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+    elif fmt == "ndjson":
+        for line in text:
+            if line.strip():
+                yield line
+    else:
+        try:
+            rows = json.load(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(rows, list):
+            raise ValueError("Expected a JSON array of tasks")
+        yield from rows
+
+
+def parse_import_row(raw) -> dict:
+    """A validated task row; ValueError says what is wrong with it.
+
+    ``assignees`` is a list of emails, or a string separated by ";" (or ",") in CSV; they
+    are lower-cased, as users are matched by email case-insensitively.
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError:
+            raise ValueError("Invalid JSON")
+    if not isinstance(raw, dict):
+        raise ValueError("Expected an object")
+
+    title = str(raw.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    if len(title) > 255:
+        raise ValueError("title is longer than 255 characters")
+
+    priority = str(raw.get("priority") or "Medium").strip().capitalize()
+    if priority not in IMPORT_PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(IMPORT_PRIORITIES)}")
+
+    category = _CATEGORIES_BY_NAME.get(" ".join(str(raw.get("category") or "To Do").split()).lower())
+    if category is None:
+        raise ValueError(f"category must be one of {', '.join(IMPORT_CATEGORIES)}")
+
+    due_date = raw.get("due_date") or None
+    if due_date is not None:
+        try:
+            due_date = date.fromisoformat(str(due_date)[:10])
+        except ValueError:
+            raise ValueError("due_date must be YYYY-MM-DD")
+
+    progress = raw.get("progress")
+    if progress in (None, ""):
+        progress = Decimal("0")
+    else:
+        try:
+            progress = Decimal(str(progress))
+        except InvalidOperation:
+            raise ValueError("progress must be a number")
+        if not 0 <= progress <= 1:
+            raise ValueError("progress must be between 0 and 1")
+
+    assignees = raw.get("assignees") or []
+    if isinstance(assignees, str):
+        assignees = assignees.replace(",", ";").split(";")
+    if not isinstance(assignees, list):
+        raise ValueError("assignees must be a list of emails")
+    assignees = list(dict.fromkeys(str(email).strip().lower() for email in assignees if str(email).strip()))
+
+    return {
+        "title": title,
+        "category": category,
+        "priority": priority,
+        "due_date": due_date,
+        "progress": progress,
+        "assignees": assignees,
+    }
@@ -0,0 +1,152 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import crud, hashing, models, schemas
+from db import get_db
+from principal_cache import Principal, PrincipalCache, principal_cache
+from routes.auth import auth_router, create_jwt_token
+
+# Use an in-memory SQLite database shared by the app and the test session
+DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+app = FastAPI()
+app.include_router(auth_router, prefix="/auth")
+
+
+def override_get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+@pytest.fixture
+def db():
+    """Fixture to create a fresh schema and session for each test."""
+    models.Base.metadata.create_all(bind=engine)
+    principal_cache.clear()
+    session = SessionLocal()
+    yield session
+    session.close()
+    models.Base.metadata.drop_all(bind=engine)
+
+
+def count_queries(func):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return result, len(statements)
+
+
+def make_user(db):
+    user = models.User(
+        first_name="Test", last_name="User", email="testuser@example.com",
+        phone_no="1234567890", password="password"
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def test_verified_token_is_served_without_queries(db):
+    user = make_user(db)
+    headers = {"Authorization": f"Bearer {create_jwt_token({'user_id': user.user_id, 'email': user.email})}"}
+
+    response, queries = count_queries(lambda: client.get("/auth/me", headers=headers))
+    assert response.status_code == 200
+    assert queries == 1
+
+    response, queries = count_queries(lambda: client.get("/auth/me", headers=headers))
+    assert response.status_code == 200
+    assert response.json()["first_name"] == "Test"
+    assert queries == 0
+
+
+def test_user_update_invalidates_cached_principal(db):
+    user = make_user(db)
+    headers = {"Authorization": f"Bearer {create_jwt_token({'user_id': user.user_id, 'email': user.email})}"}
+    client.get("/auth/me", headers=headers)
+
+    crud.update_user(db, user.user_id, schemas.UserUpdate(first_name="Renamed"))
+
+    response, queries = count_queries(lambda: client.get("/auth/me", headers=headers))
+    assert response.json()["first_name"] == "Renamed"
+    assert queries == 1
+
+
+def test_invalid_and_expired_tokens_are_rejected(db):
+    user = make_user(db)
+    expired = create_jwt_token({"user_id": user.user_id}, expires_delta=-1)
+
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+    assert client.get("/auth/me", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+
+
+def test_principal_cache_is_bounded_and_honours_expiry():
+    cache = PrincipalCache(maxsize=2, ttl=60)
+    principal = Principal(user_id=1, email="a@example.com", first_name="A", last_name="B")
+    now = time.time()
+
+    cache.put("one", principal, now + 60)
+    cache.put("two", principal, now + 60)
+    cache.get("one")  # "two" is now least recently used
+    cache.put("three", principal, now + 60)
+    assert cache.get("two") is None
+    assert cache.get("one") == principal
+    assert len(cache) == 2
+
+    cache.put("expired", principal, now - 1)
+    assert cache.get("expired") is None
+
+    cache.invalidate_user(1)
+    assert len(cache) == 0
+
+
+def test_login_hashes_on_the_pool(db):
+    response = client.post("/auth/signup", json={
+        "first_name": "New", "last_name": "User", "email": "new@example.com",
+        "phone_no": "5550001", "password": "s3cret"
+    })
+    assert response.status_code == 200
+
+    assert client.post("/auth/login", json={"email": "new@example.com", "password": "s3cret"}).status_code == 200
+    assert client.post("/auth/login", json={"email": "new@example.com", "password": "wrong"}).status_code == 401
+
+
+def test_login_sheds_load_when_hashing_queue_is_full(db, monkeypatch):
+    make_user(db)
+    monkeypatch.setattr(hashing, "hashing_pool", hashing.HashingPool(max_pending=0))
+
+    response = client.post("/auth/login", json={"email": "testuser@example.com", "password": "password"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_users_listing_pages_by_cursor(db):
+    make_user(db)
+    db.add(models.User(first_name="Second", last_name="User", email="second@example.com", phone_no="555", password="x"))
+    db.commit()
+
+    first = client.get("/auth/users/", params={"limit": 1})
+    assert [u["first_name"] for u in first.json()] == ["Test"]
+    assert "password" not in first.json()[0]
+
+    second = client.get("/auth/users/", params={"limit": 1, "cursor": first.headers["X-Next-Cursor"]})
+    assert [u["first_name"] for u in second.json()] == ["Second"]
+    assert "X-Next-Cursor" not in second.headers
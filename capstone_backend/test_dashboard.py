@@ -0,0 +1,788 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from fastapi import FastAPI, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+import crud, export, models, pagination, schemas
+from db import get_db, get_async_db, to_async_url
+from routes.auth import create_jwt_token, decode_jwt_token, get_current_user
+from principal_cache import principal_cache
+from routes.dashboard import router as dashboard_router
+from progress_coalescer import ProgressCoalescer, progress_coalescer
+from realtime import hub
+from serializers import dumps
+
+# A throwaway SQLite file, so the sync and async (aiosqlite) engines see the same data
+DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test_dashboard.db')}"
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# TestClient may run each request on a new event loop, so async connections are not pooled
+async_engine = create_async_engine(to_async_url(DATABASE_URL), poolclass=NullPool)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+app = FastAPI()
+app.include_router(dashboard_router, prefix="/dashboard")
+
+
+def override_get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def override_get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+# Write progress through immediately: TestClient's event loop does not outlive a request
+progress_coalescer.window_ms = 0
+progress_coalescer.session_factory = AsyncSessionLocal
+client = TestClient(app)
+
+
+class QueryCounter:
+    """Count the SQL statements sent to the test engines."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self)
+        event.remove(async_engine.sync_engine, "before_cursor_execute", self)
+
+
+def login_as(user_id):
+    """Authenticate every request as the given user."""
+    def override_get_current_user():
+        db = SessionLocal()
+        try:
+            return db.query(models.User).filter(models.User.user_id == user_id).first()
+        finally:
+            db.close()
+
+    app.dependency_overrides[decode_jwt_token] = lambda: {"user_id": user_id}
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+@pytest.fixture
+def db():
+    """Fixture to create a fresh schema and session for each test."""
+    models.Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+    models.Base.metadata.drop_all(bind=engine)
+    app.dependency_overrides.pop(decode_jwt_token, None)
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def make_user(db, n):
+    user = models.User(
+        first_name=f"User{n}", last_name="Test", email=f"user{n}@example.com",
+        phone_no=f"555000{n:04d}", password="password"
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def make_project(db, creator, title="Project"):
+    project = models.Project(title=title, creator_id=creator.user_id, progress=0)
+    db.add(project)
+    db.commit()
+    return project
+
+
+def make_tasks(db, project, count, assignees=(), category="To Do"):
+    tasks = []
+    for i in range(count):
+        task = models.Task(
+            project_id=project.project_id, title=f"Task {i}", category=category,
+            priority="Medium", progress=0
+        )
+        db.add(task)
+        tasks.append(task)
+    db.flush()
+    for task in tasks:
+        for user in assignees:
+            db.add(models.UserAssignment(task_id=task.task_id, user_id=user.user_id))
+    db.commit()
+    return tasks
+
+
+def test_get_tasks_by_project_returns_every_assignee(db):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    project = make_project(db, alice)
+    make_tasks(db, project, 1, assignees=(alice, bob))
+    make_tasks(db, project, 1)
+
+    tasks = crud.get_tasks_by_project(db, project.project_id)
+
+    assert len(tasks) == 2
+    assert [a["user_id"] for a in tasks[0]["assignees"]] == [alice.user_id, bob.user_id]
+    assert tasks[0]["assigned_to"] == "User1 Test, User2 Test"
+    assert tasks[1]["assignees"] == []
+    assert tasks[1]["assigned_to"] == "Unassigned"
+
+
+def test_project_tasks_endpoint_query_count_is_constant(db):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    small, large = make_project(db, alice, "Small"), make_project(db, alice, "Large")
+    make_tasks(db, small, 2, assignees=(alice,))
+    make_tasks(db, large, 50, assignees=(alice, bob))
+    small_id, large_id = small.project_id, large.project_id
+
+    with QueryCounter() as small_queries:
+        response = client.get(f"/dashboard/projects/{small_id}/tasks")
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+    with QueryCounter() as large_queries:
+        response = client.get(f"/dashboard/projects/{large_id}/tasks")
+    assert response.status_code == 200
+    assert len(response.json()) == 50
+
+    assert large_queries.count == small_queries.count == 1
+
+
+def test_project_summaries_count_tasks_and_team(db):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    project, empty = make_project(db, alice), make_project(db, alice, "Empty")
+    make_tasks(db, project, 3, category="Completed")
+    make_tasks(db, project, 1)
+    db.add_all([
+        models.ProjectTeam(project_id=project.project_id, user_id=alice.user_id),
+        models.ProjectTeam(project_id=project.project_id, user_id=bob.user_id),
+    ])
+    db.commit()
+
+    summaries = crud.get_project_summaries(db, [project.project_id, empty.project_id])
+
+    assert summaries[project.project_id] == {"completed_tasks": 3, "total_tasks": 4, "team_count": 2}
+    assert summaries[empty.project_id] == {"completed_tasks": 0, "total_tasks": 0, "team_count": 0}
+
+
+def test_project_list_endpoints_query_count_is_constant(db):
+    alice = make_user(db, 1)
+    for i in range(20):
+        project = make_project(db, alice, f"Project {i}")
+        make_tasks(db, project, 3, category="Completed" if i % 2 else "To Do")
+        db.add(models.ProjectTeam(project_id=project.project_id, user_id=alice.user_id))
+    db.commit()
+    login_as(alice.user_id)
+
+    with QueryCounter() as queries:
+        response = client.get("/dashboard/projects/all")
+    assert response.status_code == 200
+    assert len(response.json()) == 20
+    assert {p["progress"] for p in response.json()} == {0.0, 1.0}
+    assert queries.count == 1
+
+    with QueryCounter() as queries:
+        response = client.get("/dashboard/projects/user")
+    assert response.status_code == 200
+    assert len(response.json()) == 20
+    assert all(p["team_count"] == 1 for p in response.json())
+    # The extra statements load the authenticated user and the ETag version stamp
+    assert queries.count == 5
+
+
+def test_project_counters_never_drift(db):
+    alice = make_user(db, 1)
+    project = make_project(db, alice)
+    project_id = project.project_id
+    login_as(alice.user_id)
+
+    task_ids = []
+    for i in range(6):
+        created = crud.create_task(db, schemas.TaskCreate(
+            project_id=project_id, title=f"Task {i}", category="To Do", assigned_to=alice.user_id
+        ))
+        task_ids.append(created.task_id)
+    assert crud.find_project_counter_drift(db) == []
+
+    steps = [
+        ("put", f"/dashboard/tasks/{task_ids[0]}/category?category=Completed", None),
+        ("put", f"/dashboard/tasks/{task_ids[1]}/category?category=Completed", None),
+        ("put", f"/dashboard/tasks/{task_ids[1]}/category?category=Completed", None),
+        ("put", f"/dashboard/tasks/{task_ids[2]}", {"progress": 1.0}),
+        ("put", f"/dashboard/tasks/{task_ids[0]}", {"category": "In Progress", "progress": 0.5}),
+        ("post", f"/dashboard/projects/{project_id}/tasks/assign",
+         {"title": "Late task", "category": "Completed", "priority": "Low", "user_ids": [alice.user_id]}),
+        ("delete", f"/dashboard/tasks/{task_ids[1]}", None),
+        ("delete", f"/dashboard/tasks/{task_ids[3]}", None),
+    ]
+    for method, url, body in steps:
+        response = client.request(method, url, json=body)
+        assert response.status_code == 200, response.text
+        db.expire_all()
+        assert crud.find_project_counter_drift(db) == []
+
+    project = crud.get_project(db, project_id)
+    assert (project.completed_count, project.total_count) == (2, 5)
+    assert float(project.progress) == pytest.approx(0.4)
+
+
+def test_rebuild_project_counters_repairs_drift(db):
+    alice = make_user(db, 1)
+    project = make_project(db, alice)
+    make_tasks(db, project, 3, category="Completed")
+    make_tasks(db, project, 1)
+    assert len(crud.find_project_counter_drift(db)) == 1
+
+    crud.rebuild_project_counters(db)
+
+    assert crud.find_project_counter_drift(db) == []
+    db.refresh(project)
+    assert (project.completed_count, project.total_count) == (3, 4)
+    assert float(project.progress) == pytest.approx(0.75)
+
+
+def test_dashboard_metrics_rollup_stays_consistent(db):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    project = make_project(db, alice)
+    project_id, alice_id, bob_id = project.project_id, alice.user_id, bob.user_id
+    db.add(models.ProjectTeam(project_id=project_id, user_id=bob_id))
+    db.commit()
+    overdue = crud.create_task(db, schemas.TaskCreate(
+        project_id=project_id, title="Overdue", category="To Do", priority="High",
+        due_date="2020-01-01T00:00:00", assigned_to=bob_id
+    )).task_id
+
+    # Materialise both rollups, then mutate through the API
+    for user_id in (alice_id, bob_id):
+        login_as(user_id)
+        assert client.get("/dashboard/metrics").status_code == 200
+
+    steps = [
+        ("post", f"/dashboard/projects/{project_id}/tasks/assign",
+         {"title": "Shared", "category": "To Do", "priority": "Low", "user_ids": [alice_id, bob_id]}),
+        ("put", f"/dashboard/tasks/{overdue}/category?category=Completed", None),
+        ("put", f"/dashboard/tasks/{overdue}", {"category": "In Progress", "progress": 0.2}),
+        ("delete", f"/dashboard/tasks/{overdue}", None),
+    ]
+    for method, url, body in steps:
+        response = client.request(method, url, json=body)
+        assert response.status_code == 200, response.text
+        db.expire_all()
+        assert crud.find_dashboard_metric_drift(db) == []
+
+    login_as(bob_id)
+    with QueryCounter() as queries:
+        metrics = client.get("/dashboard/metrics").json()
+    # One statement each for the authenticated user, the ETag version stamp and the rollup row
+    assert queries.count == 3
+    assert metrics["total_tasks"] == 1
+    assert metrics["tasks_by_priority"] == {"Low": 1}
+    assert metrics["assigned_tasks"] == 1
+    assert metrics["overdue_tasks"] == 0
+
+
+def test_team_change_marks_dashboard_metrics_stale(db):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    project = make_project(db, alice)
+    make_tasks(db, project, 2)
+    alice_id, bob_id = alice.user_id, bob.user_id
+    crud.refresh_dashboard_metrics(db, alice_id)
+    crud.refresh_dashboard_metrics(db, bob_id)
+
+    crud.record_team_change(db, project.project_id, bob_id)
+    db.add(models.ProjectTeam(project_id=project.project_id, user_id=bob_id))
+    db.commit()
+
+    stale = db.query(models.DashboardMetric).filter(models.DashboardMetric.is_stale.is_(True)).all()
+    assert {row.user_id for row in stale} == {alice_id, bob_id}
+    assert crud.get_dashboard_metrics(db, bob)["total_tasks"] == 2
+    assert crud.get_dashboard_metrics(db, alice)["total_users"] == 1
+    assert crud.find_dashboard_metric_drift(db) == []
+
+
+def test_notifications_bucket_tasks_in_one_query(db):
+    alice = make_user(db, 1)
+    project = make_project(db, alice)
+    today = datetime.utcnow().date()
+    due_dates = {
+        "overdue": today - timedelta(days=2),
+        "tomorrow": today + timedelta(days=1),
+        "three": today + timedelta(days=3),
+        "seven": today + timedelta(days=6),
+        "later": today + timedelta(days=30),
+    }
+    for title, due_date in due_dates.items():
+        for task in make_tasks(db, project, 3, assignees=(alice,)):
+            task.title, task.due_date = title, due_date
+    done = make_tasks(db, project, 1, assignees=(alice,), category="Completed")[0]
+    done.due_date = due_dates["overdue"]
+    db.commit()
+    login_as(alice.user_id)
+
+    with QueryCounter() as queries:
+        response = client.get("/dashboard/notifications")
+    assert response.status_code == 200
+    # One statement for the ETag version stamp, one for the task buckets, one for project deadlines
+    assert queries.count == 3
+
+    body = response.json()
+    assert {t["title"] for t in body["reminders"]["due_tomorrow"]} == {"tomorrow"}
+    assert {t["title"] for t in body["reminders"]["due_in_3_days"]} == {"three"}
+    assert {t["title"] for t in body["reminders"]["due_in_7_days"]} == {"seven"}
+    assert len(body["overdue_tasks"]) == 3
+    assert {t["title"] for t in body["overdue_tasks"]} == {"overdue"}
+
+
+def test_project_members_counts_in_one_query(db):
+    users = [make_user(db, n) for n in range(1, 6)]
+    project, other = make_project(db, users[0]), make_project(db, users[0], "Other")
+    for user in users:
+        db.add(models.ProjectTeam(project_id=project.project_id, user_id=user.user_id))
+    db.commit()
+    make_tasks(db, project, 2, assignees=users[:2], category="Completed")
+    make_tasks(db, project, 3, assignees=users[:1])
+    make_tasks(db, other, 4, assignees=users[:1])
+    project_id = project.project_id
+
+    with QueryCounter() as queries:
+        response = client.get(f"/dashboard/projects/{project_id}/members")
+    assert response.status_code == 200
+    assert queries.count == 1
+
+    members = {m["email"]: m for m in response.json()}
+    assert len(members) == 5
+    assert members["user1@example.com"]["assigned_tasks"] == 5
+    assert members["user1@example.com"]["completed_tasks"] == 2
+    assert members["user2@example.com"]["assigned_tasks"] == 2
+    assert members["user5@example.com"]["assigned_tasks"] == 0
+    assert members["user5@example.com"]["completed_tasks"] == 0
+
+
+def test_async_task_routes_use_the_async_engine(db):
+    alice = make_user(db, 1)
+    project = make_project(db, alice)
+    task_id = make_tasks(db, project, 1, assignees=(alice,))[0].task_id
+
+    sync_statements = []
+    listener = lambda *args: sync_statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        with QueryCounter() as queries:
+            response = client.put(f"/dashboard/tasks/{task_id}/category?category=Completed")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert response.status_code == 200
+    assert queries.count > 0
+    assert sync_statements == []
+    db.expire_all()
+    assert crud.get_project(db, project.project_id).completed_count == 1
+
+
+def test_progress_bursts_are_coalesced_per_project(db, monkeypatch):
+    alice = make_user(db, 1)
+    first, second = make_project(db, alice, "First"), make_project(db, alice, "Second")
+    first_id, second_id = first.project_id, second.project_id
+
+    broadcasts = []
+
+    async def record_broadcast(project_id, progress):
+        broadcasts.append((project_id, progress))
+
+    monkeypatch.setattr("routes.dashboard.broadcast_progress_update", record_broadcast)
+    coalescer = ProgressCoalescer(window_ms=50, session_factory=AsyncSessionLocal)
+
+    async def drag_cards():
+        for step in range(10):
+            await coalescer.submit(first_id, step / 10)
+        await coalescer.submit(second_id, 0.5)
+        await asyncio.sleep(0.2)
+
+    progress_writes = []
+
+    def listener(conn, cursor, statement, *args):
+        if statement.startswith('UPDATE "Projects" SET progress'):
+            progress_writes.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        asyncio.run(drag_cards())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+
+    assert len(progress_writes) == 2
+    assert sorted(broadcasts) == [(first_id, 0.9), (second_id, 0.5)]
+    assert coalescer.stats == {"received": 11, "collapsed": 9, "flushed": 2, "failed": 0}
+    db.expire_all()
+    assert float(crud.get_project(db, first_id).progress) == pytest.approx(0.9)
+
+
+def test_coalesced_task_progress_is_read_from_the_counters_at_flush_time(db, monkeypatch):
+    alice = make_user(db, 1)
+    project = make_project(db, alice)
+    project_id = project.project_id
+    broadcasts = []
+
+    async def record_broadcast(project_id, progress):
+        broadcasts.append((project_id, progress))
+
+    monkeypatch.setattr("routes.dashboard.broadcast_progress_update", record_broadcast)
+    # Two workers, each coalescing its own edits
+    first, second = (ProgressCoalescer(window_ms=50, session_factory=AsyncSessionLocal) for _ in range(2))
+
+    async def edits():
+        db.query(models.Project).filter_by(project_id=project_id).update({"completed_count": 1, "total_count": 4})
+        db.commit()
+        await first.submit(project_id)
+        await asyncio.sleep(0.02)
+        db.query(models.Project).filter_by(project_id=project_id).update({"completed_count": 3})
+        db.commit()
+        await second.submit(project_id)
+        await second.flush_all()  # the newer edit lands first
+        await asyncio.sleep(0.1)  # then the older worker's window closes
+
+    asyncio.run(edits())
+    assert broadcasts == [(project_id, 0.75), (project_id, 0.75)]
+    db.expire_all()
+    assert float(crud.get_project(db, project_id).progress) == pytest.approx(0.75)
+
+
+def test_task_changes_stream_sequenced_deltas(db):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    project = make_project(db, alice)
+    project_id = project.project_id
+    login_as(alice.user_id)
+
+    # One portal for the socket and the requests, so they share the hub's event loop
+    with TestClient(app) as live, live.websocket_connect(f"/dashboard/ws/progress/{project_id}") as ws:
+        assert ws.receive_json() == {"type": "subscribed", "project_id": project_id, "seq": 0, "resync": False}
+
+        task_id = live.post(f"/dashboard/projects/{project_id}/tasks/assign", json={
+            "title": "Card", "category": "To Do", "priority": "High", "user_ids": [alice.user_id]
+        }).json()["task_id"]
+        created = ws.receive_json()
+        assert created["type"] == "task.created" and created["seq"] == 1
+        assert created["task"]["assignees"] == [{"user_id": alice.user_id, "full_name": "User1 Test"}]
+
+        live.post(f"/dashboard/tasks/{task_id}/assign?user_id={bob.user_id}")
+        assigned = ws.receive_json()
+        assert assigned["type"] == "task.assignment_changed" and assigned["seq"] == 2
+        assert [a["user_id"] for a in assigned["assignees"]] == [alice.user_id, bob.user_id]
+
+        live.put(f"/dashboard/tasks/{task_id}", json={"title": "Renamed"})
+        assert ws.receive_json() == {
+            "type": "task.updated", "project_id": project_id, "seq": 3,
+            "task_id": task_id, "fields": {"title": "Renamed"},
+        }
+        assert ws.receive_json()["type"] == "progress"
+
+        assert live.put(f"/dashboard/tasks/{task_id}", json={"due_date": "2026-12-01"}).status_code == 200
+        assert ws.receive_json()["fields"] == {"due_date": "2026-12-01"}
+        assert ws.receive_json()["type"] == "progress"
+        # The same date again is no change, so no task event
+        assert live.put(f"/dashboard/tasks/{task_id}", json={"due_date": "2026-12-01"}).status_code == 200
+        assert ws.receive_json()["type"] == "progress"
+        assert live.put(f"/dashboard/tasks/{task_id}", json={"due_date": "01/12/2026"}).status_code == 400
+
+        live.put(f"/dashboard/tasks/{task_id}/category?category=Completed")
+        moved = ws.receive_json()
+        assert (moved["type"], moved["seq"], moved["from"], moved["to"]) == ("task.moved", 5, "To Do", "Completed")
+        assert moved["fields"] == {"category": "Completed", "progress": 1.0}
+        assert ws.receive_json() == {"type": "progress", "project_id": project_id, "progress": 1.0}
+
+        live.delete(f"/dashboard/tasks/{task_id}")
+        assert ws.receive_json() == {"type": "task.deleted", "project_id": project_id, "seq": 6, "task_id": task_id}
+
+
+def test_reconnecting_client_resumes_from_its_last_sequence(db):
+    alice = make_user(db, 1)
+    project = make_project(db, alice)
+    project_id = project.project_id
+    task_ids = [t.task_id for t in make_tasks(db, project, 3)]
+    for task_id in task_ids:
+        client.put(f"/dashboard/tasks/{task_id}/category?category=In Progress")
+
+    with client.websocket_connect(f"/dashboard/ws/progress/{project_id}?since=1") as ws:
+        replayed = [ws.receive_json() for _ in range(2)]
+        assert [(e["seq"], e["task_id"]) for e in replayed] == [(2, task_ids[1]), (3, task_ids[2])]
+        assert ws.receive_json() == {"type": "subscribed", "project_id": project_id, "seq": 3, "resync": False}
+
+    # Once the log no longer covers the gap the client is told to reload the board
+    crud.prune_project_events(db, datetime.utcnow() + timedelta(seconds=1))
+    with client.websocket_connect(f"/dashboard/ws/progress/{project_id}?since=1") as ws:
+        assert ws.receive_json() == {"type": "subscribed", "project_id": project_id, "seq": 3, "resync": True}
+
+    # An unknown project gets a clean close instead of a server error
+    with client.websocket_connect("/dashboard/ws/progress/999") as ws:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1008 and 999 not in hub.connections
+
+    assert crud.get_project_events(db, project_id, 0, limit=2) == (3, None)
+    assert crud.get_project_events(db, project_id, 3, limit=2) == (3, [])
+
+
+def test_sync_returns_only_rows_changed_since_the_cursor(db, monkeypatch):
+    monkeypatch.setattr(crud, "SYNC_CURSOR_LAG_SECONDS", 0)
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    board, other = make_project(db, alice, "Board"), make_project(db, alice, "Other")
+    moved, removed, untouched = make_tasks(db, board, 3, assignees=(alice,))
+    make_tasks(db, other, 2)
+    board_id, moved_id, removed_id = board.project_id, moved.task_id, removed.task_id
+    login_as(alice.user_id)
+
+    first = client.get("/dashboard/sync").json()
+    assert first["full"] is True
+    assert {p["title"] for p in first["projects"]} == {"Board", "Other"}
+    assert len(first["tasks"]) == 5 and len(first["assignments"]) == 3
+
+    client.put(f"/dashboard/tasks/{moved_id}/category?category=Completed")
+    client.delete(f"/dashboard/tasks/{removed_id}")
+
+    with QueryCounter() as queries:
+        delta = client.get("/dashboard/sync", params={"since": first["cursor"]}).json()
+    assert delta["full"] is False
+    assert [(t["task_id"], t["category"], t["version"]) for t in delta["tasks"]] == [(moved_id, "Completed", 2)]
+    # The counters moved, so the board came down again but the other project didn't
+    assert [p["project_id"] for p in delta["projects"]] == [board_id]
+    assert delta["assignments"] == [] and delta["team"] == []
+    assert {(d["entity"], d["project_id"]) for d in delta["deleted"]} == {("task", board_id), ("assignment", board_id)}
+    assert {d["id"] for d in delta["deleted"] if d["entity"] == "task"} == {removed_id}
+    assert queries.count <= 9
+
+    assert client.get("/dashboard/sync", params={"since": delta["cursor"]}).json()["tasks"] == []
+    assert client.get("/dashboard/sync", params={"since": "yesterday"}).status_code == 400
+    for since in ("99999999999999999999", "-99999999999999999"):
+        assert client.get("/dashboard/sync", params={"since": since}).status_code == 400
+
+    # A project Bob joins after his last sync comes down whole, not just its new rows
+    login_as(bob.user_id)
+    cursor = client.get("/dashboard/sync").json()["cursor"]
+    db.add(models.ProjectTeam(project_id=board_id, user_id=bob.user_id))
+    db.commit()
+    joined = client.get("/dashboard/sync", params={"since": cursor}).json()
+    assert [p["project_id"] for p in joined["projects"]] == [board_id]
+    assert len(joined["tasks"]) == 2 and len(joined["team"]) == 1
+
+
+def test_list_endpoints_page_by_key_and_select_only_requested_fields(db, monkeypatch):
+    monkeypatch.setattr(pagination, "PAGE_SIZE_MAX", 4)
+    alice = make_user(db, 1)
+    project = make_project(db, alice)
+    task_ids = [t.task_id for t in make_tasks(db, project, 10)]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = client.get("/dashboard/tasks", params={"limit": 50, "cursor": cursor})
+        assert len(response.json()) <= 4  # capped
+        seen += [t["task_id"] for t in response.json()]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == task_ids and pages == 3
+
+    # Without a limit the default page size still applies
+    monkeypatch.setattr(pagination, "PAGE_SIZE_DEFAULT", 4)
+    response = client.get("/dashboard/tasks", params={"limit": 0})
+    assert [t["task_id"] for t in response.json()] == task_ids[:4] and "X-Next-Cursor" in response.headers
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.get("/dashboard/tasks", params={"fields": "task_id,title", "limit": 2})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert response.json() == [{"task_id": task_ids[0], "title": "Task 0"}, {"task_id": task_ids[1], "title": "Task 1"}]
+    assert "category" not in statements[0] and "priority" not in statements[0]
+
+    assert client.get("/dashboard/tasks", params={"fields": "task_id,secret"}).status_code == 400
+    assert client.get("/dashboard/tasks", params={"cursor": "not-a-cursor"}).status_code == 400
+    for shape in ([[1]], [1, 2], ["x"]):
+        assert client.get("/dashboard/tasks", params={"cursor": pagination.encode_cursor(shape)}).status_code == 400
+    stray = pagination.encode_cursor([1, 2])
+    assert client.get("/dashboard/projects/all", params={"sort": "created_at", "cursor": stray}).status_code == 400
+    assert "password" not in client.get("/dashboard/users").json()[0]
+
+
+def test_created_at_pages_break_ties_on_the_primary_key(db):
+    alice = make_user(db, 1)
+    stamp = datetime(2024, 1, 1, 9, 0)
+    for i, offset in enumerate((2, 0, 1, 1, 1)):
+        db.add(models.Project(title=f"P{i}", creator_id=alice.user_id, created_at=stamp + timedelta(minutes=offset)))
+    db.commit()
+
+    titles, cursor = [], None
+    while True:
+        response = client.get("/dashboard/projects/all", params={"sort": "created_at", "limit": 2, "cursor": cursor})
+        titles += [p["title"] for p in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert titles == ["P1", "P2", "P3", "P4", "P0"]
+    assert response.json()[-1]["creator_name"] == "User1 Test"
+
+
+def test_unchanged_dashboard_reads_answer_304_with_one_query(db):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    project = make_project(db, alice)
+    task_id = make_tasks(db, project, 2, assignees=(alice,))[0].task_id
+    db.add(models.ProjectTeam(project_id=project.project_id, user_id=alice.user_id))
+    db.commit()
+    # Real token auth: the principal cache serves repeat requests without a query
+    headers = {"Authorization": f"Bearer {create_jwt_token({'user_id': alice.user_id, 'email': alice.email})}"}
+    principal_cache.clear()
+
+    for url in ("/dashboard/metrics", "/dashboard/notifications", "/dashboard/projects/user"):
+        first = client.get(url, headers=headers)
+        assert first.status_code == 200 and first.headers["ETag"]
+
+        with QueryCounter() as queries:
+            again = client.get(url, headers={**headers, "If-None-Match": first.headers["ETag"]})
+        assert again.status_code == 304 and again.content == b""
+        assert queries.count <= 1
+
+    etag = client.get("/dashboard/projects/user", headers=headers).headers["ETag"]
+    client.put(f"/dashboard/tasks/{task_id}/category?category=Completed")
+    assert client.get("/dashboard/projects/user", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    # Joining a project changes the stamp too
+    etag = client.get("/dashboard/projects/user", headers=headers).headers["ETag"]
+    other = make_project(db, bob, "Other")
+    db.add(models.ProjectTeam(project_id=other.project_id, user_id=alice.user_id))
+    db.commit()
+    assert client.get("/dashboard/projects/user", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+
+def test_fast_json_output_matches_jsonable_encoder(db):
+    alice = make_user(db, 1)
+    project = make_project(db, alice)
+    make_tasks(db, project, 3, assignees=(alice,))
+    for i in range(3):
+        db.add(models.Activity(user_id=alice.user_id, project_id=project.project_id, task_title=f"Task {i}", action="added"))
+    db.commit()
+
+    tasks, _ = crud.get_tasks(db)
+    assert json.loads(dumps(tasks)) == jsonable_encoder(tasks)
+    assert json.loads(dumps({"a": Decimal("1.50"), "b": Decimal("2"), "c": None})) == {"a": 1.5, "b": 2, "c": None}
+
+    # Activities come from one joined query, not a user lookup per row
+    url = f"/dashboard/projects/{project.project_id}/activities"
+    with QueryCounter() as queries:
+        response = client.get(url)
+    assert queries.count == 1
+    assert [a["user"] for a in response.json()] == [alice.first_name] * 3
+    assert datetime.fromisoformat(response.json()[0]["timestamp"])
+
+
+def test_project_export_streams_ndjson_and_csv_in_chunks(db, monkeypatch):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    project = make_project(db, alice)
+    make_tasks(db, project, 5, assignees=(alice, bob))
+    db.add(models.Activity(user_id=bob.user_id, project_id=project.project_id, task_title="Task 0", action="completed"))
+    db.commit()
+    url = f"/dashboard/projects/{project.project_id}/export"
+    monkeypatch.setattr(export, "EXPORT_CHUNK_BYTES", 200)
+
+    response = client.get(url)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.content.splitlines()]
+    assert [r["type"] for r in records] == ["task"] * 5 + ["assignment"] * 10 + ["activity"]
+    assert records[5]["email"] == alice.email and records[-1]["title"] == "Task 0"
+
+    # The body goes out in several chunks, and batches smaller than the project cover every row
+    chunks = list(export.export_chunks(crud.iter_project_export(db, project.project_id, batch_size=2), "ndjson"))
+    assert len(chunks) > 1 and b"".join(chunks) == response.content
+
+    rows = list(csv.DictReader(io.StringIO(client.get(url, params={"format": "csv"}).text)))
+    assert len(rows) == 16 and rows[0]["type"] == "task" and rows[0]["email"] == ""
+    assert rows[-1]["action"] == "completed"
+
+    assert client.get(url, params={"format": "xml"}).status_code == 400
+    assert client.get("/dashboard/projects/9999/export").status_code == 404
+
+
+def test_task_import_inserts_in_chunks_and_reports_bad_rows(db):
+    alice, bob = make_user(db, 1), make_user(db, 2)
+    project = make_project(db, alice)
+    db.add(models.ProjectTeam(project_id=project.project_id, user_id=alice.user_id))
+    db.commit()
+    project_id = project.project_id
+    crud.get_dashboard_metrics(db, alice)
+    upload = (
+        "title,priority,category,due_date,progress,assignees\n"
+        f"Design,High,To Do,2030-01-01,0,{alice.email.upper()};{bob.email}\n"
+        ",Low,To Do,,,\n"
+        f"Build,Medium,Completed,,1,{bob.email}\n"
+        "Ship,Urgent,To Do,,,\n"
+        "Test,Low,To Do,,,ghost@example.com\n"
+        f"Deploy,Low,in progress,,0.5,{alice.email}\n"
+        "Archive,Low,Backlog,,,\n"
+    )
+
+    response = client.post(
+        f"/dashboard/projects/{project_id}/tasks/import",
+        files={"file": ("tasks.csv", upload, "text/csv")},
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == 3 and report["failed"] == 4
+    assert [(e["row"], e["error"].split(":")[0]) for e in report["errors"]] == [
+        (2, "title is required"), (4, "priority must be one of High, Medium, Low"), (5, "Unknown assignee"),
+        (7, "category must be one of To Do, In Progress, Completed"),
+    ]
+
+    tasks = {t["title"]: t for t in crud.get_tasks_by_project(db, project_id)}
+    assert set(tasks) == {"Design", "Build", "Deploy"}
+    assert tasks["Deploy"]["category"] == "In Progress"  # one bad row didn't sink its chunk
+    assert tasks["Design"]["assigned_to"] == f"{alice.first_name} Test, {bob.first_name} Test"
+
+    # Counters, progress and the rollups match a full recompute
+    db.expire_all()
+    project = db.get(models.Project, project_id)
+    assert (project.completed_count, project.total_count) == (1, 3)
+    assert float(project.progress) == pytest.approx(0.33)
+    rollup = db.query(models.DashboardMetric).filter_by(user_id=alice.user_id).one()
+    fresh = crud.compute_dashboard_metrics(db, alice.user_id, crud.metric_day())
+    assert {f: getattr(rollup, f) for f in crud.METRIC_FIELDS} == {f: fresh[f] for f in crud.METRIC_FIELDS}
+
+    # Chunks commit on their own; emails are looked up once per chunk that introduces them
+    rows = [{"title": f"Bulk {i}", "assignees": [bob.email]} for i in range(7)] + ["{not json"]
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        report = crud.import_tasks(db, project_id, rows, chunk_size=3)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert report["imported"] == 7 and report["errors"] == [{"row": 8, "error": "Invalid JSON"}]
+    assert [e["type"] for e in report["events"]] == ["task.imported"] * 3
+    assert sum(len(e["tasks"]) for e in report["events"]) == 7
+    assert sum(s.startswith('SELECT "Users"') for s in statements) == 1
+    assert sum(s.startswith('INSERT INTO "UserAssignments"') for s in statements) == 3
+
+    assert client.post(
+        f"/dashboard/projects/{project_id}/tasks/import", files={"file": ("tasks.txt", "x", "text/plain")}
+    ).status_code == 400
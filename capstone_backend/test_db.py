@@ -0,0 +1,61 @@
+import os
+import tempfile
+import pytest
+from sqlalchemy import create_engine, event, exc, text
+import db
+
+
+@pytest.fixture
+def pool_engine():
+    """A SQLite file engine on the instrumented pool with a single connection."""
+    path = os.path.join(tempfile.mkdtemp(), "test_db.db")
+    engine = create_engine(
+        f"sqlite:///{path}", poolclass=db.InstrumentedQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    db.InstrumentedQueuePool.stats.reset()
+    yield engine
+    engine.dispose()
+
+
+def test_pool_stats_record_checkouts_and_timeouts(pool_engine):
+    held = pool_engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool_engine.connect()
+    held.close()
+    with pool_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    status = db.pool_status(pool_engine.pool)
+    assert status["checkouts"] == 3
+    assert status["timeouts"] == 1
+    assert status["wait_ms_max"] >= 50
+    assert sum(status["wait_ms_histogram"].values()) == 3
+    assert status["checked_out"] == 0
+    assert status["size"] == 1
+
+
+def test_idle_ping_replaces_dead_connections_only_after_idling(pool_engine, monkeypatch):
+    connects = []
+    event.listen(pool_engine, "connect", lambda *args: connects.append(1))
+    pings = []
+
+    def fake_ping(dbapi_connection):
+        pings.append(1)
+        return False  # every pinged connection is "dead"
+
+    monkeypatch.setattr(pool_engine.dialect, "do_ping", fake_ping)
+    db.install_idle_ping(pool_engine, idle_seconds=3600)
+
+    for _ in range(3):
+        with pool_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    # Fresh connections are not pinged
+    assert pings == []
+    assert len(connects) == 1
+
+    db.install_idle_ping(pool_engine, idle_seconds=0)
+    with pool_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert len(pings) >= 1
+    assert len(connects) == 2
@@ -1,14 +1,45 @@
+import asyncio
+import os
+import socket
+import tempfile
+import time
 import pytest
-from sqlalchemy import create_engine
+from aiosmtpd.controller import Controller
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
-import crud, models
+from datetime import datetime, timedelta
+import crud, email_sender, email_templates, mail_outbox, models
+from db import get_db
+from email_sender import SMTPPool
+from invite_sweeper import InviteSweeper
+from mail_outbox import MailOutbox
+from routes.auth import decode_jwt_token
+from routes.invite import invite_router
 
-# Use an in-memory SQLite database for testing
-DATABASE_URL = "sqlite:///:memory:"
+# A throwaway SQLite file, so the outbox worker threads see the test's data
+DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test_email.db')}"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+app = FastAPI()
+app.include_router(invite_router)
+
+
+def override_get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[decode_jwt_token] = lambda: {"user_id": 1}
+client = TestClient(app)
+
+
 @pytest.fixture
 def db():
     """Fixture to create a new database session for each test."""
@@ -16,6 +47,49 @@ def db():
     session = SessionLocal()
     yield session
     session.close()
+    models.Base.metadata.drop_all(bind=engine)
+
+
+class Inbox:
+    """aiosmtpd handler that keeps what it receives."""
+
+    def __init__(self):
+        self.messages = []
+        self.reply_delay = 0  # seconds between taking a message and acknowledging it
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        await asyncio.sleep(self.reply_delay)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setattr(email_sender, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(email_sender, "SMTP_PORT", port)
+    monkeypatch.setattr(email_sender, "SMTP_STARTTLS", False)
+    monkeypatch.setenv("SMTP_EMAIL", "team@example.com")
+    monkeypatch.delenv("SMTP_PASSWORD", raising=False)
+    yield inbox
+    email_sender.smtp_pool.close_all()
+    controller.stop()
+
+
+def make_project(db):
+    owner = models.User(first_name="Owner", last_name="User", email="owner@example.com", phone_no="1", password="x")
+    guest = models.User(first_name="Guest", last_name="User", email="guest@example.com", phone_no="2", password="x")
+    db.add_all([owner, guest])
+    db.flush()
+    project = models.Project(title="Apollo", creator_id=owner.user_id, progress=0)
+    db.add(project)
+    db.commit()
+    return project
 
 def test_create_invite(db):
     """Test if an invite is created successfully"""
@@ -51,3 +125,279 @@ def test_accept_invite(db):
     project_team = db.query(models.ProjectTeam).filter_by(project_id=project_id, user_id=user.user_id).first()
     assert project_team is not None
 
+
+
+def test_invite_returns_once_the_email_is_queued(db, monkeypatch):
+    project = make_project(db)
+    monkeypatch.setattr(email_sender, "send_emails", lambda *args: pytest.fail("sent inside the request"))
+
+    response = client.post(f"/projects/{project.project_id}/invite", json={"email": "guest@example.com"})
+    assert response.status_code == 200
+
+    invite = db.query(models.ProjectInvitation).one()
+    email = db.query(models.EmailOutbox).one()
+    assert (email.status, email.recipient, email.invitation_id) == ("Pending", "guest@example.com", invite.invitation_id)
+    assert "Apollo" in email.subject and invite.token in email.body
+
+
+def test_outbox_worker_delivers_queued_mail_over_smtp(db, smtp_server):
+    project = make_project(db)
+    client.post(f"/projects/{project.project_id}/invite", json={"email": "guest@example.com"})
+
+    async def run_workers():
+        outbox = MailOutbox(workers=2, session_factory=SessionLocal)
+        await outbox.start()
+        for _ in range(100):
+            if outbox.stats["sent"]:
+                break
+            await asyncio.sleep(0.05)
+        await outbox.stop()
+        return outbox
+
+    outbox = asyncio.run(run_workers())
+    assert outbox.stats == {"sent": 1, "retried": 0, "failed": 0}
+    [message] = smtp_server.messages
+    assert message.rcpt_tos == ["guest@example.com"] and b"Apollo" in message.content
+    assert b"multipart/alternative" in message.content and b"text/plain" in message.content
+
+    db.expire_all()
+    email = db.query(models.EmailOutbox).one()
+    assert (email.status, email.attempts, email.claimed_by) == ("Sent", 1, None)
+    assert email.sent_at is not None
+
+
+def test_outbox_retries_with_backoff_then_gives_up(db, smtp_server, monkeypatch):
+    monkeypatch.setattr(mail_outbox, "MAIL_MAX_ATTEMPTS", 3)
+    calls = []
+
+    def flaky_send(sender, password, emails):
+        calls.append(emails)
+        return [ConnectionRefusedError("SMTP is down") for _ in emails]
+
+    crud.enqueue_email(db, "guest@example.com", "Hello", "<p>Hi</p>")
+    db.commit()
+    outbox = MailOutbox(session_factory=SessionLocal, send=flaky_send)
+
+    assert asyncio.run(outbox.run_once()) == 1
+    email = db.query(models.EmailOutbox).one()
+    assert (email.status, email.attempts) == ("Pending", 1)
+    assert email.last_error == "ConnectionRefusedError: SMTP is down"
+    assert email.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)  # ~30s, jittered
+    assert asyncio.run(outbox.run_once()) == 0  # not due yet
+
+    def make_due():
+        db.query(models.EmailOutbox).update({models.EmailOutbox.next_attempt_at: datetime.utcnow()})
+        db.commit()
+
+    make_due()
+    asyncio.run(outbox.run_once())
+    db.expire_all()
+    email = db.query(models.EmailOutbox).one()
+    assert email.attempts == 2 and email.next_attempt_at > datetime.utcnow() + timedelta(seconds=45)
+
+    make_due()
+    asyncio.run(outbox.run_once())
+    db.expire_all()
+    email = db.query(models.EmailOutbox).one()
+    assert (email.status, email.attempts, len(calls)) == ("Failed", 3, 3)
+    assert outbox.stats == {"sent": 0, "retried": 2, "failed": 1}
+
+    # A claim whose worker died is taken over once its lease lapses, and then delivered
+    crud.enqueue_email(db, "guest@example.com", "Again", "<p>Hi</p>")
+    db.commit()
+    assert len(crud.claim_outbox_batch(db, "dead-worker", 10, lease_seconds=-1)) == 1
+    outbox.send = None
+    assert asyncio.run(outbox.run_once()) == 1
+    assert [m.rcpt_tos for m in smtp_server.messages] == [["guest@example.com"]]
+
+
+def test_smtp_pool_reuses_one_session_and_reconnects_when_it_dies(smtp_server):
+    pool = SMTPPool(size=2, idle_timeout=60, noop_after=60)
+    for i in range(5):
+        pool.sendmail("team@example.com", None, f"user{i}@example.com", f"Subject: {i}\n\nHello")
+    assert len(smtp_server.messages) == 5
+    assert (pool.stats["connects"], pool.stats["reused"]) == (1, 4)
+
+    # The server dropped the pooled session: the send goes out on a new one
+    [(server, _)] = next(iter(pool._idle.values()))
+    server.close()
+    pool.sendmail("team@example.com", None, "late@example.com", "Subject: late\n\nHello")
+    assert smtp_server.messages[-1].rcpt_tos == ["late@example.com"]
+    assert (pool.stats["connects"], pool.stats["reconnects"]) == (2, 1)
+
+    # A send that times out after the server took the message is not sent again
+    smtp_server.reply_delay = 0.5
+    [(server, _)] = next(iter(pool._idle.values()))
+    server.sock.settimeout(0.1)
+    with pytest.raises(OSError):
+        pool.sendmail("team@example.com", None, "once@example.com", "Subject: once\n\nHello")
+    time.sleep(0.6)
+    assert [m.rcpt_tos for m in smtp_server.messages].count(["once@example.com"]) == 1
+    assert pool.stats["reconnects"] == 1
+    smtp_server.reply_delay = 0
+    pool.sendmail("team@example.com", None, "next@example.com", "Subject: next\n\nHello")
+
+    # Sessions idle past noop_after are checked with NOOP, past idle_timeout closed
+    pool.noop_after = 0
+    pool.maintain()
+    assert pool.stats["evicted"] == 0 and len(next(iter(pool._idle.values()))) == 1
+    pool.idle_timeout = 0
+    pool.maintain()
+    assert pool.stats["evicted"] == 1 and not next(iter(pool._idle.values()))
+    pool.close_all()
+
+
+def test_bulk_invite_uses_set_based_queries_and_reports_each_address(db, smtp_server):
+    project = make_project(db)
+    owner = db.query(models.User).filter_by(email="owner@example.com").one()
+    db.add(models.ProjectTeam(project_id=project.project_id, user_id=owner.user_id))
+    db.add_all([
+        models.User(first_name=f"Dev{i}", last_name="User", email=f"dev{i}@example.com", phone_no=f"9{i}", password="x")
+        for i in range(12)
+    ])
+    db.commit()
+    crud.create_invite(db, project.project_id, "dev0@example.com")
+    emails = [f"dev{i}@example.com" for i in range(12)] + [
+        "owner@example.com", "nobody@example.com", "not-an-email", "dev1@example.com",
+    ]
+
+    url = f"/projects/{project.project_id}/invite/bulk"
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.post(url, json={"emails": emails})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert response.status_code == 200
+    statuses = {r["email"]: r["status"] for r in response.json()["results"][:12]}
+    assert statuses["dev0@example.com"] == "already_invited"
+    assert {statuses[f"dev{i}@example.com"] for i in range(1, 12)} == {"invited"}
+    assert [r["status"] for r in response.json()["results"][12:]] == [
+        "already_member", "not_found", "invalid", "duplicate",
+    ]
+    # Project, users + memberships, pending invitations, two batch inserts, the id lookup
+    assert len([s for s in statements if not s.startswith(("BEGIN", "COMMIT"))]) == 6
+
+    async def drain():
+        outbox = MailOutbox(session_factory=SessionLocal)
+        while await outbox.run_once():
+            pass
+
+    # Each claimed batch goes out back to back on one pooled session
+    connects = email_sender.smtp_pool.stats["connects"]
+    asyncio.run(drain())
+    assert email_sender.smtp_pool.stats["connects"] == connects + 1
+    assert sorted(m.rcpt_tos[0] for m in smtp_server.messages) == sorted(f"dev{i}@example.com" for i in range(1, 12))
+    invites = db.query(models.ProjectInvitation).filter(models.ProjectInvitation.email != "dev0@example.com").all()
+    assert len(invites) == 11 and all(invite.token in m.content.decode() for invite, m in zip(
+        sorted(invites, key=lambda i: i.email), sorted(smtp_server.messages, key=lambda m: m.rcpt_tos[0])
+    ))
+
+
+def test_invite_templates_escape_html_and_cache_per_project(smtp_server):
+    email_templates.invite_templates.cache_clear()
+    subject, html_body, text_body = email_templates.render_invite("R&D <Ops>", "team@example.com", "http://x/?a=1&b=2")
+    assert subject == "Invitation to Join R&D <Ops> Project"
+    assert "R&amp;D &lt;Ops&gt;" in html_body and 'href="http://x/?a=1&amp;b=2"' in html_body
+    assert "R&D <Ops>" in text_body and "http://x/?a=1&b=2" in text_body
+    assert "\n" not in email_templates.render_invite("Line\nBcc: x@example.com", "", "l")[0]
+
+    for i in range(5):
+        email_templates.render_invite("R&D <Ops>", "team@example.com", f"http://x/{i}")
+    assert email_templates.invite_templates.cache_info().misses == 2
+
+    # The longest project title still fits the outbox's subject column (MySQL strict mode rejects overflow)
+    longest = email_templates.render_invite("T" * models.Project.title.type.length, "", "l")[0]
+    assert len(longest) <= models.EmailOutbox.subject.type.length
+
+    # No session needed: the caller passes the title it already has
+    email_sender.send_invite_email("team@example.com", None, "guest@example.com", "Apollo", "http://x/1")
+    [message] = smtp_server.messages
+    assert message.rcpt_tos == ["guest@example.com"] and b"http://x/1" in message.content
+
+
+def test_invite_sweeper_expires_and_archives_in_batches(db):
+    project = make_project(db)
+    invites = [crud.create_invite(db, project.project_id, f"dev{i}@example.com") for i in range(6)]
+    assert invites[0].expires_at > datetime.utcnow() + timedelta(days=6)
+    crud.enqueue_email(db, "dev0@example.com", "Hi", "<p>Hi</p>", invitation_id=invites[0].invitation_id)
+    # Five lapse; dev5's stays live
+    db.query(models.ProjectInvitation).filter(models.ProjectInvitation.email != "dev5@example.com")\
+        .update({models.ProjectInvitation.expires_at: datetime.utcnow() - timedelta(minutes=1)})
+    db.commit()
+
+    # Expired already, even before a sweep marks it
+    response = client.get(f"/projects/accept-invite?token={invites[0].token}")
+    assert response.status_code == 404
+    pending = client.get(f"/projects/{project.project_id}/invites").json()
+    assert [i["email"] for i in pending] == ["dev5@example.com"]
+
+    sweeper = InviteSweeper(batch_size=2, session_factory=SessionLocal)
+    assert asyncio.run(sweeper.run_once()) == (5, 0)
+    db.expire_all()
+    statuses = {i.email: i.status for i in db.query(models.ProjectInvitation)}
+    assert statuses == {**{f"dev{i}@example.com": "Expired" for i in range(5)}, "dev5@example.com": "Pending"}
+    email = db.query(models.EmailOutbox).one()
+    assert (email.status, email.last_error) == ("Failed", "Invitation expired")
+    assert asyncio.run(sweeper.run_once()) == (0, 0)
+
+    db.query(models.ProjectInvitation).filter(models.ProjectInvitation.status == "Expired")\
+        .update({models.ProjectInvitation.expires_at: datetime.utcnow() - timedelta(days=crud.INVITE_ARCHIVE_DAYS + 1)})
+    db.commit()
+    assert asyncio.run(sweeper.run_once()) == (0, 5)
+    assert sweeper.stats == {"sweeps": 3, "expired": 5, "archived": 5}
+    db.expire_all()
+    assert [i.email for i in db.query(models.ProjectInvitation)] == ["dev5@example.com"]
+    assert db.query(models.EmailOutbox).one().invitation_id is None
+
+    indexes = {index["name"]: index["column_names"] for index in inspect(engine).get_indexes("project_invitations")}
+    assert indexes["ix_project_invitations_project_status"] == ["project_id", "status"]
+    assert indexes["ix_project_invitations_email_status"] == ["email", "status"]
+
+
+def test_bulk_invite_matches_addresses_case_insensitively(db):
+    project = make_project(db)
+    db.add_all([
+        models.User(first_name="Alice", last_name="User", email="alice@example.com", phone_no="81", password="x"),
+        models.User(first_name="Bob", last_name="User", email="bob@example.com", phone_no="82", password="x"),
+    ])
+    db.commit()
+    bob = db.query(models.User).filter_by(email="bob@example.com").one()
+    db.add(models.ProjectTeam(project_id=project.project_id, user_id=bob.user_id))
+    db.commit()
+
+    build_email = lambda invite: (None, "Hi", "<p>Hi</p>", "Hi")
+    results = crud.create_bulk_invites(
+        db, project.project_id, ["Alice@Example.com", " alice@example.com", "BOB@example.com"], build_email
+    )
+    assert [r["status"] for r in results] == ["invited", "duplicate", "already_member"]
+    assert [i.email for i in db.query(models.ProjectInvitation)] == ["alice@example.com"]
+    assert db.query(models.EmailOutbox).one().recipient == "alice@example.com"
+
+    results = crud.create_bulk_invites(db, project.project_id, ["ALICE@example.com"], build_email)
+    assert results == [{"email": "alice@example.com", "status": "already_invited"}]
+
+    # A stored address with capitals is found too (SQLite compares case-sensitively)
+    db.add(models.User(first_name="Carol", last_name="User", email="Carol@Example.com", phone_no="83", password="x"))
+    db.commit()
+    results = crud.create_bulk_invites(db, project.project_id, ["Carol@Example.com"], build_email)
+    assert results == [{"email": "carol@example.com", "status": "invited"}]
+    assert db.query(models.ProjectInvitation).filter_by(email="Carol@Example.com").count() == 1
+    results = crud.create_bulk_invites(db, project.project_id, ["carol@example.com"], build_email)
+    assert results[0]["status"] == "already_invited"
+
+
+def test_pending_invites_are_listed_only_to_the_project_owner_and_members(db, monkeypatch):
+    project = make_project(db)
+    crud.create_invite(db, project.project_id, "dev@example.com")
+    guest = db.query(models.User).filter_by(email="guest@example.com").one()
+    url = f"/projects/{project.project_id}/invites"
+
+    assert [i["email"] for i in client.get(url).json()] == ["dev@example.com"]  # user 1 owns the project
+    monkeypatch.setitem(app.dependency_overrides, decode_jwt_token, lambda: {"user_id": guest.user_id})
+    assert client.get(url).status_code == 403
+    db.add(models.ProjectTeam(project_id=project.project_id, user_id=guest.user_id))
+    db.commit()
+    assert client.get(url).status_code == 200
+    assert client.get("/projects/999/invites").status_code == 404
@@ -0,0 +1,172 @@
+import asyncio
+import json
+from realtime import BrokerBackend, EventHub, InProcessBackend, LocalBroker
+
+
+class FakeWebSocket:
+    """Collects what the server would have sent to a client."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with.append(code)
+
+
+async def settle():
+    # Let broker listeners and per-socket senders drain their queues
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_in_process_backend_delivers_to_local_subscribers():
+    async def scenario():
+        hub = EventHub(InProcessBackend())
+        watcher, other_project = FakeWebSocket(), FakeWebSocket()
+        hub.connections.add(1, watcher)
+        hub.connections.add(2, other_project)
+
+        await hub.publish(1, {"project_id": 1, "progress": 0.5})
+        await settle()
+
+        assert watcher.sent == [{"project_id": 1, "progress": 0.5}]
+        assert other_project.sent == []
+
+    asyncio.run(scenario())
+
+
+def test_broker_backend_reaches_subscribers_on_every_worker():
+    async def scenario():
+        broker = LocalBroker()
+        worker_a, worker_b = EventHub(BrokerBackend(broker)), EventHub(BrokerBackend(broker))
+        await worker_a.start()
+        await worker_b.start()
+        on_a, on_b = FakeWebSocket(), FakeWebSocket()
+        worker_a.connections.add(7, on_a)
+        worker_b.connections.add(7, on_b)
+
+        # The edit is handled by worker A only
+        await worker_a.publish(7, {"project_id": 7, "progress": 0.25})
+        await settle()
+
+        assert on_a.sent == [{"project_id": 7, "progress": 0.25}]
+        assert on_b.sent == [{"project_id": 7, "progress": 0.25}]
+
+        await worker_b.stop()
+        await worker_a.publish(7, {"project_id": 7, "progress": 1.0})
+        await settle()
+        assert len(on_a.sent) == 2
+        assert len(on_b.sent) == 1
+        await worker_a.stop()
+
+    asyncio.run(scenario())
+
+
+def test_disconnected_sockets_stop_receiving():
+    async def scenario():
+        hub = EventHub()
+        watcher = FakeWebSocket()
+        hub.connections.add(3, watcher)
+        hub.connections.remove(3, watcher)
+
+        await hub.publish(3, {"project_id": 3, "progress": 0.1})
+
+        assert watcher.sent == []
+        assert 3 not in hub.connections
+
+    asyncio.run(scenario())
+
+
+class SlowWebSocket(FakeWebSocket):
+    """A client that never finishes reading until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.released = asyncio.Event()
+
+    async def send_text(self, text):
+        await self.released.wait()
+        self.sent.append(json.loads(text))
+
+
+class DeadWebSocket(FakeWebSocket):
+    async def send_text(self, text):
+        raise RuntimeError("connection reset")
+
+
+def test_slow_client_does_not_hold_up_the_others():
+    async def scenario():
+        hub = EventHub()
+        hub.connections.queue_size = 2
+        slow, fast = SlowWebSocket(), FakeWebSocket()
+        hub.connections.add(1, slow)
+        hub.connections.add(1, fast)
+
+        for step in range(5):
+            await hub.publish(1, {"project_id": 1, "progress": step / 10})
+            await settle()
+
+        assert [m["progress"] for m in fast.sent] == [0.0, 0.1, 0.2, 0.3, 0.4]
+
+        # The slow client holds one message in flight and keeps only the newest queued ones
+        slow.released.set()
+        await settle()
+        assert [m["progress"] for m in slow.sent] == [0.0, 0.3, 0.4]
+        assert hub.connections.stats["dropped"] == 2
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_evict_policy_disconnects_slow_clients():
+    async def scenario():
+        hub = EventHub()
+        hub.connections.queue_size = 1
+        hub.connections.overflow_policy = "evict"
+        slow = SlowWebSocket()
+        slow.close = lambda code: asyncio.sleep(0, result=slow.closed_with.append(code))
+        slow.closed_with = []
+        hub.connections.add(1, slow)
+
+        for step in range(3):
+            await hub.publish(1, {"project_id": 1, "progress": step / 10})
+        await settle()
+
+        assert 1 not in hub.connections
+        assert slow.closed_with == [1013]
+        assert hub.connections.stats["evicted"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_dead_sockets_are_reaped():
+    async def scenario():
+        hub = EventHub()
+        dead, alive = DeadWebSocket(), FakeWebSocket()
+        hub.connections.add(1, dead)
+        hub.connections.add(1, alive)
+
+        await hub.publish(1, {"project_id": 1, "progress": 0.5})
+        await settle()
+
+        assert hub.connections.sockets(1) == [alive]
+        assert alive.sent == [{"project_id": 1, "progress": 0.5}]
+        assert hub.connections.stats["reaped"] == 1
+        assert dead.closed_with == [1011] and alive.closed_with == []
+
+        # A client too slow to take one message within the timeout is closed with "try again later"
+        hub.connections.send_timeout = 0.01
+        slow = SlowWebSocket()
+        hub.connections.add(1, slow)
+        await hub.publish(1, {"project_id": 1, "progress": 0.75})
+        await asyncio.sleep(0.05)
+        await settle()
+        assert hub.connections.sockets(1) == [alive]
+        assert slow.closed_with == [1013] and hub.connections.stats["reaped"] == 2
+        await hub.stop()
+
+    asyncio.run(scenario())
@@ -2,6 +2,7 @@ import 'dart:convert';
 import 'dart:io';
 import 'package:http/http.dart' as http;
 import 'package:shared_preferences/shared_preferences.dart';
+import 'package:capstone_flutter/api_service/paged_fetch.dart';
 
 class AuthService {
   static const String baseUrl = "http://127.0.0.1:8000/auth";
@@ -145,12 +146,10 @@ class AuthService {
   }
 
   Future<List<dynamic>> fetchUsers() async {
-    final response = await http.get(Uri.parse('$baseUrl/auth/users/'));
-
-    if (response.statusCode == 200) {
-      return jsonDecode(response.body);
-    } else {
-      throw Exception('❌ Failed to load users: ${response.body}');
+    try {
+      return await fetchAllPages('$baseUrl/users/');
+    } catch (e) {
+      throw Exception('❌ Failed to load users: $e');
     }
   }
 }
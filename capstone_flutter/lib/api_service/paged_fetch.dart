@@ -0,0 +1,25 @@
+import 'dart:convert';
+import 'package:http/http.dart' as http;
+
+// The list endpoints return one page at a time; the next page's cursor comes back in
+// the X-Next-Cursor header, and there is none on the last page.
+const int pageSize = 500;
+
+Future<List<dynamic>> fetchAllPages(String url, {Map<String, String>? headers}) async {
+  final items = <dynamic>[];
+  String? cursor;
+  do {
+    final uri = Uri.parse(url).replace(queryParameters: {
+      ...Uri.parse(url).queryParameters,
+      'limit': '$pageSize',
+      if (cursor != null) 'cursor': cursor,
+    });
+    final response = await http.get(uri, headers: headers);
+    if (response.statusCode != 200) {
+      throw Exception('Failed to load $url: ${response.body}');
+    }
+    items.addAll(jsonDecode(response.body));
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor != null);
+  return items;
+}
@@ -1,6 +1,7 @@
 import 'dart:convert';
 import 'package:http/http.dart' as http;
 import 'package:shared_preferences/shared_preferences.dart';
+import 'package:capstone_flutter/api_service/paged_fetch.dart';
 
 class TaskManagerService {
   static const String baseUrl =
@@ -139,12 +140,10 @@ Future<void> createTask(int projectId, Map<String, dynamic> taskData) async {
   }
 
   Future<List<dynamic>> fetchTasks() async {
-    final response = await http.get(Uri.parse('$baseUrl/dashboard/tasks'));
-
-    if (response.statusCode == 200) {
-      return jsonDecode(response.body);
-    } else {
-      throw Exception('❌ Failed to load tasks: ${response.body}');
+    try {
+      return await fetchAllPages('$baseUrl/tasks');
+    } catch (e) {
+      throw Exception('❌ Failed to load tasks: $e');
     }
   }
 }
@@ -6,6 +6,7 @@ import 'package:capstone_flutter/widgets/profile.dart';
 import 'package:capstone_flutter/widgets/projectdata.dart';
 import 'package:shared_preferences/shared_preferences.dart';
 import 'package:capstone_flutter/api_service/auth_service.dart';
+import 'package:capstone_flutter/api_service/paged_fetch.dart';
 import 'package:http/http.dart' as http;
 import 'dart:convert';
 
@@ -248,13 +249,8 @@ class _TopBarState extends State<TopBar> {
 
   Future<List<User>> _fetchUsers() async {
     try {
-      final response =
-          await http.get(Uri.parse('${widget.apiBaseUrl}/auth/users/'));
-      if (response.statusCode == 200) {
-        final List<dynamic> data = jsonDecode(response.body);
-        return data.map((json) => User.fromJson(json)).toList();
-      }
-      throw Exception('Failed to load users');
+      final data = await fetchAllPages('${widget.apiBaseUrl}/auth/users/');
+      return data.map((json) => User.fromJson(json)).toList();
     } catch (e) {
       print('Error fetching users: $e');
       return [];
@@ -263,13 +259,8 @@ class _TopBarState extends State<TopBar> {
 
   Future<List<Task>> _fetchTasks() async {
     try {
-      final response =
-          await http.get(Uri.parse('${widget.apiBaseUrl}/dashboard/tasks'));
-      if (response.statusCode == 200) {
-        final List<dynamic> data = jsonDecode(response.body);
-        return data.map((json) => Task.fromJson(json)).toList();
-      }
-      throw Exception('Failed to load tasks');
+      final data = await fetchAllPages('${widget.apiBaseUrl}/dashboard/tasks');
+      return data.map((json) => Task.fromJson(json)).toList();
     } catch (e) {
       print('Error fetching tasks: $e');
       return [];